@@ -0,0 +1,219 @@
+"""逐帧热点函数微基准测试
+
+覆盖以相机帧率运行的函数：ModelInterface.preprocess_frame、send_frame中的图像编码
+（encode_frame）、检测结果解析（parse_results）、Gemini335.process_frame以及检测框中心的
+深度查找与反投影（TargetLocalizer.localize），在多种分辨率和检测数量下测量单次耗时、
+内存分配和峰值内存。
+
+用法:
+    python benchmarks/hot_paths.py                                   # 运行全部用例
+    python benchmarks/hot_paths.py preprocess localize               # 只运行名称包含关键字的用例
+    python benchmarks/hot_paths.py --out results/base.json
+    python benchmarks/hot_paths.py --compare results/base.json       # 与基线比较，证明优化效果
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from config.settings import Settings
+from analysis.model_interface import ModelInterface
+from camera.gemini335 import Gemini335
+from planning.targets import TargetLocalizer
+
+RESOLUTIONS = ((640, 480), (1280, 800))
+DETECTION_COUNTS = (1, 10, 50)
+
+
+def _frame(width, height, seed=0):
+    """带噪声和若干红色圆形目标的合成彩色图与深度图"""
+    rng = np.random.default_rng(seed)
+    color = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    depth = rng.integers(400, 1200, size=(height, width), dtype=np.uint16)
+    for _ in range(10):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.circle(color, center, 30, (30, 30, 200), -1)
+        cv2.circle(depth, center, 30, 600, -1)
+    stamp = time.time()
+    return {'color': color, 'depth': depth, 'color_timestamp': stamp, 'depth_timestamp': stamp}
+
+
+def _model_result(count, seed=0):
+    """模型API返回格式的检测结果，坐标为模型输入尺寸
+
+    类别均为目标类别、分数均高于置信度阈值，parse_results后全部count个检测都保留。
+    """
+    rng = np.random.default_rng(seed)
+    settings = Settings()
+    names = settings.model.target_classes
+    low = settings.model.confidence_threshold
+    results = []
+    for _ in range(count):
+        x, y = rng.uniform(0, settings.model.input_width - 40), rng.uniform(0, settings.model.input_height - 40)
+        results.append({'name': names[int(rng.integers(0, len(names)))],
+                        'score': float(rng.uniform(low + 0.01, 1.0)), 'bbox': [x, y, x + 40.0, y + 40.0]})
+    return {'results': results}
+
+
+def build_cases():
+    """返回 [(用例名, 可调用对象)]"""
+    settings = Settings()
+    model_interface = ModelInterface()
+    cases = []
+    for width, height in RESOLUTIONS:
+        res = f"{width}x{height}"
+        frame = _frame(width, height)
+        color = frame['color']
+        preprocessed = model_interface.preprocess_frame(color)
+
+        cases.append((f"preprocess_frame[{res}]", lambda c=color: model_interface.preprocess_frame(c)))
+        cases.append((f"encode_frame[{res}]", lambda p=preprocessed: model_interface.encode_frame(p)))
+
+        camera = Gemini335(color_width=width, color_height=height, depth_width=width, depth_height=height)
+        cases.append((f"process_frame[{res}]", lambda f=frame: camera.process_frame(f)))
+
+        intrinsics = dict(settings.camera.color_intrinsics, cx=width / 2, cy=height / 2)
+        localizer = TargetLocalizer(intrinsics, settings.robot.camera_to_arm_transform)
+        for count in DETECTION_COUNTS:
+            shape = color.shape
+            result = _model_result(count)
+            detections = model_interface.parse_results(result, shape)
+            if len(detections) != count:
+                raise RuntimeError(f"parse_results保留了{len(detections)}个检测，用例要求{count}个")
+            cases.append((f"parse_results[{res},n={count}]",
+                          lambda r=result, s=shape: model_interface.parse_results(r, s)))
+            cases.append((f"localize[{res},n={count}]",
+                          lambda d=frame['depth'], dets=detections: localizer.localize(d, dets)))
+    return cases
+
+
+def measure(fn, min_time=0.5, min_repeats=20, max_repeats=10000):
+    """测量单次调用的耗时分布和内存分配
+
+    先预热，再重复调用直到累计min_time秒；之后在tracemalloc下单独调用几次，
+    统计每次调用新分配的内存块数、净分配字节数和调用期间的峰值内存。
+    """
+    for _ in range(3):
+        fn()
+    times = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        while len(times) < max_repeats and (len(times) < min_repeats or time.perf_counter() - start < min_time):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    times = np.array(times)
+
+    tracemalloc.start()
+    blocks, peaks, net = [], [], []
+    try:
+        for _ in range(5):
+            gc.collect()
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            result = fn()
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            diff = after.compare_to(before, 'filename')
+            blocks.append(sum(max(d.count_diff, 0) for d in diff))
+            peaks.append(peak - base)
+            net.append(current - base)
+            del result
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'repeats': len(times),
+        'mean_us': float(times.mean() * 1e6),
+        'median_us': float(np.median(times) * 1e6),
+        'p90_us': float(np.percentile(times, 90) * 1e6),
+        'min_us': float(times.min() * 1e6),
+        'alloc_blocks': int(np.median(blocks)),
+        'alloc_net_kb': float(np.median(net) / 1024.0),
+        'peak_kb': float(np.median(peaks) / 1024.0),
+    }
+
+
+def compare(current, baseline, tolerance=0.10, min_delta_us=1.0):
+    """按中位耗时比较两次结果，返回 [(用例, 基线us, 当前us, 加速比, 是否变慢)]
+
+    变慢需同时超过tolerance比例和min_delta_us绝对值，避免亚微秒用例的计时噪声被误报。
+    """
+    base = baseline['results']
+    rows = []
+    for name, r in current['results'].items():
+        b = base.get(name)
+        if not b or 'median_us' not in b or 'median_us' not in r:
+            continue
+        speedup = b['median_us'] / r['median_us'] if r['median_us'] > 0 else 0.0
+        worse = speedup < 1.0 / (1.0 + tolerance) and r['median_us'] - b['median_us'] > min_delta_us
+        rows.append((name, b['median_us'], r['median_us'], speedup, worse))
+    return rows
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="逐帧热点函数微基准测试")
+    parser.add_argument('filters', nargs='*', help="只运行名称包含任一关键字的用例")
+    parser.add_argument('--min-time', type=float, default=0.5, help="每个用例的最少计时时长，单位秒")
+    parser.add_argument('--out', default=None, help="结果JSON路径，默认 benchmarks/results/hot_paths-<提交>.json")
+    parser.add_argument('--compare', default=None, help="与之比较的基线结果JSON")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="中位耗时变慢超过该比例视为退化")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'用例':32s} {'中位us':>10s} {'p90 us':>10s} {'分配块':>7s} {'净分配KB':>9s} {'峰值KB':>9s}")
+    for name, fn in build_cases():
+        if args.filters and not any(f in name for f in args.filters):
+            continue
+        r = measure(fn, min_time=args.min_time)
+        results[name] = r
+        print(f"{name:32s} {r['median_us']:10.1f} {r['p90_us']:10.1f} {r['alloc_blocks']:7d} "
+              f"{r['alloc_net_kb']:9.1f} {r['peak_kb']:9.1f}")
+
+    revision = _git_revision()
+    report = {'benchmark': 'hot_paths', 'revision': revision, 'timestamp': time.time(), 'results': results}
+    out = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                   f"hot_paths-{revision or 'local'}.json")
+    directory = os.path.dirname(out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressed = False
+        for name, old, new, speedup, worse in compare(report, baseline, args.tolerance):
+            regressed = regressed or worse
+            print(f"{name:32s} {old:10.1f} -> {new:10.1f} us  x{speedup:.2f}{'  变慢' if worse else ''}")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
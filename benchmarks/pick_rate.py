@@ -0,0 +1,648 @@
+"""端到端采摘速率基准测试
+
+把合成相机（或回放相机）、仿真机械臂、仿真底盘和本地模拟模型服务接入与main()相同的
+走走停停采摘流程（覆盖规划 + StopAndGoHarvest流水线），在缩放的虚拟时钟上运行预设场景，
+输出每小时采摘数、单果周期分解、各环节延迟分位数、CPU和内存占用，结果写为JSON，
+便于在不同提交之间比较。
+
+用法:
+    python benchmarks/pick_rate.py                       # 运行全部场景
+    python benchmarks/pick_rate.py dense slow_model      # 运行指定场景
+    python benchmarks/pick_rate.py --out results/now.json --compare results/base.json
+
+说明:
+    机械臂、底盘、相机帧间隔和模型推理延时都按speedup倍速缩放，报告中的时间均为虚拟时间；
+    流水线中的纯CPU计算（预处理、定位等）不缩放，speedup越大结果越保守，speedup=1为实时运行。
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from config.settings import Settings
+from analysis.model_interface import ModelInterface
+from analysis.grasp_pose import GraspPoseEstimator
+from analysis.tracker import MultiObjectTracker, InferenceScheduler, TrackedDetector
+from planning.coverage import RowLayout, CoveragePlanner, camera_footprint_length
+from planning.fruit_map import FruitMap
+from planning.targets import TargetLocalizer
+from robot.arm_controller import ArmController
+from robot.base_controller import BaseController
+from robot.base_driver import BaseDriver, SimBaseBackend
+from robot.sim_robot import SimRobotRPC
+from runtime.harvest import StopAndGoHarvest
+from runtime.multi_arm import ArmUnit, MultiArmOrchestrator
+from utils.clock import VirtualClock
+from utils.helpers import arm_to_odom, odom_to_arm
+from utils.metrics import metrics
+
+# 预设场景：行长度（米）、果实密度（个/米）、模型推理延时（秒）、相机帧率、机械臂RPC故障率等
+SCENARIOS = {
+    'sparse': {'row_length': 6.0, 'fruit_per_meter': 1.0},
+    'dense': {'row_length': 3.0, 'fruit_per_meter': 6.0},
+    'slow_model': {'row_length': 3.0, 'fruit_per_meter': 4.0, 'model_latency': 0.3},
+    'flaky_arm': {'row_length': 3.0, 'fruit_per_meter': 4.0, 'arm_failure_rate': 0.01},
+    'tracking': {'row_length': 3.0, 'fruit_per_meter': 4.0, 'tracking': True},
+    'dual_arm': {'row_length': 3.0, 'fruit_per_meter': 6.0,
+                 'arms': (('left', (0.0, 0.0, 0.0), [-400, 0, 500, 0, 0, 0]),
+                          ('right', (600.0, 0.0, 0.0), [400, 0, 500, 0, 0, 0]))},
+}
+
+DEFAULTS = {
+    'row_length': 4.0,
+    'row_count': 1,
+    'fruit_per_meter': 3.0,
+    'fruit_radius': 35.0,  # 单位mm
+    'canopy_depth': 600.0,  # 果实中心到相机的距离，单位mm
+    'canopy_spread': (200.0, 60.0),  # 果实在横向(y)和深度方向的分布范围，单位mm
+    'model_latency': 0.05,
+    'camera_fps': 30.0,
+    'arm_failure_rate': 0.0,
+    'arm_rpc_latency': 0.002,
+    'tracking': False,
+    'arms': None,  # 多臂平台：((名称, (x mm, y mm, yaw °), 放置位姿), ...)，None为单臂
+    'replay_dir': None,
+    'seed': 0,
+    'max_duration': 3600.0,  # 虚拟时间上限，单位秒
+}
+
+# 报告延迟分位数的指标；SCALED中的指标以仿真等待为主，按speedup换算为虚拟时间，其余为真实耗时
+LATENCY_METRICS = ('camera_capture_seconds', 'model_preprocess_seconds', 'model_request_seconds',
+                   'arm_movel_seconds', 'base_move_seconds')
+PIPELINE_STAGES = ('capture', 'preprocess', 'infer', 'localize', 'plan', 'act')
+SCALED = ('model_request_seconds', 'arm_movel_seconds', 'base_move_seconds', 'stage_infer', 'stage_act')
+
+
+class FruitScene:
+    """合成果园场景：里程计坐标系中的一排果实
+
+    按底盘位姿把仍挂在树上的果实投影到相机中，渲染彩色图（绿色背景上的红色圆）和
+    球面深度图；机械臂采摘成功后移除离抓取点最近的果实。
+    """
+
+    def __init__(self, settings, row_length, fruit_per_meter, fruit_radius=35.0, canopy_depth=600.0,
+                 canopy_spread=(200.0, 60.0), seed=0):
+        self.intrinsics = settings.camera.color_intrinsics
+        self.width = settings.camera.color_width
+        self.height = settings.camera.color_height
+        self.camera_to_arm = np.asarray(settings.robot.camera_to_arm_transform, dtype=np.float64)
+        self.arm_mount = settings.robot.arm_mount_pose
+        self.radius = fruit_radius
+        self._lock = threading.Lock()
+
+        # 果实在机械臂坐标系中的高度由相机高度和冠层距离决定，沿行方向均匀分布
+        rng = np.random.default_rng(seed)
+        count = int(round(row_length * fruit_per_meter))
+        camera_x = self.camera_to_arm[0, 3] / 1000.0
+        camera_z = self.camera_to_arm[2, 3]
+        xs = rng.uniform(0.0, row_length, count) + camera_x
+        ys = rng.uniform(-canopy_spread[0] / 2, canopy_spread[0] / 2, count) / 1000.0
+        zs = (camera_z - canopy_depth + rng.uniform(-canopy_spread[1] / 2, canopy_spread[1] / 2, count)) / 1000.0
+        self.fruit = np.stack([xs, ys, zs], axis=1)
+        self.hanging = np.ones(count, dtype=bool)
+        self.total = count
+
+        self._background = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        self._background[:] = (40, 140, 40)
+        noise = rng.integers(0, 20, size=self._background.shape, dtype=np.uint8)
+        self._background = cv2.add(self._background, noise)
+        self._background_depth = np.full((self.height, self.width), int(canopy_depth + 200), dtype=np.uint16)
+        self._vv, self._uu = np.mgrid[0:self.height, 0:self.width]
+
+    def _project(self, base_pose):
+        """返回仍挂在树上且在视野内的果实的图像圆 [(u, v, r, z)]，由远及近排列"""
+        with self._lock:
+            fruit = self.fruit[self.hanging]
+        if len(fruit) == 0:
+            return []
+        arm = odom_to_arm(fruit, base_pose, self.arm_mount)
+        R, t = self.camera_to_arm[:3, :3], self.camera_to_arm[:3, 3]
+        cam = (arm - t) @ R
+        intr = self.intrinsics
+        circles = []
+        for x, y, z in cam[np.argsort(-cam[:, 2])]:
+            if z <= self.radius:
+                continue
+            u = intr['fx'] * x / z + intr['cx']
+            v = intr['fy'] * y / z + intr['cy']
+            r = intr['fx'] * self.radius / z
+            if u < -r or u >= self.width + r or v < -r or v >= self.height + r:
+                continue
+            circles.append((u, v, r, z))
+        return circles
+
+    def ground_truth(self, base_pose):
+        """给定底盘位姿下视野内果实的真实检测框 [(x0, y0, x1, y1)]，裁剪到图像范围内"""
+        boxes = []
+        for u, v, r, _ in self._project(base_pose):
+            x0, y0 = max(u - r, 0.0), max(v - r, 0.0)
+            x1, y1 = min(u + r, float(self.width)), min(v + r, float(self.height))
+            # 中心在图像外的果实只露出边缘，不计入真值
+            if 0 <= u < self.width and 0 <= v < self.height:
+                boxes.append((x0, y0, x1, y1))
+        return boxes
+
+    def render(self, base_pose):
+        """渲染给定底盘位姿下的彩色图和深度图"""
+        color = self._background.copy()
+        depth = self._background_depth.copy()
+        # 由远及近绘制，近处果实遮挡远处果实
+        for u, v, r, z in self._project(base_pose):
+            cv2.circle(color, (int(u), int(v)), int(r), (30, 30, 200), -1)
+            u0, u1 = max(int(u - r), 0), min(int(u + r) + 1, self.width)
+            v0, v1 = max(int(v - r), 0), min(int(v + r) + 1, self.height)
+            if u0 >= u1 or v0 >= v1:
+                continue
+            d2 = ((self._uu[v0:v1, u0:u1] - u) ** 2 + (self._vv[v0:v1, u0:u1] - v) ** 2) / (r * r)
+            inside = d2 < 1.0
+            surface = z - self.radius * np.sqrt(np.clip(1.0 - d2, 0.0, 1.0))
+            patch = depth[v0:v1, u0:u1]
+            patch[inside] = np.minimum(patch[inside], surface[inside].astype(np.uint16))
+        return color, depth
+
+    def pick(self, pick_pos, base_pose, arm_mount=None):
+        """采摘成功时移除离抓取点最近的果实，返回是否确实摘到了果实
+
+        arm_mount: 抓取位姿所在机械臂的安装位姿，默认为场景的参考机械臂
+        """
+        target = arm_to_odom([pick_pos[:3]], base_pose, arm_mount or self.arm_mount)[0]
+        with self._lock:
+            index = np.flatnonzero(self.hanging)
+            if len(index) == 0:
+                return False
+            dist = np.linalg.norm(self.fruit[index] - target, axis=1) * 1000.0
+            k = int(np.argmin(dist))
+            if dist[k] > 2.0 * self.radius:
+                return False
+            self.hanging[index[k]] = False
+            return True
+
+    @property
+    def remaining(self):
+        with self._lock:
+            return int(self.hanging.sum())
+
+
+class SyntheticCamera:
+    """按场景和底盘当前位姿渲染帧的相机，接口与Gemini335相同"""
+
+    def __init__(self, scene, base_driver, fps=30.0, speedup=1.0):
+        self.scene = scene
+        self.base_driver = base_driver
+        self.frame_interval = 1.0 / fps / speedup
+        self._next = time.monotonic()
+
+    def initialize_camera(self):
+        return True
+
+    @metrics.timed("camera_capture_seconds")
+    def capture_frame(self, align=True):
+        # 按帧率节流，模拟相机出帧间隔
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+        self._next = max(now, self._next) + self.frame_interval
+        color, depth = self.scene.render(self.base_driver.get_pose())
+        stamp = time.time()
+        return {'color': color, 'depth': depth, 'color_timestamp': stamp, 'depth_timestamp': stamp}
+
+    def get_camera_intrinsics(self):
+        return None
+
+    def release_camera(self):
+        return True
+
+
+class ReplayCamera:
+    """回放录制帧的相机：目录中的color_*.png与depth_*.npy按文件名排序循环输出"""
+
+    def __init__(self, directory, fps=30.0, speedup=1.0):
+        colors = sorted(glob.glob(os.path.join(directory, 'color_*.png')))
+        depths = sorted(glob.glob(os.path.join(directory, 'depth_*.npy')))
+        if not colors or len(colors) != len(depths):
+            raise FileNotFoundError(f"回放目录中没有成对的color_*.png和depth_*.npy: {directory}")
+        self.frames = [(cv2.imread(c), np.load(d)) for c, d in zip(colors, depths)]
+        self.frame_interval = 1.0 / fps / speedup
+        self._index = 0
+        self._next = time.monotonic()
+
+    def initialize_camera(self):
+        return True
+
+    @metrics.timed("camera_capture_seconds")
+    def capture_frame(self, align=True):
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+        self._next = max(now, self._next) + self.frame_interval
+        color, depth = self.frames[self._index % len(self.frames)]
+        self._index += 1
+        stamp = time.time()
+        return {'color': color.copy(), 'depth': depth.copy(), 'color_timestamp': stamp, 'depth_timestamp': stamp}
+
+    def get_camera_intrinsics(self):
+        return None
+
+    def release_camera(self):
+        return True
+
+
+class MockModelServer:
+    """本地模拟检测服务，与ModelInterface使用的HTTP接口一致
+
+    解码请求中的图像，在模型输入图像上按红色通道分割果实并返回检测框（模型输入坐标），
+    每个请求额外等待latency秒模拟推理耗时。
+    """
+
+    def __init__(self, latency=0.05, label="tomato", score=0.9, min_area=30, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.label = label
+        self.score = score
+        self.min_area = min_area
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length))
+                body = json.dumps({'results': server.detect(payload['image'])}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.endpoint = f"http://{host}:{self._httpd.server_address[1]}/predict"
+        self._thread = None
+
+    def detect(self, image_base64):
+        start = time.monotonic()
+        self.requests += 1
+        buffer = np.frombuffer(base64.b64decode(image_base64), dtype=np.uint8)
+        image = cv2.imdecode(buffer, cv2.IMREAD_COLOR).astype(np.int16)
+        # 归一化后的输入中果实的红色通道明显高于绿色通道，背景两者接近
+        mask = ((image[:, :, 2] - image[:, :, 1]) >= 1).astype(np.uint8)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        results = []
+        for x, y, w, h, area in stats[1:count]:
+            if area >= self.min_area:
+                results.append({'name': self.label, 'score': self.score,
+                                'bbox': [int(x), int(y), int(x + w), int(y + h)]})
+        remaining = self.latency - (time.monotonic() - start)
+        if remaining > 0:
+            time.sleep(remaining)
+        return results
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-model", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class _TimedProxy:
+    """记录被代理对象指定方法的虚拟耗时，其余属性原样转发"""
+
+    def __init__(self, target, clock, methods, totals, key):
+        self._target = target
+        self._clock = clock
+        self._methods = methods
+        self._totals = totals
+        self._key = key
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name not in self._methods:
+            return attr
+
+        def timed(*args, **kwargs):
+            start = self._clock.now()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._totals[self._key] += self._clock.now() - start
+        return timed
+
+
+class _ScenePickArm(_TimedProxy):
+    """机械臂代理：采摘成功后从场景中移除果实，并统计采摘耗时"""
+
+    def __init__(self, arm, clock, totals, scene, base_driver, outcomes, arm_mount=None, key='pick'):
+        super().__init__(arm, clock, ('move_to', 'pick', 'pick_blended', 'calibrate'), totals, key)
+        self._scene = scene
+        self._base_driver = base_driver
+        self._outcomes = outcomes
+        self._arm_mount = arm_mount
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        method = super().__getattr__(name)
+        if name not in ('pick', 'pick_blended'):
+            return method
+
+        def pick(*args, **kwargs):
+            ret = method(*args, **kwargs)
+            if ret == 0 and self._scene is not None:
+                pick_pos = kwargs.get('pick_pos', args[0] if args else None)
+                hit = self._scene.pick(pick_pos, self._base_driver.get_pose(), self._arm_mount)
+                with self._lock:
+                    self._outcomes['hits' if hit else 'misses'] += 1
+            return ret
+        return pick
+
+
+def _quantiles(name, scale=1.0, labels=None):
+    histogram = metrics.get(name, labels)
+    if histogram is None or histogram.count == 0:
+        return None
+    p50, p90, p99 = histogram.quantiles((0.5, 0.9, 0.99))
+    return {'count': histogram.count, 'mean': histogram.sum / histogram.count * scale,
+            'p50': p50 * scale, 'p90': p90 * scale, 'p99': p99 * scale, 'max': histogram.max * scale}
+
+
+def run_scenario(name, overrides=None, speedup=20.0):
+    """运行一个场景并返回结果字典"""
+    params = dict(DEFAULTS)
+    params.update(SCENARIOS.get(name, {}))
+    params.update(overrides or {})
+    settings = Settings()
+    metrics.reset()
+    metrics.enabled = True
+
+    clock = VirtualClock(speedup=speedup)
+    server = MockModelServer(latency=params['model_latency'] / speedup)
+    server.start()
+
+    base_driver = BaseDriver(SimBaseBackend(clock), wheel_radius=settings.robot.base_wheel_radius,
+                             wheel_separation=settings.robot.base_wheel_separation,
+                             rate_hz=settings.robot.base_control_rate, max_speed=settings.robot.base_speed,
+                             max_acc=settings.robot.base_max_acceleration, clock=clock)
+    base_driver.start()
+    base_controller = BaseController(wheel_radius=settings.robot.base_wheel_radius,
+                                     wheel_separation=settings.robot.base_wheel_separation,
+                                     base_speed=settings.robot.base_speed, driver=base_driver)
+    def connect_arm(ip, seed):
+        arm_controller = ArmController(
+            ip=ip,
+            default_vel=settings.robot.arm_default_velocity,
+            default_acc=settings.robot.arm_default_acceleration,
+            gripper_open_time=settings.robot.arm_gripper_open_time,
+            gripper_close_time=settings.robot.arm_gripper_close_time,
+            approach_offset=settings.robot.arm_approach_offset,
+            rpc_factory=SimRobotRPC.factory(clock=clock, rpc_latency=params['arm_rpc_latency'],
+                                            failure_rate=params['arm_failure_rate'], seed=seed),
+            clock=clock,
+            blend_radius=settings.robot.arm_blend_radius
+        )
+        arm_controller.connect()
+        arm_controller.enable()
+        return arm_controller
+
+    scene = None
+    if params['replay_dir']:
+        camera = ReplayCamera(params['replay_dir'], fps=params['camera_fps'], speedup=speedup)
+    else:
+        scene = FruitScene(settings, params['row_length'], params['fruit_per_meter'],
+                           fruit_radius=params['fruit_radius'], canopy_depth=params['canopy_depth'],
+                           canopy_spread=params['canopy_spread'], seed=params['seed'])
+        camera = SyntheticCamera(scene, base_driver, fps=params['camera_fps'], speedup=speedup)
+
+    intrinsics = settings.camera.color_intrinsics
+    model_interface = ModelInterface()
+    model_interface.model_api_endpoint = server.endpoint
+    grasp_estimator = None
+    if settings.robot.arm_grasp_estimation:
+        grasp_estimator = GraspPoseEstimator(intrinsics, camera_to_arm=settings.robot.camera_to_arm_transform,
+                                             gripper_radius=settings.robot.arm_gripper_radius,
+                                             max_tilt=settings.robot.arm_grasp_max_tilt)
+    localizer = TargetLocalizer(intrinsics, settings.robot.camera_to_arm_transform,
+                                grasp_estimator=grasp_estimator)
+    detector = None
+    if params['tracking']:
+        detector = TrackedDetector(
+            model_interface,
+            tracker=MultiObjectTracker(iou_threshold=settings.model.tracker_iou_threshold),
+            scheduler=InferenceScheduler(min_interval=settings.model.min_inference_interval,
+                                         max_interval=settings.model.max_inference_interval,
+                                         max_drift=settings.model.tracker_max_drift,
+                                         min_confidence=settings.model.tracker_min_confidence),
+            use_flow=settings.model.tracker_use_flow
+        )
+
+    planner = CoveragePlanner(
+        RowLayout(params['row_count'], params['row_length'], settings.robot.field_row_spacing,
+                  headland=settings.robot.field_headland, first_turn=settings.robot.field_first_turn),
+        footprint_length=camera_footprint_length(params['canopy_depth'], settings.camera.color_width,
+                                                 intrinsics['fx']),
+        reach_window=settings.robot.coverage_reach_window,
+        min_overlap=settings.robot.coverage_min_overlap,
+        base_speed=settings.robot.base_speed,
+        base_acc=settings.robot.base_max_acceleration,
+        wheel_separation=settings.robot.base_wheel_separation,
+        pick_cycle_time=settings.robot.arm_pick_cycle_time
+    )
+    plan = planner.plan()
+
+    totals = {'pick': 0.0, 'travel': 0.0, 'arm_busy': 0.0}
+    outcomes = {'hits': 0, 'misses': 0}
+    orchestrator = None
+    if params['arms']:
+        # 多臂共享同一台相机和检测结果，拣选目标由编排器分配；各臂并行工作，totals['pick']记录
+        # pick_batch的墙钟时间，使周期分解各项之和等于总时间，各臂耗时之和另记为arm_busy
+        units = [ArmUnit(arm_name, _ScenePickArm(connect_arm(arm_name, params['seed'] + i), clock, totals, scene,
+                                                 base_driver, outcomes, arm_mount=mount, key='arm_busy'),
+                         mount=mount, reach_radius=settings.robot.multi_arm_reach_radius,
+                         place_pos=place_pos)
+                 for i, (arm_name, mount, place_pos) in enumerate(params['arms'])]
+        orchestrator = MultiArmOrchestrator(units, reference_mount=settings.robot.arm_mount_pose,
+                                            clearance=settings.robot.multi_arm_clearance,
+                                            cycle_time=settings.robot.arm_pick_cycle_time, clock=clock)
+        arm = _TimedProxy(orchestrator, clock, ('pick_batch',), totals, 'pick')
+    else:
+        arm = _ScenePickArm(connect_arm(settings.robot.arm_ip, params['seed']), clock, totals, scene, base_driver,
+                            outcomes)
+    base = _TimedProxy(base_controller, clock,
+                       ('move_forward', 'move_backward', 'turn_left', 'turn_right'), totals, 'travel')
+    harvest = StopAndGoHarvest(camera, model_interface, localizer, arm, base, plan,
+                               place_pos=settings.robot.arm_place_position, detector=detector,
+                               fruit_map=FruitMap(merge_radius=settings.robot.fruit_merge_radius,
+                                                  max_attempts=settings.robot.fruit_max_attempts),
+                               arm_mount=settings.robot.arm_mount_pose,
+                               use_blending=settings.robot.arm_use_blending,
+                               max_picks_per_stop=settings.robot.coverage_max_picks_per_stop)
+
+    # 超过虚拟时间上限时停止流水线，防止场景卡死
+    done = threading.Event()
+
+    def watchdog():
+        while not done.wait(0.1):
+            if clock.now() - start_virtual > params['max_duration'] and harvest.pipeline is not None:
+                harvest.pipeline.stop()
+                return
+
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.monotonic()
+    start_virtual = clock.now()
+    threading.Thread(target=watchdog, name="bench-watchdog", daemon=True).start()
+    try:
+        harvest.run(capture_queue=settings.pipeline.capture_queue_size,
+                    infer_queue=settings.pipeline.infer_queue_size,
+                    queue_size=settings.pipeline.queue_size,
+                    infer_workers=settings.pipeline.infer_workers)
+    finally:
+        done.set()
+        elapsed = clock.now() - start_virtual
+        wall = time.monotonic() - wall_start
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        pipeline_stats = harvest.pipeline.stats() if harvest.pipeline is not None else {}
+        arm_report = orchestrator.report()['arms'] if orchestrator is not None else None
+        arm.disconnect()
+        base_driver.shutdown()
+        server.stop()
+
+    picks = outcomes['hits'] if scene is not None else harvest.stats['picks']
+    cpu = (usage.ru_utime - usage_start.ru_utime) + (usage.ru_stime - usage_start.ru_stime)
+    attempts = harvest.stats['picks'] + harvest.stats['failures']
+    other = max(elapsed - totals['pick'] - totals['travel'], 0.0)
+    latency = {name: _quantiles(name, speedup if name in SCALED else 1.0) for name in LATENCY_METRICS}
+    for stage in PIPELINE_STAGES:
+        key = 'stage_' + stage
+        latency[key] = _quantiles('pipeline_stage_seconds', speedup if key in SCALED else 1.0, {'stage': stage})
+
+    return {
+        'scenario': name,
+        'params': params,
+        'speedup': speedup,
+        'elapsed': elapsed,
+        'wall_time': wall,
+        'picks': picks,
+        'picks_per_hour': picks / elapsed * 3600.0 if elapsed > 0 else 0.0,
+        'fruit_total': scene.total if scene is not None else None,
+        'fruit_remaining': scene.remaining if scene is not None else None,
+        'attempts': attempts,
+        'arm_failures': harvest.stats['failures'],
+        'empty_picks': outcomes['misses'],
+        'stops': harvest.stats['stops'],
+        'stale_frames': harvest.stats['stale_frames'],
+        'model_requests': server.requests,
+        # 单果周期分解（虚拟秒/个）：机械臂采摘、底盘行驶、其余（采集、推理、等待），三项之和为total；
+        # 多臂场景的pick为采摘阶段的墙钟时间，arm_busy为各臂采摘耗时之和（不计入total）
+        'cycle_breakdown': {
+            'pick': totals['pick'] / max(picks, 1),
+            'travel': totals['travel'] / max(picks, 1),
+            'perception_and_idle': other / max(picks, 1),
+            'total': elapsed / max(picks, 1),
+            'arm_busy': totals['arm_busy'] / max(picks, 1) if orchestrator is not None else None,
+        },
+        'latency': {k: v for k, v in latency.items() if v is not None},
+        'pipeline': pipeline_stats,
+        'arms': arm_report,
+        'cpu_seconds': cpu,
+        'cpu_utilization': cpu / wall if wall > 0 else 0.0,
+        'max_rss_mb': usage.ru_maxrss / 1024.0,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, tolerance=0.05):
+    """比较两次结果的每小时采摘数，返回 [(场景, 基线, 当前, 相对变化, 是否退化)]"""
+    base = {r['scenario']: r for r in baseline['results']}
+    rows = []
+    for r in current['results']:
+        b = base.get(r['scenario'])
+        if b is None:
+            continue
+        old, new = b['picks_per_hour'], r['picks_per_hour']
+        change = (new - old) / old if old > 0 else 0.0
+        rows.append((r['scenario'], old, new, change, change < -tolerance))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端采摘速率基准测试")
+    parser.add_argument('scenarios', nargs='*', help=f"场景名称，默认全部：{', '.join(SCENARIOS)}")
+    parser.add_argument('--speedup', type=float, default=20.0, help="虚拟时钟加速倍数")
+    parser.add_argument('--replay', default=None, help="回放目录（color_*.png、depth_*.npy），替代合成相机")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--out', default=None, help="结果JSON路径，默认 benchmarks/results/pick_rate-<提交>.json")
+    parser.add_argument('--compare', default=None, help="与之比较的基线结果JSON")
+    parser.add_argument('--tolerance', type=float, default=0.05, help="每小时采摘数下降超过该比例视为退化")
+    args = parser.parse_args()
+
+    names = args.scenarios or list(SCENARIOS)
+    overrides = {}
+    if args.replay:
+        overrides['replay_dir'] = args.replay
+    if args.seed is not None:
+        overrides['seed'] = args.seed
+
+    revision = _git_revision()
+    results = []
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error(f"未知场景: {name}")
+        result = run_scenario(name, overrides, speedup=args.speedup)
+        results.append(result)
+        breakdown = result['cycle_breakdown']
+        print(f"{name:12s} {result['picks_per_hour']:7.1f} 个/小时  采摘{result['picks']}/{result['fruit_total']}  "
+              f"周期 {breakdown['total']:.2f}s = 采摘{breakdown['pick']:.2f} + 行驶{breakdown['travel']:.2f} + "
+              f"感知/等待{breakdown['perception_and_idle']:.2f}  CPU {result['cpu_utilization'] * 100:.0f}%  "
+              f"RSS {result['max_rss_mb']:.0f}MB")
+        if breakdown.get('arm_busy') is not None:
+            print(f"{'':12s} 各臂采摘耗时合计{breakdown['arm_busy']:.2f}s/个（并行，不计入周期）")
+        for arm_name, arm in (result['arms'] or {}).items():
+            print(f"{'':12s} {arm_name}: {arm['picks_per_hour']:7.1f} 个/小时  利用率{arm['utilization'] * 100:.0f}%  "
+                  f"接手{arm['stolen']}个  等待预留区{arm['blocked_time']:.1f}s")
+
+    report = {'benchmark': 'pick_rate', 'revision': revision, 'timestamp': time.time(),
+              'speedup': args.speedup, 'results': results}
+    out = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                   f"pick_rate-{revision or 'local'}.json")
+    directory = os.path.dirname(out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=float)
+    print(f"结果已写入 {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressed = False
+        for name, old, new, change, worse in compare(report, baseline, args.tolerance):
+            regressed = regressed or worse
+            print(f"{name:12s} {old:7.1f} -> {new:7.1f} 个/小时 ({change * 100:+.1f}%){'  退化' if worse else ''}")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""推理前颜色/深度预筛选的门控评估
+
+用带真值的帧评估FramePrefilter：多少帧被门控（不再调用模型）、多少真实果实因此漏检、
+通过门控的帧中ROI占整帧面积的比例、预筛选本身的耗时，以及经GatedDetector调用本地模拟
+模型服务（与pick_rate.py相同的MockModelServer）的每帧端到端推理延迟，与每帧整帧推理对比。数据来自合成果园场景
+（与pick_rate.py相同的FruitScene，按底盘沿行移动逐帧渲染，并加入天空、茎叶和远处红色
+物体等无果实的干扰帧），或带标注的回放目录。
+
+用法:
+    python benchmarks/prefilter_gate.py                          # 合成数据，使用settings.prefilter
+    python benchmarks/prefilter_gate.py --replay data/replay     # 回放目录：color_*.png、depth_*.npy、boxes_*.json
+    python benchmarks/prefilter_gate.py --downsample 8 --max-miss-rate 0.01
+    python benchmarks/prefilter_gate.py --model-latency 0.1                # 模拟模型每个请求的推理耗时（秒）
+
+    boxes_*.json为该帧真实果实框列表 [[x0, y0, x1, y1], ...]；漏检率超过--max-miss-rate时退出码为1。
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from config.settings import Settings
+from analysis.model_interface import ModelInterface
+from analysis.prefilter import FramePrefilter, GatedDetector, evaluate_gate
+from robot.base_driver import BasePose
+from pick_rate import FruitScene, MockModelServer, _git_revision
+
+# 合成数据集：行长度（米）、果实密度（个/米）、底盘每帧前进距离（米）
+DATASETS = {
+    'sparse': {'row_length': 6.0, 'fruit_per_meter': 0.5, 'step': 0.05},
+    'dense': {'row_length': 3.0, 'fruit_per_meter': 6.0, 'step': 0.05},
+}
+
+
+def synthetic_samples(settings, row_length, fruit_per_meter, step, seed=0):
+    """沿行逐帧渲染合成场景，返回 [(color, depth, boxes)]"""
+    scene = FruitScene(settings, row_length, fruit_per_meter, seed=seed)
+    samples = []
+    for x in np.arange(-0.5, row_length + 0.5, step):
+        pose = BasePose(float(x), 0.0, 0.0, 0.0, 0.0, 0.0)
+        color, depth = scene.render(pose)
+        samples.append((color, depth, scene.ground_truth(pose)))
+    return samples
+
+
+def distractor_samples(settings, count=20, seed=0):
+    """没有果实的干扰帧：天空、茎叶、远处的红色物体（颜色相近但不在工作距离内）"""
+    rng = np.random.default_rng(seed)
+    width, height = settings.camera.color_width, settings.camera.color_height
+    samples = []
+    for i in range(count):
+        kind = i % 3
+        depth = np.zeros((height, width), dtype=np.uint16)
+        if kind == 0:
+            # 天空：蓝白渐变，深度无效
+            ramp = np.repeat(np.linspace(255, 160, height, dtype=np.float32)[:, None], width, axis=1)
+            color = np.dstack([np.full((height, width), 250, np.float32), ramp, ramp * 0.8]).astype(np.uint8)
+        elif kind == 1:
+            # 茎叶：绿色背景上的褐色和深绿色茎
+            color = np.zeros((height, width, 3), dtype=np.uint8)
+            color[:] = (40, 140, 40)
+            depth[:] = 800
+            for _ in range(8):
+                x = int(rng.integers(0, width))
+                cv2.line(color, (x, 0), (x + int(rng.integers(-60, 60)), height),
+                         (30, 60, 90) if rng.random() < 0.5 else (20, 90, 20), int(rng.integers(3, 10)))
+        else:
+            # 远处的红色物体（如农机、房屋），深度超出工作距离
+            color = np.zeros((height, width, 3), dtype=np.uint8)
+            color[:] = (40, 140, 40)
+            depth[:] = 900
+            x0, y0 = int(rng.integers(0, width // 2)), int(rng.integers(0, height // 2))
+            cv2.rectangle(color, (x0, y0), (x0 + 200, y0 + 120), (30, 30, 200), -1)
+            depth[y0:y0 + 120, x0:x0 + 200] = 6000
+        noise = rng.integers(0, 20, size=color.shape, dtype=np.uint8)
+        samples.append((cv2.add(color, noise), depth, []))
+    return samples
+
+
+def replay_samples(directory):
+    colors = sorted(glob.glob(os.path.join(directory, 'color_*.png')))
+    depths = sorted(glob.glob(os.path.join(directory, 'depth_*.npy')))
+    labels = sorted(glob.glob(os.path.join(directory, 'boxes_*.json')))
+    if not colors or not (len(colors) == len(depths) == len(labels)):
+        raise FileNotFoundError(f"回放目录中没有成对的color_*.png、depth_*.npy和boxes_*.json: {directory}")
+    samples = []
+    for c, d, b in zip(colors, depths, labels):
+        with open(b) as f:
+            boxes = [tuple(box) for box in json.load(f)]
+        samples.append((cv2.imread(c), np.load(d), boxes))
+    return samples
+
+
+def _latency(fn, samples):
+    """逐帧调用fn(color, depth)，返回每帧耗时（秒）"""
+    times = []
+    for color, depth, _ in samples:
+        t0 = time.perf_counter()
+        fn(color, depth)
+        times.append(time.perf_counter() - t0)
+    return np.array(times)
+
+
+def run(name, prefilter, samples, gate_settings, model_interface):
+    result = evaluate_gate(prefilter, samples)
+    # 单独计时，evaluate_gate中的真值统计不计入预筛选耗时
+    times = _latency(prefilter.regions, samples)
+    result['prefilter_median_us'] = float(np.median(times) * 1e6)
+    result['prefilter_p90_us'] = float(np.percentile(times, 90) * 1e6)
+
+    # 端到端推理延迟：门控 + 裁剪 + HTTP推理，与每帧整帧推理对比
+    gate = GatedDetector(model_interface, prefilter, crop=gate_settings.crop_inference,
+                         max_rois=gate_settings.max_rois, max_crop_fraction=gate_settings.max_crop_fraction)
+    gated = _latency(lambda color, depth: gate.analyze_frame(color, depth), samples)
+    full = _latency(lambda color, depth: model_interface.analyze_frame(color), samples)
+    result['infer_ms'] = {'mean': float(gated.mean() * 1e3), 'median': float(np.median(gated) * 1e3),
+                          'p90': float(np.percentile(gated, 90) * 1e3), 'max': float(gated.max() * 1e3)}
+    result['full_frame_infer_ms'] = {'mean': float(full.mean() * 1e3), 'median': float(np.median(full) * 1e3),
+                                     'p90': float(np.percentile(full, 90) * 1e3), 'max': float(full.max() * 1e3)}
+    result['model_requests'] = gate.stats['crops'] + gate.stats['full_frames']
+    # 相对"每帧整帧推理"实际送入模型的像素比例
+    result['pixels_sent_fraction'] = gate.stats['pixels_sent'] / max(gate.stats['pixels_total'], 1)
+    print(f"{name:12s} 帧{result['frames']:5d}  门控{result['gate_rate'] * 100:5.1f}%  "
+          f"真值{result['targets']:4d}  漏检{result['missed']:3d}（{result['miss_rate'] * 100:4.1f}%）  "
+          f"有果实被门控{result['gated_with_targets']:3d}帧  ROI面积{result['crop_fraction'] * 100:5.1f}%  "
+          f"送模型像素{result['pixels_sent_fraction'] * 100:5.1f}%  耗时{result['prefilter_median_us']:7.0f}us")
+    print(f"{'':12s} 推理请求{result['model_requests']:5d}  每帧推理延迟 均值{result['infer_ms']['mean']:6.1f}ms  "
+          f"p90 {result['infer_ms']['p90']:6.1f}ms  最大{result['infer_ms']['max']:6.1f}ms  "
+          f"（整帧推理 均值{result['full_frame_infer_ms']['mean']:6.1f}ms  "
+          f"p90 {result['full_frame_infer_ms']['p90']:6.1f}ms）")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推理前颜色/深度预筛选的门控评估")
+    parser.add_argument('--replay', default=None, help="带标注的回放目录，代替合成数据")
+    parser.add_argument('--downsample', type=int, default=None, help="覆盖settings.prefilter.downsample")
+    parser.add_argument('--min-area', type=int, default=None, help="覆盖settings.prefilter.min_region_area")
+    parser.add_argument('--no-depth', action='store_true', help="不使用深度范围筛选")
+    parser.add_argument('--out', default=None, help="结果JSON路径，默认 benchmarks/results/prefilter_gate-<提交>.json")
+    parser.add_argument('--max-miss-rate', type=float, default=0.02, help="漏检率超过该值时退出码为1")
+    parser.add_argument('--model-latency', type=float, default=0.05, help="模拟模型服务每个请求的推理耗时，单位秒")
+    args = parser.parse_args()
+
+    settings = Settings()
+    prefilter_settings = settings.prefilter
+    if args.downsample is not None:
+        prefilter_settings.downsample = args.downsample
+    if args.min_area is not None:
+        prefilter_settings.min_region_area = args.min_area
+    if args.no_depth:
+        prefilter_settings.use_depth = False
+    prefilter = FramePrefilter.from_settings(prefilter_settings)
+
+    if args.replay:
+        datasets = {'replay': replay_samples(args.replay)}
+    else:
+        datasets = {name: synthetic_samples(settings, **params) for name, params in DATASETS.items()}
+        datasets['distractors'] = distractor_samples(settings)
+
+    server = MockModelServer(latency=args.model_latency)
+    server.start()
+    model_interface = ModelInterface(settings.model)
+    model_interface.model_api_endpoint = server.endpoint
+    try:
+        results = {name: run(name, prefilter, samples, prefilter_settings, model_interface)
+                   for name, samples in datasets.items()}
+    finally:
+        server.stop()
+    targets = sum(r['targets'] for r in results.values())
+    missed = sum(r['missed'] for r in results.values())
+    miss_rate = missed / targets if targets else 0.0
+
+    revision = _git_revision()
+    report = {'benchmark': 'prefilter_gate', 'revision': revision, 'timestamp': time.time(),
+              'settings': vars(prefilter_settings), 'model_latency': args.model_latency, 'miss_rate': miss_rate,
+              'results': results}
+    out = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                   f"prefilter_gate-{revision or 'local'}.json")
+    directory = os.path.dirname(out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {out}")
+
+    if miss_rate > args.max_miss_rate:
+        print(f"漏检率{miss_rate * 100:.1f}%超过{args.max_miss_rate * 100:.1f}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
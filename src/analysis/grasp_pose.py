@@ -0,0 +1,261 @@
+import time
+import numpy as np
+
+
+def _rotation_to_rpy(R):
+    """旋转矩阵转换为固定轴XYZ欧拉角（rx, ry, rz），单位度，与fairino的位姿表示一致"""
+    sy = np.hypot(R[0, 0], R[1, 0])
+    if sy > 1e-6:
+        rx = np.arctan2(R[2, 1], R[2, 2])
+        ry = np.arctan2(-R[2, 0], sy)
+        rz = np.arctan2(R[1, 0], R[0, 0])
+    else:
+        rx = np.arctan2(-R[1, 2], R[1, 1])
+        ry = np.arctan2(-R[2, 0], sy)
+        rz = 0.0
+    return np.degrees([rx, ry, rz])
+
+
+def _rpy_to_rotation(rpy):
+    """固定轴XYZ欧拉角（单位度）转换为旋转矩阵"""
+    rx, ry, rz = np.radians(rpy)
+    cx, sx = np.cos(rx), np.sin(rx)
+    cy, sy = np.cos(ry), np.sin(ry)
+    cz, sz = np.cos(rz), np.sin(rz)
+    Rx = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    Ry = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    Rz = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    return Rz @ Ry @ Rx
+
+
+def _align_rotation(a, b):
+    """返回把单位向量a旋转到单位向量b的最小旋转矩阵"""
+    v = np.cross(a, b)
+    c = float(np.dot(a, b))
+    if c < -1.0 + 1e-9:
+        # a与b反向：绕任一与a垂直的轴旋转180°
+        axis = np.cross(a, [1.0, 0.0, 0.0])
+        if np.linalg.norm(axis) < 1e-6:
+            axis = np.cross(a, [0.0, 1.0, 0.0])
+        axis /= np.linalg.norm(axis)
+        return 2.0 * np.outer(axis, axis) - np.eye(3)
+    vx = np.array([[0, -v[2], v[1]], [v[2], 0, -v[0]], [-v[1], v[0], 0]])
+    return np.eye(3) + vx + vx @ vx / (1.0 + c)
+
+
+class GraspPoseEstimator:
+    """基于深度ROI局部点云的抓取位姿估计
+
+    对每个目标，在检测框内下采样深度点并反投影到相机坐标系，用PCA拟合局部曲面
+    得到表面法向；然后在法向附近的锥形范围内采样候选接近方向，统计各方向接近通道
+    （以目标为起点、夹爪半径为截面的圆柱）内的障碍点数量，选择无碰撞且最接近法向的方向。
+    全部计算向量化完成，每个目标的点数受max_points限制，以满足逐帧计算的时间预算。
+    """
+
+    def __init__(self, intrinsics, camera_to_arm=None, reference_rpy=(0.0, 0.0, 0.0),
+                 default_approach=(0.0, 0.0, 1.0), max_points=400, gripper_radius=30.0,
+                 approach_length=120.0, clearance=15.0, max_tilt=60.0, cone_samples=24,
+                 min_points=20, depth_scale=1.0, depth_range=(100.0, 2000.0), time_budget=0.002):
+        """初始化抓取位姿估计器
+
+        参数:
+            intrinsics: 相机内参字典（fx, fy, cx, cy）
+            camera_to_arm: 相机到机械臂基坐标系的4x4变换矩阵，单位mm，None表示单位阵
+            reference_rpy: 沿default_approach接近时的工具姿态（rx, ry, rz），单位度，
+                           默认与ArmController.pick使用的零姿态一致
+            default_approach: 默认接近方向（机械臂坐标系，由目标指向夹爪后退方向）
+            max_points: 每个目标参与拟合的最大点数
+            gripper_radius: 夹爪接近通道的半径，单位mm
+            approach_length: 检查碰撞的接近通道长度，单位mm
+            clearance: 目标表面附近不计为障碍的距离，单位mm
+            max_tilt: 接近方向相对default_approach的最大偏角，单位度
+            cone_samples: 法向附近采样的候选方向数量
+            min_points: 有效深度点少于该值时退回默认接近方向
+            depth_scale: 深度图数值换算为mm的比例
+            depth_range: 有效深度范围，单位mm
+            time_budget: 单个目标的计算时间预算，单位秒，超出时剩余目标使用默认接近方向
+        """
+        self.fx = float(intrinsics['fx'])
+        self.fy = float(intrinsics['fy'])
+        self.cx = float(intrinsics['cx'])
+        self.cy = float(intrinsics['cy'])
+        T = np.eye(4) if camera_to_arm is None else np.asarray(camera_to_arm, dtype=np.float64)
+        self.R_ca = T[:3, :3]
+        self.t_ca = T[:3, 3]
+        self.reference_rotation = _rpy_to_rotation(reference_rpy)
+        self.default_approach = np.asarray(default_approach, dtype=np.float64)
+        self.default_approach /= np.linalg.norm(self.default_approach)
+        self.max_points = max_points
+        self.gripper_radius = gripper_radius
+        self.approach_length = approach_length
+        self.clearance = clearance
+        self.max_tilt = np.radians(max_tilt)
+        self.min_points = min_points
+        self.depth_scale = depth_scale
+        self.depth_range = depth_range
+        self.time_budget = time_budget
+        self._cone = self._make_cone(cone_samples)
+        self.stats = {'estimated': 0, 'fallback': 0, 'last_duration': 0.0}
+
+    @staticmethod
+    def _make_cone(samples):
+        """生成以+Z为轴的候选方向（包含轴线本身），返回(K, 3)单位向量"""
+        directions = [np.array([0.0, 0.0, 1.0])]
+        rings = ((np.radians(15.0), samples // 3), (np.radians(30.0), samples - samples // 3 - 1))
+        for tilt, count in rings:
+            if count <= 0:
+                continue
+            phi = np.linspace(0.0, 2 * np.pi, count, endpoint=False)
+            ring = np.stack([np.sin(tilt) * np.cos(phi), np.sin(tilt) * np.sin(phi),
+                             np.full(count, np.cos(tilt))], axis=1)
+            directions.extend(ring)
+        return np.asarray(directions)
+
+    def _roi_points(self, depth_image, bbox, margin=0.5):
+        """取检测框（按比例外扩）内的下采样深度点，返回相机坐标系点云(M, 3)"""
+        h, w = depth_image.shape[:2]
+        x1, y1, x2, y2 = bbox
+        mx, my = (x2 - x1) * margin, (y2 - y1) * margin
+        x1 = int(max(0, np.floor(x1 - mx)))
+        y1 = int(max(0, np.floor(y1 - my)))
+        x2 = int(min(w, np.ceil(x2 + mx)))
+        y2 = int(min(h, np.ceil(y2 + my)))
+        if x2 <= x1 or y2 <= y1:
+            return np.empty((0, 3))
+        area = (x2 - x1) * (y2 - y1)
+        stride = max(1, int(np.sqrt(area / float(self.max_points * 2))))
+        roi = depth_image[y1:y2:stride, x1:x2:stride].astype(np.float64) * self.depth_scale
+        vs, us = np.mgrid[y1:y2:stride, x1:x2:stride]
+        valid = (roi > self.depth_range[0]) & (roi < self.depth_range[1])
+        z = roi[valid]
+        x = (us[valid] - self.cx) * z / self.fx
+        y = (vs[valid] - self.cy) * z / self.fy
+        return np.stack([x, y, z], axis=1)
+
+    def _to_arm(self, points):
+        return points @ self.R_ca.T + self.t_ca
+
+    def estimate(self, depth_image, detection):
+        """估计单个目标的抓取位姿
+
+        参数:
+            depth_image: 深度图（与彩色图对齐）
+            detection: analyze_frame返回的目标字典，需包含x、y、bbox
+
+        返回:
+            字典：desc_pos（[x, y, z, rx, ry, rz]，单位mm, °）、approach_dir（机械臂坐标系单位向量）、
+            normal、obstacles（选中方向通道内的障碍点数）、fallback（是否退回默认方向）；
+            目标处没有有效深度时返回None
+        """
+        h, w = depth_image.shape[:2]
+        u = min(max(int(detection['x']), 0), w - 1)
+        v = min(max(int(detection['y']), 0), h - 1)
+        center_depth = float(depth_image[v, u]) * self.depth_scale
+        points_cam = self._roi_points(depth_image, detection['bbox'])
+
+        # 目标中心无有效深度时使用检测框内点云的中位深度
+        if not (self.depth_range[0] < center_depth < self.depth_range[1]):
+            if len(points_cam) == 0:
+                return None
+            center_depth = float(np.median(points_cam[:, 2]))
+        center_cam = np.array([(u - self.cx) * center_depth / self.fx,
+                               (v - self.cy) * center_depth / self.fy,
+                               center_depth])
+        center = self._to_arm(center_cam[None, :])[0]
+
+        if len(points_cam) < self.min_points:
+            return self._result(center, self.default_approach, None, 0, True)
+
+        points = self._to_arm(points_cam) - center
+        dist2 = np.einsum('ij,ij->i', points, points)
+
+        # 目标附近的点拟合局部平面，最小特征值对应的特征向量即表面法向
+        near = points[dist2 < (2.0 * self.gripper_radius) ** 2]
+        if len(near) < self.min_points:
+            near = points
+        centered = near - near.mean(axis=0)
+        _, eigvecs = np.linalg.eigh(centered.T @ centered)
+        normal = eigvecs[:, 0]
+        # 法向朝向相机一侧（表面外侧）
+        camera_origin = self.t_ca - center
+        if np.dot(normal, camera_origin) < 0:
+            normal = -normal
+
+        # 候选方向：法向附近的锥形采样，并限制相对默认接近方向的偏角
+        candidates = self._cone @ _align_rotation(np.array([0.0, 0.0, 1.0]), normal).T
+        tilt = np.arccos(np.clip(candidates @ self.default_approach, -1.0, 1.0))
+        candidates = candidates[tilt <= self.max_tilt]
+        if len(candidates) == 0:
+            return self._result(center, self.default_approach, normal, 0, True)
+
+        # 统计每个候选方向接近通道内的障碍点：沿方向的投影在(clearance, approach_length)内
+        # 且到通道轴线的距离小于夹爪半径
+        proj = points @ candidates.T
+        perp2 = dist2[:, None] - proj ** 2
+        blocked = (proj > self.clearance) & (proj < self.approach_length) & (perp2 < self.gripper_radius ** 2)
+        obstacles = blocked.sum(axis=0)
+        deviation = np.arccos(np.clip(candidates @ normal, -1.0, 1.0))
+        best = np.lexsort((deviation, obstacles))[0]
+        return self._result(center, candidates[best], normal, int(obstacles[best]), False)
+
+    def _result(self, center, approach_dir, normal, obstacles, fallback):
+        # 工具姿态：把默认接近方向旋转到选中的接近方向，再叠加参考姿态
+        R = _align_rotation(self.default_approach, approach_dir) @ self.reference_rotation
+        rpy = _rotation_to_rpy(R)
+        if fallback:
+            self.stats['fallback'] += 1
+        else:
+            self.stats['estimated'] += 1
+        return {
+            'desc_pos': [float(c) for c in center] + [float(a) for a in rpy],
+            'approach_dir': [float(c) for c in approach_dir],
+            'normal': None if normal is None else [float(c) for c in normal],
+            'obstacles': obstacles,
+            'fallback': fallback,
+        }
+
+    def estimate_batch(self, depth_image, detections):
+        """为一帧中的所有目标估计抓取位姿
+
+        超出time_budget * 目标数量的总预算后，剩余目标直接使用默认接近方向。
+
+        返回:
+            与detections等长的列表，元素为estimate的返回值或None
+        """
+        t_start = time.perf_counter()
+        deadline = t_start + self.time_budget * max(len(detections), 1)
+        results = []
+        for detection in detections:
+            if time.perf_counter() > deadline:
+                results.append(self._fallback_for(depth_image, detection))
+            else:
+                results.append(self.estimate(depth_image, detection))
+        self.stats['last_duration'] = time.perf_counter() - t_start
+        return results
+
+    def _fallback_for(self, depth_image, detection):
+        h, w = depth_image.shape[:2]
+        u = min(max(int(detection['x']), 0), w - 1)
+        v = min(max(int(detection['y']), 0), h - 1)
+        depth = float(depth_image[v, u]) * self.depth_scale
+        if not (self.depth_range[0] < depth < self.depth_range[1]):
+            return None
+        center_cam = np.array([(u - self.cx) * depth / self.fx, (v - self.cy) * depth / self.fy, depth])
+        return self._result(self._to_arm(center_cam[None, :])[0], self.default_approach, None, 0, True)
+
+
+# 测试代码
+if __name__ == "__main__":
+    # 构造一个倾斜平面上的目标
+    intrinsics = {'fx': 615.0, 'fy': 615.0, 'cx': 320.0, 'cy': 240.0}
+    vs, us = np.mgrid[0:480, 0:640]
+    depth = (500.0 + (us - 320) * 0.5).astype(np.uint16)
+    camera_to_arm = [[1, 0, 0, 400], [0, -1, 0, 0], [0, 0, -1, 800], [0, 0, 0, 1]]  # 相机朝下安装
+    estimator = GraspPoseEstimator(intrinsics, camera_to_arm=camera_to_arm)
+    detection = {'x': 320, 'y': 240, 'bbox': [290, 210, 350, 270]}
+    t0 = time.perf_counter()
+    for _ in range(100):
+        result = estimator.estimate(depth, detection)
+    print(f"单个目标耗时 {(time.perf_counter() - t0) * 10:.2f} ms")
+    print(f"desc_pos={np.round(result['desc_pos'], 1).tolist()}, approach={np.round(result['approach_dir'], 3).tolist()}, "
+          f"normal={np.round(result['normal'], 3).tolist()}")
@@ -1,20 +1,40 @@
-import requests
 import cv2
 import base64
 import json
+import logging
+import numpy as np
 from config.settings import settings
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
 
 
 class ModelInterface:
     """模型接口类，用于与目标检测模型进行交互"""
     
-    def __init__(self):
-        """初始化模型接口"""
-        self.model_api_endpoint = settings.model.api_endpoint
-        self.confidence_threshold = settings.model.confidence_threshold
-        self.target_classes = settings.model.target_classes
+    def __init__(self, model_settings=None):
+        """初始化模型接口
+        
+        参数:
+            model_settings: ModelSettings对象，默认使用全局设置settings.model
+        """
+        self.config = model_settings if model_settings is not None else settings.model
+        self.model_api_endpoint = self.config.api_endpoint
+        self.confidence_threshold = self.config.confidence_threshold
+        self.target_classes = self.config.target_classes
+        self.timeout = self.config.timeout
         self._last_result = None
+
+    def apply_settings(self, new_settings):
+        """应用热更新的设置（SettingsWatcher订阅回调）"""
+        model = new_settings.model
+        self.model_api_endpoint = model.api_endpoint
+        self.timeout = model.timeout
+        self.confidence_threshold = model.confidence_threshold
+        self.target_classes = model.target_classes
+        self.config = model
         
+    @metrics.timed("model_request_seconds", "send_frame耗时（编码+HTTP推理）")
     def send_frame(self, frame):
         """将图像帧发送到目标检测API，返回检测结果
         
@@ -24,35 +44,53 @@ class ModelInterface:
         返回:
             如果成功，返回包含检测结果的字典；否则返回None
         """
+        # requests导入较慢，首次请求时才导入（warm_up可提前完成）
+        import requests
         try:
-            # 将frame编码为jpg并转base64
-            _, buffer = cv2.imencode('.jpg', frame)
-            img_base64 = base64.b64encode(buffer).decode('utf-8')
-            
             # 构造API请求
             headers = {'Content-Type': 'application/json'}
             data = {
-                'image': img_base64
+                'image': self.encode_frame(frame)
             }
             
             # 发送POST请求
             response = requests.post(self.model_api_endpoint, headers=headers, data=json.dumps(data),
-                                  timeout=settings.model.timeout)
+                                  timeout=self.timeout)
             
             if response.status_code == 200:
                 result = response.json()
                 self._last_result = result
                 return result
             else:
-                print(f"模型API请求失败: {response.status_code}, {response.text}")
+                logger.warning("模型API请求失败: %s, %s", response.status_code, response.text)
+                metrics.inc("model_request_errors_total")
                 self._last_result = None
                 return None
                 
         except requests.exceptions.RequestException as e:
-            print(f"模型API请求异常: {str(e)}")
+            logger.warning("模型API请求异常: %s", e)
+            metrics.inc("model_request_errors_total")
             self._last_result = None
             return None
     
+    def warm_up(self, send_request=True):
+        """提前导入HTTP依赖，并可发送一帧空白图像让模型服务完成首次推理的加载
+        
+        返回:
+            send_request为True时返回模型服务是否正常响应，否则返回True
+        """
+        import requests  # noqa: F401
+        if not send_request:
+            return True
+        frame = np.zeros((self.config.input_height, self.config.input_width, 3), dtype=np.float32)
+        return self.send_frame(frame) is not None
+
+    def encode_frame(self, frame):
+        """将图像帧编码为jpg并转为base64字符串"""
+        _, buffer = cv2.imencode('.jpg', frame)
+        return base64.b64encode(buffer).decode('utf-8')
+
+    @metrics.timed("model_preprocess_seconds", "preprocess_frame耗时")
     def preprocess_frame(self, frame):
         """对输入的图像帧进行预处理，以满足模型输入要求
         
@@ -63,20 +101,21 @@ class ModelInterface:
             预处理后的图像帧
         """
         # 调整图像大小
-        preprocessed_frame = cv2.resize(frame, (settings.model.input_width, settings.model.input_height))
+        preprocessed_frame = cv2.resize(frame, (self.config.input_width, self.config.input_height))
         
         # 归一化处理
         preprocessed_frame = preprocessed_frame.astype('float32') / 255.0
-        preprocessed_frame -= settings.model.normalization_mean
-        preprocessed_frame /= settings.model.normalization_std
+        preprocessed_frame -= self.config.normalization_mean
+        preprocessed_frame /= self.config.normalization_std
         
         return preprocessed_frame
     
-    def analyze_frame(self, frame):
+    def analyze_frame(self, frame, depth=None):
         """分析图像帧，检测目标并返回坐标信息
         
         参数:
             frame: 输入的图像帧，BGR格式的numpy数组
+            depth: 未使用，保持与GatedDetector、TrackedDetector的接口一致
             
         返回:
             包含检测到的目标信息的列表，每个目标信息包括坐标、边界框和置信度
@@ -84,24 +123,49 @@ class ModelInterface:
         # 对图像帧进行预处理
         preprocessed_frame = self.preprocess_frame(frame)
         
+        return self.detect(preprocessed_frame, frame.shape)
+    
+    def detect(self, preprocessed_frame, frame_shape):
+        """发送已预处理的图像帧并解析检测结果，供流水线分阶段调用
+        
+        参数:
+            preprocessed_frame: preprocess_frame的输出
+            frame_shape: 原始图像帧的shape，用于把坐标换算回原始尺寸
+            
+        返回:
+            同analyze_frame
+        """
         # 发送图像帧到模型API
         result = self.send_frame(preprocessed_frame)
+        return self.parse_results(result, frame_shape)
+
+    def parse_results(self, result, frame_shape):
+        """按类别和置信度筛选模型返回的目标，并把检测框换算回原始图像尺寸
         
+        参数:
+            result: send_frame返回的字典，可为None
+            frame_shape: 原始图像帧的shape
+            
+        返回:
+            同analyze_frame
+        """
         if not result or 'results' not in result:
             return []
             
+        # 每次解析只读取一次阈值和类别，热更新不会影响正在解析的结果
+        target_classes, confidence_threshold = self.target_classes, self.confidence_threshold
         coords = []
         for obj in result['results']:
             # 检查目标类别和置信度
-            if obj.get('name') in self.target_classes and obj.get('score', 0) > self.confidence_threshold:
+            if obj.get('name') in target_classes and obj.get('score', 0) > confidence_threshold:
                 # 取检测框中心点
                 bbox = obj['bbox']
                 x = (bbox[0] + bbox[2]) / 2
                 y = (bbox[1] + bbox[3]) / 2
                 
                 # 将坐标转换为原始图像尺寸
-                scale_x = frame.shape[1] / settings.model.input_width
-                scale_y = frame.shape[0] / settings.model.input_height
+                scale_x = frame_shape[1] / self.config.input_width
+                scale_y = frame_shape[0] / self.config.input_height
                 x *= scale_x
                 y *= scale_y
                 
@@ -118,8 +182,6 @@ class ModelInterface:
 
 # 测试代码
 if __name__ == "__main__":
-    import numpy as np
-    
     # 创建一个示例图像
     frame = np.zeros((480, 640, 3), dtype=np.uint8)
     cv2.rectangle(frame, (100, 100), (200, 200), (0, 255, 0), 2)
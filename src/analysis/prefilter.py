@@ -0,0 +1,247 @@
+import cv2
+import numpy as np
+
+from utils.metrics import metrics
+
+
+class FramePrefilter:
+    """基于颜色和深度的快速预筛选
+
+    在降采样的图像上计算HSV成熟度掩码（各类别的颜色范围取并集）和深度在工作距离内的
+    掩码，两者相交后取连通区域作为候选区域。没有候选区域的帧（只有茎叶或天空）不必送去
+    推理，候选区域映射回原图尺寸并外扩后作为ROI，只把这些区域裁剪下来推理。
+    """
+
+    def __init__(self, color_ranges, depth_range=(200.0, 1500.0), downsample=4, min_region_area=200,
+                 roi_margin=24, open_kernel=3):
+        """
+        参数:
+            color_ranges: {类别: [[h_lo, s_lo, v_lo, h_hi, s_hi, v_hi], ...]}，OpenCV HSV取值
+                          （H为0~180），同一类别可给出多个范围（如红色跨越H=0）
+            depth_range: 候选区域的深度范围 (最小, 最大)，单位mm，None表示不使用深度
+            downsample: 降采样倍数
+            min_region_area: 候选区域的最小面积，单位为原图像素
+            roi_margin: ROI向外扩展的像素数，为检测框留出上下文
+            open_kernel: 开运算核大小（降采样后的像素），去除零散噪点，0表示不做
+        """
+        self.color_ranges = {}
+        for label, ranges in color_ranges.items():
+            self.color_ranges[label] = [(np.array(r[:3], dtype=np.uint8), np.array(r[3:6], dtype=np.uint8))
+                                        for r in ranges]
+        self.depth_range = tuple(depth_range) if depth_range is not None else None
+        self.downsample = max(int(downsample), 1)
+        self.min_region_area = min_region_area
+        self.roi_margin = roi_margin
+        self._kernel = (cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (open_kernel, open_kernel))
+                        if open_kernel > 1 else None)
+
+    @classmethod
+    def from_settings(cls, prefilter_settings):
+        return cls(
+            prefilter_settings.color_ranges,
+            depth_range=prefilter_settings.depth_range if prefilter_settings.use_depth else None,
+            downsample=prefilter_settings.downsample,
+            min_region_area=prefilter_settings.min_region_area,
+            roi_margin=prefilter_settings.roi_margin
+        )
+
+    def mask(self, color, depth=None):
+        """返回降采样后的候选掩码（uint8，0或255）"""
+        k = self.downsample
+        height, width = color.shape[:2]
+        size = (max(width // k, 1), max(height // k, 1))
+        small = cv2.resize(color, size, interpolation=cv2.INTER_AREA) if k > 1 else color
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+
+        mask = None
+        for ranges in self.color_ranges.values():
+            for low, high in ranges:
+                m = cv2.inRange(hsv, low, high)
+                mask = m if mask is None else cv2.bitwise_or(mask, m, dst=mask)
+        if mask is None:
+            mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
+
+        if depth is not None and self.depth_range is not None:
+            # 深度用最近邻降采样，避免无效的0值与有效深度混合
+            small_depth = cv2.resize(depth, size, interpolation=cv2.INTER_NEAREST)
+            in_range = cv2.inRange(small_depth, self.depth_range[0], self.depth_range[1])
+            mask = cv2.bitwise_and(mask, in_range, dst=mask)
+
+        if self._kernel is not None:
+            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel)
+        return mask
+
+    @metrics.timed("prefilter_seconds", "颜色/深度预筛选耗时")
+    def regions(self, color, depth=None):
+        """返回原图坐标的候选ROI列表 [(x0, y0, x1, y1)]，相互重叠的ROI已合并"""
+        mask = self.mask(color, depth)
+        k = self.downsample
+        count, _, boxes, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        if count <= 1:
+            return []
+        boxes = boxes[1:]
+        keep = boxes[:, cv2.CC_STAT_AREA] * (k * k) >= self.min_region_area
+        boxes = boxes[keep]
+
+        height, width = color.shape[:2]
+        m = self.roi_margin
+        rois = []
+        for x, y, w, h, _ in boxes:
+            rois.append((max(int(x * k) - m, 0), max(int(y * k) - m, 0),
+                         min(int((x + w) * k) + m, width), min(int((y + h) * k) + m, height)))
+        return merge_rois(rois)
+
+
+def merge_rois(rois):
+    """合并相互重叠的ROI，返回互不重叠的ROI列表"""
+    rois = list(rois)
+    merged = True
+    while merged and len(rois) > 1:
+        merged = False
+        result = []
+        for roi in rois:
+            for i, other in enumerate(result):
+                if roi[0] < other[2] and other[0] < roi[2] and roi[1] < other[3] and other[1] < roi[3]:
+                    result[i] = (min(roi[0], other[0]), min(roi[1], other[1]),
+                                 max(roi[2], other[2]), max(roi[3], other[3]))
+                    merged = True
+                    break
+            else:
+                result.append(roi)
+        rois = result
+    return rois
+
+
+class GatedDetector:
+    """带预筛选门控的检测器，可替代ModelInterface传给TrackedDetector、主循环和CrawlHarvester
+
+    没有候选区域的帧直接返回空结果，不调用模型；有候选区域时把包含全部ROI的外接矩形
+    裁剪下来推理，检测结果换算回整帧坐标。每帧最多一次模型请求（逐个ROI请求会使延迟随
+    ROI数量成倍增加），ROI过多或外接矩形面积过大时退回整帧推理。
+    """
+
+    def __init__(self, model_interface, prefilter, crop=True, max_rois=4, max_crop_fraction=0.5):
+        """
+        参数:
+            model_interface: ModelInterface对象
+            prefilter: FramePrefilter对象
+            crop: 是否只对ROI的外接矩形推理，False时通过门控的帧整帧推理
+            max_rois: ROI数量超过该值时整帧推理
+            max_crop_fraction: ROI外接矩形面积超过整帧的该比例时整帧推理
+        """
+        self.model_interface = model_interface
+        self.prefilter = prefilter
+        self.crop = crop
+        self.max_rois = max_rois
+        self.max_crop_fraction = max_crop_fraction
+        self.stats = {
+            'frames': 0,
+            'gated': 0,
+            'full_frames': 0,
+            'crops': 0,
+            'pixels_sent': 0,
+            'pixels_total': 0,
+        }
+
+    @classmethod
+    def from_settings(cls, model_interface, prefilter_settings):
+        return cls(
+            model_interface,
+            FramePrefilter.from_settings(prefilter_settings),
+            crop=prefilter_settings.crop_inference,
+            max_rois=prefilter_settings.max_rois,
+            max_crop_fraction=prefilter_settings.max_crop_fraction
+        )
+
+    @property
+    def gate_rate(self):
+        """未送去推理的帧所占比例"""
+        return self.stats['gated'] / self.stats['frames'] if self.stats['frames'] else 0.0
+
+    def apply_settings(self, new_settings):
+        """应用热更新的预筛选参数（SettingsWatcher订阅回调）"""
+        prefilter = new_settings.prefilter
+        self.prefilter = FramePrefilter.from_settings(prefilter)
+        self.crop = prefilter.crop_inference
+        self.max_rois = prefilter.max_rois
+        self.max_crop_fraction = prefilter.max_crop_fraction
+
+    def analyze_frame(self, frame, depth=None, gray=None):
+        """分析图像帧，返回目标列表（格式同ModelInterface.analyze_frame）
+
+        参数:
+            frame: BGR图像帧
+            depth: 可选，与彩色图对齐的深度图，用于深度范围筛选
+            gray: 未使用，保持与TrackedDetector的接口一致
+        """
+        self.stats['frames'] += 1
+        height, width = frame.shape[:2]
+        self.stats['pixels_total'] += height * width
+
+        rois = self.prefilter.regions(frame, depth)
+        if not rois:
+            self.stats['gated'] += 1
+            metrics.inc("prefilter_frames_total", labels={'result': 'gated'})
+            return []
+        metrics.inc("prefilter_frames_total", labels={'result': 'passed'})
+
+        x0, y0 = min(r[0] for r in rois), min(r[1] for r in rois)
+        x1, y1 = max(r[2] for r in rois), max(r[3] for r in rois)
+        area = (x1 - x0) * (y1 - y0)
+        if not self.crop or len(rois) > self.max_rois or area > self.max_crop_fraction * height * width:
+            self.stats['full_frames'] += 1
+            self.stats['pixels_sent'] += height * width
+            return self.model_interface.analyze_frame(frame)
+
+        self.stats['crops'] += 1
+        self.stats['pixels_sent'] += area
+        detections = []
+        for det in self.model_interface.analyze_frame(frame[y0:y1, x0:x1]):
+            det = dict(det)
+            det['x'] += x0
+            det['y'] += y0
+            b = det['bbox']
+            det['bbox'] = [b[0] + x0, b[1] + y0, b[2] + x0, b[3] + y0]
+            detections.append(det)
+        return detections
+
+
+def evaluate_gate(prefilter, samples):
+    """用带真值的帧评估预筛选：门控比例和漏检的真实目标数
+
+    一个真实目标的检测框中心落在某个ROI内即视为保留，所在帧被门控或中心不在任何ROI内
+    则计为漏检。
+
+    参数:
+        prefilter: FramePrefilter对象
+        samples: 可迭代的 (color, depth, boxes)，boxes为真实目标框列表 [(x0, y0, x1, y1)]
+
+    返回:
+        统计字典：frames、gated、frames_with_targets、gated_with_targets、targets、missed、
+        gate_rate、miss_rate、crop_fraction（通过门控的帧中ROI合计面积的平均比例）
+    """
+    result = {'frames': 0, 'gated': 0, 'frames_with_targets': 0, 'gated_with_targets': 0,
+              'targets': 0, 'missed': 0}
+    crop_fractions = []
+    for color, depth, boxes in samples:
+        rois = prefilter.regions(color, depth)
+        result['frames'] += 1
+        result['targets'] += len(boxes)
+        if boxes:
+            result['frames_with_targets'] += 1
+        if not rois:
+            result['gated'] += 1
+            result['missed'] += len(boxes)
+            if boxes:
+                result['gated_with_targets'] += 1
+            continue
+        height, width = color.shape[:2]
+        crop_fractions.append(sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rois) / float(height * width))
+        for x0, y0, x1, y1 in boxes:
+            u, v = (x0 + x1) / 2.0, (y0 + y1) / 2.0
+            if not any(r[0] <= u < r[2] and r[1] <= v < r[3] for r in rois):
+                result['missed'] += 1
+    result['gate_rate'] = result['gated'] / result['frames'] if result['frames'] else 0.0
+    result['miss_rate'] = result['missed'] / result['targets'] if result['targets'] else 0.0
+    result['crop_fraction'] = float(np.mean(crop_fractions)) if crop_fractions else 0.0
+    return result
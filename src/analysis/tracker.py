@@ -0,0 +1,384 @@
+import numpy as np
+import cv2
+
+from utils.helpers import arm_to_odom, odom_to_arm
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """向量化计算两组检测框 [x1, y1, x2, y2] 的IoU矩阵，形状 (len(a), len(b))"""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def greedy_match(iou, threshold):
+    """按IoU从大到小贪心匹配，返回 [(行, 列), ...]"""
+    if iou.size == 0:
+        return []
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols])
+    used_rows, used_cols, matches = set(), set(), []
+    for k in order:
+        r, c = int(rows[k]), int(cols[k])
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        matches.append((r, c))
+    return matches
+
+
+def _boxes_to_z(boxes):
+    """[x1, y1, x2, y2] 转换为卡尔曼观测 [cx, cy, w, h]"""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2,
+                     boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]], axis=1)
+
+
+def _x_to_boxes(x):
+    cx, cy, w, h = x[:, 0], x[:, 1], x[:, 2], x[:, 3]
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+
+def odometry_pixel_shift(intrinsics, camera_to_arm, pose_prev, pose_now, depth, arm_mount=(0.0, 0.0, 0.0)):
+    """根据两次里程计位姿估计静止目标在图像中的平移（像素）
+
+    取光轴上深度为depth（单位mm）的点，按pose_prev变换到里程计坐标系，再按pose_now
+    变换回相机坐标系并投影，两次投影之差即底盘运动引起的图像平移。
+
+    返回:
+        (du, dv)
+    """
+    T = np.asarray(camera_to_arm, dtype=np.float64)
+    R, t = T[:3, :3], T[:3, 3]
+    arm_point = R @ np.array([0.0, 0.0, depth]) + t
+    odom_point = arm_to_odom(arm_point, pose_prev, arm_mount)
+    cam = (odom_to_arm(odom_point, pose_now, arm_mount)[0] - t) @ R
+    if cam[2] <= 0:
+        return 0.0, 0.0
+    return (intrinsics['fx'] * cam[0] / cam[2], intrinsics['fy'] * cam[1] / cam[2])
+
+
+class MultiObjectTracker:
+    """多目标跟踪器
+
+    每条轨迹用匀速卡尔曼滤波器估计检测框 [cx, cy, w, h] 及中心速度，所有轨迹的状态
+    存放在数组中统一预测和更新。模型检测结果到来时用向量化IoU贪心关联并更新；两次
+    推理之间可用稀疏光流（LK）或底盘里程计推算的图像平移传播轨迹。轨迹置信度随未被
+    检测确认的帧数衰减，供推理调度器判断何时需要重新调用模型。
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=3, max_age=30, confidence_decay=0.95,
+                 process_noise=1.0, measurement_noise=4.0, flow_noise=16.0, flow_grid=3,
+                 flow_min_points=3):
+        """初始化跟踪器
+
+        参数:
+            iou_threshold: 检测与轨迹关联的最小IoU
+            max_missed: 推理时连续未匹配到检测的次数达到该值后删除轨迹
+            max_age: 距上次被检测确认的帧数达到该值后删除轨迹
+            confidence_decay: 每帧未被检测确认时置信度的衰减系数
+            process_noise: 过程噪声（像素）
+            measurement_noise: 检测观测噪声（像素）
+            flow_noise: 光流/里程计观测噪声（像素）
+            flow_grid: 每个检测框内用于光流的采样网格边长（flow_grid x flow_grid个点）
+            flow_min_points: 光流成功跟踪的点数少于该值时只用卡尔曼预测
+        """
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.max_age = max_age
+        self.confidence_decay = confidence_decay
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.flow_noise = flow_noise
+        self.flow_grid = flow_grid
+        self.flow_min_points = flow_min_points
+        self._next_id = 1
+        self._reset_arrays()
+
+    def _reset_arrays(self):
+        self._x = np.empty((0, 6))  # [cx, cy, w, h, vx, vy]
+        self._P = np.empty((0, 6, 6))
+        self._ids = np.empty(0, dtype=np.int64)
+        self._scores = np.empty(0)
+        self._age = np.empty(0, dtype=np.int64)  # 距上次被检测确认的帧数
+        self._missed = np.empty(0, dtype=np.int64)
+        self._labels = []
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def confidence(self):
+        """每条轨迹的当前置信度：检测分数按未确认帧数衰减"""
+        return self._scores * self.confidence_decay ** self._age
+
+    @property
+    def velocity(self):
+        """每条轨迹的中心速度（像素/帧），形状 (N, 2)"""
+        return self._x[:, 4:6]
+
+    def predict(self, dt=1.0):
+        """所有轨迹按匀速模型前推dt帧"""
+        if len(self._ids) == 0:
+            return
+        F = np.eye(6)
+        F[0, 4] = F[1, 5] = dt
+        q = self.process_noise ** 2 * dt
+        Q = np.diag([q, q, q, q, q * 0.25, q * 0.25])
+        self._x = self._x @ F.T
+        self._P = F @ self._P @ F.T + Q
+        self._age += 1
+
+    def _kf_update(self, index, z, noise):
+        """对index指定的轨迹做观测为 [cx, cy, w, h] 的卡尔曼更新"""
+        P = self._P[index]
+        S = P[:, :4, :4] + np.eye(4) * noise ** 2
+        K = P[:, :, :4] @ np.linalg.inv(S)
+        y = z - self._x[index, :4]
+        self._x[index] += (K @ y[:, :, None])[:, :, 0]
+        self._P[index] = P - K @ P[:, :4, :]
+
+    def update(self, detections):
+        """用模型检测结果更新轨迹（调用前应先predict到当前帧）
+
+        参数:
+            detections: analyze_frame返回的目标列表，需包含bbox
+
+        返回:
+            与detections一一对应的轨迹ID列表
+        """
+        boxes = np.array([d['bbox'] for d in detections], dtype=np.float64).reshape(-1, 4)
+        matches = greedy_match(iou_matrix(_x_to_boxes(self._x), boxes), self.iou_threshold)
+        det_ids = [None] * len(detections)
+
+        matched_tracks = np.array([m[0] for m in matches], dtype=np.int64)
+        matched_dets = np.array([m[1] for m in matches], dtype=np.int64)
+        if len(matches):
+            self._kf_update(matched_tracks, _boxes_to_z(boxes[matched_dets]), self.measurement_noise)
+            self._age[matched_tracks] = 0
+            self._missed[matched_tracks] = 0
+            for r, c in matches:
+                self._scores[r] = detections[c].get('score', 1.0)
+                self._labels[r] = detections[c].get('class')
+                det_ids[c] = int(self._ids[r])
+
+        unmatched = np.ones(len(self._ids), dtype=bool)
+        unmatched[matched_tracks] = False
+        self._missed[unmatched] += 1
+
+        # 未匹配的检测建立新轨迹
+        new = [c for c in range(len(detections)) if det_ids[c] is None]
+        if new:
+            z = _boxes_to_z(boxes[new])
+            x = np.zeros((len(new), 6))
+            x[:, :4] = z
+            P = np.tile(np.diag([self.measurement_noise ** 2] * 4 + [100.0, 100.0]), (len(new), 1, 1))
+            ids = np.arange(self._next_id, self._next_id + len(new))
+            self._next_id += len(new)
+            self._x = np.concatenate([self._x, x])
+            self._P = np.concatenate([self._P, P])
+            self._ids = np.concatenate([self._ids, ids])
+            self._scores = np.concatenate([self._scores, [detections[c].get('score', 1.0) for c in new]])
+            self._age = np.concatenate([self._age, np.zeros(len(new), dtype=np.int64)])
+            self._missed = np.concatenate([self._missed, np.zeros(len(new), dtype=np.int64)])
+            self._labels.extend(detections[c].get('class') for c in new)
+            for k, c in enumerate(new):
+                det_ids[c] = int(ids[k])
+
+        self._prune()
+        return det_ids
+
+    def propagate_shift(self, du, dv):
+        """用外部估计的图像平移（如底盘里程计）作为观测更新所有轨迹的位置"""
+        if len(self._ids) == 0:
+            return
+        z = self._x[:, :4].copy()
+        z[:, 0] += du - self._x[:, 4]
+        z[:, 1] += dv - self._x[:, 5]
+        self._kf_update(np.arange(len(self._ids)), z, self.flow_noise)
+
+    def propagate_flow(self, prev_gray, gray):
+        """用稀疏LK光流估计每条轨迹的位移并作为观测更新（调用前应先predict到当前帧）
+
+        返回:
+            光流成功的轨迹数量
+        """
+        n = len(self._ids)
+        if n == 0:
+            return 0
+        # 用predict之前（上一帧）的位置在检测框中部采样网格点
+        boxes = _x_to_boxes(self._x - np.concatenate([self._x[:, 4:6], np.zeros((n, 4))], axis=1))
+        g = (np.arange(self.flow_grid) + 0.5) / self.flow_grid * 0.5 + 0.25
+        gx, gy = np.meshgrid(g, g)
+        w = (boxes[:, 2] - boxes[:, 0])[:, None]
+        h = (boxes[:, 3] - boxes[:, 1])[:, None]
+        px = boxes[:, 0:1] + w * gx.ravel()[None, :]
+        py = boxes[:, 1:2] + h * gy.ravel()[None, :]
+        points = np.stack([px.ravel(), py.ravel()], axis=1).astype(np.float32).reshape(-1, 1, 2)
+
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None,
+                                                    winSize=(15, 15), maxLevel=2)
+        if moved is None:
+            return 0
+        k = self.flow_grid * self.flow_grid
+        disp = (moved - points).reshape(n, k, 2)
+        ok = status.reshape(n, k).astype(bool)
+        disp = np.where(ok[:, :, None], disp, np.nan)
+        valid = ok.sum(axis=1) >= self.flow_min_points
+        if not valid.any():
+            return 0
+        index = np.nonzero(valid)[0]
+        shift = np.nanmedian(disp[index], axis=1)
+        z = self._x[index, :4].copy()
+        z[:, :2] = boxes[index, :2] + (boxes[index, 2:4] - boxes[index, :2]) / 2 + shift
+        self._kf_update(index, z, self.flow_noise)
+        return len(index)
+
+    def _prune(self):
+        keep = (self._missed < self.max_missed) & (self._age < self.max_age)
+        if keep.all():
+            return
+        self._x, self._P = self._x[keep], self._P[keep]
+        self._ids, self._scores = self._ids[keep], self._scores[keep]
+        self._age, self._missed = self._age[keep], self._missed[keep]
+        self._labels = [label for label, k in zip(self._labels, keep) if k]
+
+    def tracks(self):
+        """以analyze_frame相同的格式返回当前轨迹，附加track_id和confidence"""
+        self._prune()
+        boxes = _x_to_boxes(self._x)
+        confidence = self.confidence
+        return [{
+            'x': float(self._x[i, 0]),
+            'y': float(self._x[i, 1]),
+            'bbox': [float(c) for c in boxes[i]],
+            'score': float(self._scores[i]),
+            'class': self._labels[i],
+            'track_id': int(self._ids[i]),
+            'confidence': float(confidence[i]),
+        } for i in range(len(self._ids))]
+
+    def reset(self):
+        """删除全部轨迹"""
+        self._reset_arrays()
+
+
+class InferenceScheduler:
+    """自适应推理间隔调度
+
+    以轨迹的像素速度估计场景运动：运动越快，两次推理之间卡尔曼/光流累积的误差越大，
+    推理间隔越短。没有轨迹或任一轨迹置信度低于阈值时立即推理。
+    """
+
+    def __init__(self, min_interval=1, max_interval=10, max_drift=8.0, min_confidence=0.5):
+        """
+        参数:
+            min_interval: 最小推理间隔（帧）
+            max_interval: 最大推理间隔（帧）
+            max_drift: 两次推理之间允许的最大目标像素位移
+            min_confidence: 轨迹置信度低于该值时立即推理
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_drift = max_drift
+        self.min_confidence = min_confidence
+        self.interval = min_interval
+        self._since_inference = 0
+
+    def should_infer(self, tracker):
+        """判断当前帧是否需要调用模型"""
+        self._since_inference += 1
+        if len(tracker) == 0 or self._since_inference >= self.interval:
+            return True
+        return bool((tracker.confidence < self.min_confidence).any())
+
+    def inferred(self, tracker):
+        """推理完成后调用，按当前轨迹速度调整推理间隔"""
+        self._since_inference = 0
+        if len(tracker) == 0:
+            self.interval = self.min_interval
+            return
+        speed = float(np.max(np.hypot(tracker.velocity[:, 0], tracker.velocity[:, 1])))
+        interval = int(self.max_drift / speed) if speed > 1e-6 else self.max_interval
+        self.interval = int(np.clip(interval, self.min_interval, self.max_interval))
+
+    def reset(self):
+        """恢复初始间隔，使下一帧立即推理"""
+        self.interval = self.min_interval
+        self._since_inference = 0
+
+
+class TrackedDetector:
+    """带跟踪的检测器，可替代ModelInterface传给主循环和CrawlHarvester
+
+    analyze_frame接口与ModelInterface一致，但只在调度器判断需要时才调用模型，
+    其余帧用光流或里程计传播轨迹，返回的目标额外带有稳定的track_id。
+    """
+
+    def __init__(self, model_interface, tracker=None, scheduler=None, use_flow=True, motion_fn=None):
+        """
+        参数:
+            model_interface: ModelInterface对象
+            tracker: MultiObjectTracker对象，默认新建
+            scheduler: InferenceScheduler对象，默认新建
+            use_flow: 是否用光流传播轨迹
+            motion_fn: 可选，无参数调用返回自上一帧以来的图像平移 (du, dv) 或None，
+                例如基于odometry_pixel_shift的底盘里程计估计；优先于光流使用
+        """
+        self.model_interface = model_interface
+        self.tracker = tracker if tracker is not None else MultiObjectTracker()
+        self.scheduler = scheduler if scheduler is not None else InferenceScheduler()
+        self.use_flow = use_flow
+        self.motion_fn = motion_fn
+        self._prev_gray = None
+        self.stats = {'frames': 0, 'inferences': 0, 'flow_updates': 0, 'odometry_updates': 0}
+
+    def reset(self):
+        """场景已改变（采摘完成、底盘移动）时调用：清空轨迹并在下一帧立即推理
+
+        已采摘果实的轨迹否则会被卡尔曼/光流继续传播到下一次定时推理，被重复采摘。
+        """
+        self.tracker.reset()
+        self.scheduler.reset()
+        self._prev_gray = None
+
+    def analyze_frame(self, frame, gray=None, depth=None):
+        """分析图像帧，返回跟踪后的目标列表（格式同ModelInterface.analyze_frame）
+
+        参数:
+            frame: BGR图像帧
+            gray: 可选，预先转换好的灰度图（例如由流水线的预处理阶段计算）
+            depth: 可选，对齐的深度图，转交给model_interface（如GatedDetector的深度筛选）
+        """
+        self.stats['frames'] += 1
+        self.tracker.predict()
+
+        shift = self.motion_fn() if self.motion_fn is not None else None
+        if shift is not None:
+            self.tracker.propagate_shift(*shift)
+            self.stats['odometry_updates'] += 1
+        elif self.use_flow:
+            if gray is None:
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            if self._prev_gray is not None and self._prev_gray.shape == gray.shape:
+                if self.tracker.propagate_flow(self._prev_gray, gray):
+                    self.stats['flow_updates'] += 1
+        self._prev_gray = gray if shift is None and self.use_flow else None
+
+        if self.scheduler.should_infer(self.tracker):
+            detections = self.model_interface.analyze_frame(frame, depth=depth)
+            self.tracker.update(detections or [])
+            self.scheduler.inferred(self.tracker)
+            self.stats['inferences'] += 1
+
+        # 只返回最近被检测确认过的轨迹
+        return [t for t in self.tracker.tracks() if t['confidence'] >= self.scheduler.min_confidence]
@@ -1,6 +1,9 @@
+import logging
 import cv2
 import numpy as np
-from pyorbbecsdk import Context, Device, StreamProfile, FrameSet
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
 
 class Gemini335:
     """Gemini335深度相机的Python实现，基于Orbbec SDK v2
@@ -43,6 +46,11 @@ class Gemini335:
         
         尝试连接到相机设备，并配置彩色和深度流。如果连接失败，将抛出异常。
         """
+        # 只在连接实际相机时导入Orbbec SDK，帧处理（process_frame）和未安装SDK的环境不受影响
+        try:
+            from pyorbbecsdk import Context, StreamProfile
+        except ImportError:
+            raise RuntimeError("未安装pyorbbecsdk，无法连接Gemini335相机")
         try:
             # 创建设备实例
             context = Context()
@@ -80,7 +88,7 @@ class Gemini335:
             if not color_profile:
                 # 如果找不到指定参数的配置，使用第一个可用配置
                 color_profile = color_profiles[0]
-                print(f"警告：找不到指定的彩色流配置，使用默认配置: {color_profile.width}x{color_profile.height}@{color_profile.fps}")
+                logger.warning("找不到指定的彩色流配置，使用默认配置: %sx%s@%s", color_profile.width, color_profile.height, color_profile.fps)
             
             # 配置深度流
             depth_profiles = self.device.get_stream_profiles(StreamProfile.Type.DEPTH)
@@ -95,7 +103,7 @@ class Gemini335:
             if not depth_profile:
                 # 如果找不到指定参数的配置，使用第一个可用配置
                 depth_profile = depth_profiles[0]
-                print(f"警告：找不到指定的深度流配置，使用默认配置: {depth_profile.width}x{depth_profile.height}@{depth_profile.fps}")
+                logger.warning("找不到指定的深度流配置，使用默认配置: %sx%s@%s", depth_profile.width, depth_profile.height, depth_profile.fps)
             
             # 启动彩色和深度流
             self.color_stream = self.device.start_stream(color_profile)
@@ -104,12 +112,13 @@ class Gemini335:
             # 创建对齐句柄，将深度图像与彩色图像对齐
             self.align_handle = self.device.create_align(StreamProfile.Type.COLOR)
             
-            print("相机初始化成功")
+            logger.info("相机初始化成功")
             
         except Exception as e:
-            print(f"相机初始化失败: {str(e)}")
+            logger.error("相机初始化失败: %s", e)
             raise
     
+    @metrics.timed("camera_capture_seconds", "Gemini335.capture_frame耗时")
     def capture_frame(self, align=True):
         """捕捉一帧图像
         
@@ -121,13 +130,13 @@ class Gemini335:
         """
         try:
             if not self.device or not self.color_stream or not self.depth_stream:
-                print("相机未初始化")
+                logger.error("相机未初始化")
                 return None
             
             # 等待帧
             frame_set = self.device.wait_for_frames(1000)
             if not frame_set:
-                print("超时未获取到帧")
+                logger.warning("超时未获取到帧")
                 return None
             
             # 获取彩色帧和深度帧
@@ -135,7 +144,7 @@ class Gemini335:
             depth_frame = frame_set.get_depth_frame()
             
             if not color_frame or not depth_frame:
-                print("未获取到完整的帧数据")
+                logger.warning("未获取到完整的帧数据")
                 return None
             
             # 将帧数据转换为numpy数组
@@ -159,7 +168,7 @@ class Gemini335:
             }
             
         except Exception as e:
-            print(f"捕捉帧失败: {str(e)}")
+            logger.error("捕捉帧失败: %s", e)
             return None
     
     def get_camera_intrinsics(self):
@@ -169,10 +178,12 @@ class Gemini335:
             包含彩色相机和深度相机内参的字典
         """
         if not self.device:
-            print("相机未初始化")
+            logger.error("相机未初始化")
             return None
             
         try:
+            from pyorbbecsdk import StreamProfile
+
             color_intrinsics = self.device.get_intrinsics(StreamProfile.Type.COLOR)
             depth_intrinsics = self.device.get_intrinsics(StreamProfile.Type.DEPTH)
             
@@ -196,7 +207,7 @@ class Gemini335:
             }
             
         except Exception as e:
-            print(f"获取相机内参失败: {str(e)}")
+            logger.error("获取相机内参失败: %s", e)
             return None
     
     def set_exposure(self, exposure_time_us):
@@ -206,14 +217,14 @@ class Gemini335:
             exposure_time_us: 曝光时间，单位微秒
         """
         if not self.device:
-            print("相机未初始化")
+            logger.error("相机未初始化")
             return False
             
         try:
             self.device.set_exposure_time(exposure_time_us)
             return True
         except Exception as e:
-            print(f"设置曝光时间失败: {str(e)}")
+            logger.error("设置曝光时间失败: %s", e)
             return False
     
     def set_gain(self, gain):
@@ -223,14 +234,14 @@ class Gemini335:
             gain: 增益值，范围通常为1.0到16.0
         """
         if not self.device:
-            print("相机未初始化")
+            logger.error("相机未初始化")
             return False
             
         try:
             self.device.set_gain(gain)
             return True
         except Exception as e:
-            print(f"设置增益失败: {str(e)}")
+            logger.error("设置增益失败: %s", e)
             return False
     
     def release_camera(self):
@@ -256,10 +267,10 @@ class Gemini335:
                 self.device.destroy()
                 self.device = None
                 
-            print("相机资源已释放")
+            logger.info("相机资源已释放")
             
         except Exception as e:
-            print(f"释放相机资源失败: {str(e)}")
+            logger.error("释放相机资源失败: %s", e)
             
     def process_frame(self, frame):
         """帧处理示例
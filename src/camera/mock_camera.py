@@ -0,0 +1,69 @@
+import logging
+import time
+import cv2
+import numpy as np
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MockCamera:
+    """模拟相机类，用于在没有实际相机设备的情况下测试项目"""
+    def __init__(self, color_width=640, color_height=480, depth_width=640, depth_height=480):
+        self.color_width = color_width
+        self.color_height = color_height
+        self.depth_width = depth_width
+        self.depth_height = depth_height
+        self.frame_count = 0
+        
+    def initialize_camera(self):
+        """初始化模拟相机"""
+        logger.info("初始化模拟相机成功")
+        return True
+        
+    @metrics.timed("camera_capture_seconds")
+    def capture_frame(self, align=True):
+        """捕捉模拟帧"""
+        self.frame_count += 1
+        
+        # 创建模拟彩色图像（蓝色背景，中间有一个绿色方块）
+        color_image = np.zeros((self.color_height, self.color_width, 3), dtype=np.uint8)
+        color_image[:] = (255, 0, 0)  # 蓝色背景
+        cv2.rectangle(color_image, (200, 150), (440, 330), (0, 255, 0), -1)  # 绿色方块
+        
+        # 创建模拟深度图像（中间深度值较小，周围深度值较大）
+        depth_image = np.ones((self.depth_height, self.depth_width), dtype=np.uint16) * 1000
+        cv2.rectangle(depth_image, (200, 150), (440, 330), 500, -1)
+        
+        return {
+            'color': color_image,
+            'depth': depth_image,
+            'color_timestamp': time.time(),
+            'depth_timestamp': time.time()
+        }
+        
+    def get_camera_intrinsics(self):
+        """获取模拟相机内参"""
+        return {
+            'color': {
+                'fx': 600.0,
+                'fy': 600.0,
+                'cx': self.color_width / 2,
+                'cy': self.color_height / 2,
+                'width': self.color_width,
+                'height': self.color_height
+            },
+            'depth': {
+                'fx': 600.0,
+                'fy': 600.0,
+                'cx': self.depth_width / 2,
+                'cy': self.depth_height / 2,
+                'width': self.depth_width,
+                'height': self.depth_height
+            }
+        }
+        
+    def release_camera(self):
+        """释放模拟相机资源"""
+        logger.info("释放模拟相机资源")
+        return True
@@ -1,9 +1,31 @@
+import copy
+import json
+import os
+
+ENV_PREFIX = "AGRI_"  # 环境变量覆盖：AGRI_<部分>__<字段>，如 AGRI_MODEL__CONFIDENCE_THRESHOLD=0.6
+SETTINGS_FILE_ENV = "AGRI_SETTINGS_FILE"  # 设置文件路径（JSON）
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+
+class SettingsError(ValueError):
+    """设置文件或环境变量中的字段名或取值不合法"""
+
+
 class CameraSettings:
     """相机设置类"""
+    RELOADABLE = ()
+    LIMITS = {'frame_rate': (1, None), 'capture_latency': (0.0, 1.0), 'color_width': (1, None),
+              'color_height': (1, None), 'color_fps': (1, None), 'depth_width': (1, None),
+              'depth_height': (1, None), 'depth_fps': (1, None)}
+    CHOICES = {}
+
     def __init__(self):
+        self.backend = "gemini335"  # 相机后端："gemini335"或"mock"
+        self.fallback_backend = "mock"  # 相机初始化失败时使用的后端，空表示不退回
         self.resolution = (640, 480)
         self.frame_rate = 30
         self.depth_mode = "high"
+        self.capture_latency = 0.03  # 曝光到取得帧数据之间的固定延迟，单位秒，爬行模式用它估计帧的曝光时刻
         
         # 新增详细参数
         self.color_width = 640
@@ -31,6 +53,31 @@ class CameraSettings:
 
 class RobotSettings:
     """机器人设置类"""
+    # 运行中修改设置文件即可生效的字段，其余字段修改后需重启
+    RELOADABLE = ('arm_default_velocity', 'arm_default_acceleration', 'arm_gripper_open_time',
+                  'arm_gripper_close_time', 'arm_approach_offset', 'arm_use_blending', 'arm_blend_radius',
+                  'base_speed', 'base_crawl_speed', 'arm_approach_time', 'crawl_drift_tolerance',
+                  'coverage_max_picks_per_stop', 'base_move_timeout_margin')
+    LIMITS = {'base_speed': (0.0, 2.0), 'arm_default_velocity': (1.0, 100.0),
+              'arm_default_acceleration': (1.0, 100.0), 'arm_gripper_open_time': (0.0, 10.0),
+              'arm_gripper_close_time': (0.0, 10.0), 'arm_approach_offset': (0.0, 300.0),
+              'arm_blend_radius': (0.0, 100.0), 'arm_gripper_radius': (0.0, None),
+              'arm_grasp_max_tilt': (0.0, 90.0), 'arm_min_manipulability': (0.0, 1.0),
+              'arm_sim_rpc_latency': (0.0, None), 'arm_sim_failure_rate': (0.0, 1.0),
+              'arm_state_poll_rate': (0.0, None), 'base_wheel_radius': (0.0, None),
+              'base_wheel_separation': (0.0, None), 'base_encoder_ticks_per_rev': (1, None),
+              'base_control_rate': (1.0, None), 'base_max_acceleration': (0.0, None),
+              'base_move_timeout_margin': (0.0, None),
+              'base_crawl_speed': (0.0, 0.5), 'arm_approach_time': (0.0, None),
+              'crawl_drift_tolerance': (0.0, None), 'fruit_merge_radius': (0.0, None),
+              'fruit_max_attempts': (1, None), 'fruit_archive_distance': (0.0, None),
+              'field_row_count': (1, None), 'field_row_length': (0.0, None), 'field_row_spacing': (0.0, None),
+              'field_headland': (0.0, None), 'coverage_min_overlap': (0.0, 0.9),
+              'coverage_working_distance': (0.0, None), 'coverage_reach_window': (0.0, None),
+              'coverage_max_picks_per_stop': (1, None), 'arm_pick_cycle_time': (0.0, None),
+              'multi_arm_clearance': (0.0, None), 'multi_arm_reach_radius': (0.0, None)}
+    CHOICES = {'harvest_mode': ("stop_and_go", "crawl"), 'field_first_turn': ("left", "right")}
+
     def __init__(self):
         self.arm_length = 1.0  # in meters
         self.base_speed = 0.5  # in meters per second
@@ -42,18 +89,96 @@ class RobotSettings:
         self.arm_default_acceleration = 50.0  # 加速度百分比
         self.arm_gripper_open_time = 0.5  # 夹爪打开时间，单位秒
         self.arm_gripper_close_time = 0.5  # 夹爪关闭时间，单位秒
-        self.arm_approach_offset = 50  # 接近目标时的偏移量，单位毫米
+        self.arm_approach_offset = 50.0  # 接近目标时的偏移量，单位毫米
+        self.arm_use_blending = True  # 摘取时是否使用平滑连续轨迹（pick_blended）
+        self.arm_blend_radius = 20.0  # 平滑过渡半径，单位毫米
+        
+        self.arm_place_position = [500.0, 0.0, 500.0, 0.0, 0.0, 0.0]  # 放置位姿，单位mm, °
+        self.arm_grasp_estimation = True  # 是否根据目标局部点云估计抓取接近方向和姿态
+        self.arm_gripper_radius = 30.0  # 夹爪接近通道半径，单位毫米，用于碰撞检查
+        self.arm_grasp_max_tilt = 60.0  # 接近方向相对竖直方向的最大偏角，单位度
+        
+        # 相机坐标系到机械臂基坐标系的4x4变换矩阵（平移单位mm），需要根据手眼标定结果修改
+        # 示例值：相机光轴竖直向下，安装在机械臂基座前方400mm、上方800mm处
+        self.camera_to_arm_transform = [
+            [1.0, 0.0, 0.0, 400.0],
+            [0.0, -1.0, 0.0, 0.0],
+            [0.0, 0.0, -1.0, 800.0],
+            [0.0, 0.0, 0.0, 1.0]
+        ]
+        
+        # 工作空间可达性地图（python -m robot.reachability 离线生成），不含扩展名
+        self.arm_reachability_map = "data/reachability_fr5"
+        self.arm_min_manipulability = 0.05  # 可操作度低于该值视为奇异区域（0~1）
+        
+        # 机械臂后端："fairino"为实际机械臂，"sim"为仿真机械臂
+        self.arm_backend = "fairino"
+        self.arm_sim_rpc_latency = 0.002  # 仿真RPC往返延时，单位秒
+        self.arm_sim_failure_rate = 0.0  # 仿真RPC随机故障概率（0~1）
+        self.arm_state_poll_rate = 50.0  # 机械臂状态轮询频率，单位Hz，0表示不启动状态监视
         
         # 基础车辆相关设置
         self.base_wheel_radius = 0.1  # 车轮半径，单位米
         self.base_wheel_separation = 0.5  # 车轮间距，单位米
+        self.base_backend = "sim"  # 底盘后端："serial"为串口下位机，"sim"为仿真底盘
+        self.base_serial_port = "/dev/ttyUSB0"  # 底盘下位机串口
+        self.base_serial_baudrate = 115200
+        self.base_encoder_ticks_per_rev = 4096  # 车轮每转编码器计数
+        self.base_control_rate = 50.0  # 底盘控制循环频率，单位Hz
+        self.base_max_acceleration = 0.5  # 接近目标时的减速度，单位米/秒^2
+        self.base_move_timeout_margin = 2.0  # 移动超过预计耗时的1.5倍加该秒数仍未完成时停车
+        
+        # 采摘模式："stop_and_go"为走走停停，"crawl"为底盘持续爬行、边走边采
+        self.harvest_mode = "stop_and_go"
+        self.base_crawl_speed = 0.02  # 爬行速度，单位米/秒
+        self.arm_mount_pose = [0.0, 0.0, 0.0]  # 机械臂基座在车体坐标系中的位姿 (x mm, y mm, yaw °)
+        self.arm_approach_time = 1.0  # 下发采摘指令到夹爪到达目标的预计时间，单位秒
+        self.crawl_drift_tolerance = 15.0  # 夹爪闭合期间允许的目标偏移，单位毫米，超过则刹车采摘
+
+        # 果实地图（里程计坐标系），用于合并重复观测、跳过已采摘或已放弃的果实
+        self.fruit_map_enabled = True
+        self.fruit_map_path = "data/fruit_map.json"  # 退出时保存，下次启动时移入归档文件（里程计每次从原点开始）
+        self.fruit_map_archive_path = "data/fruit_map_archive.jsonl"  # 落后果实的归档文件
+        self.fruit_merge_radius = 0.03  # 观测合并半径，单位米
+        self.fruit_max_attempts = 2  # 单个果实最多尝试采摘次数
+        self.fruit_archive_distance = 2.0  # 果实落后底盘超过该距离（单位米）后移出内存
+
+        # 田间行布局与覆盖规划（作业通道平行于里程计x轴，蛇形遍历）
+        self.field_row_count = 1  # 作业通道数量
+        self.field_row_length = 20.0  # 行长度，单位米
+        self.field_row_spacing = 1.5  # 行间距，单位米
+        self.field_headland = 1.0  # 掉头前驶出行尾的距离，单位米
+        self.field_first_turn = "left"  # 第一次掉头方向
+        self.coverage_min_overlap = 0.05  # 相邻停车点视野的最小重叠比例
+        self.coverage_working_distance = 600.0  # 相机到作物冠层的距离，单位毫米，用于计算视野覆盖长度
+        self.coverage_reach_window = 0.6  # 无可达性地图时机械臂沿行方向的可达窗口，单位米
+        self.coverage_canopy_position = [0.0, 200.0]  # 冠层在机械臂坐标系中的 (y, z)，单位毫米
+        self.coverage_max_picks_per_stop = 20  # 单个停车点最多采摘次数
+        self.arm_pick_cycle_time = 7.5  # 单个果实的采摘周期，单位秒，用于估计覆盖时间
+
+        # 多臂平台：非空时按列表创建多台机械臂，共享同一条感知流水线（检测结果仍按
+        # camera_to_arm_transform换算到arm_mount_pose处的参考臂坐标系）
+        # 每项形如 {"name": "left", "ip": "192.168.58.2", "mount": [x mm, y mm, yaw °],
+        # "place_position": [...]}，省略ip、mount、place_position时使用上面的单臂设置
+        self.arms = []
+        self.multi_arm_clearance = 150.0  # 不同机械臂运动路径之间的最小距离，单位毫米
+        self.multi_arm_reach_radius = 850.0  # 没有可达性地图时各臂的可达半径，单位毫米
 
 
 class ModelSettings:
     """模型设置类"""
+    RELOADABLE = ('api_endpoint', 'timeout', 'confidence_threshold', 'target_classes')
+    LIMITS = {'timeout': (0.0, None), 'confidence_threshold': (0.0, 1.0), 'input_width': (1, None),
+              'input_height': (1, None), 'min_inference_interval': (1, None), 'max_inference_interval': (1, None),
+              'tracker_max_drift': (0.0, None), 'tracker_iou_threshold': (0.0, 1.0),
+              'tracker_min_confidence': (0.0, 1.0), 'tracker_reference_depth': (0.0, None)}
+    CHOICES = {}
+
     def __init__(self):
+        self.backend = "http"  # 模型后端，目前只有HTTP推理服务
         self.api_endpoint = "http://localhost:5000/predict"
-        self.timeout = 5  # in seconds
+        self.warmup_request = True  # 启动时发送一帧空白图像预热模型服务
+        self.timeout = 5.0  # in seconds
         
         # 目标检测相关设置
         self.confidence_threshold = 0.7  # 置信度阈值
@@ -65,25 +190,350 @@ class ModelSettings:
         self.normalization_mean = [0.485, 0.456, 0.406]
         self.normalization_std = [0.229, 0.224, 0.225]
 
+        # 多目标跟踪：模型只在需要时推理，其余帧用光流或里程计传播轨迹
+        self.tracking_enabled = True
+        self.min_inference_interval = 1  # 最小推理间隔，单位帧
+        self.max_inference_interval = 10  # 最大推理间隔，单位帧
+        self.tracker_max_drift = 8.0  # 两次推理之间允许的目标像素位移，决定自适应推理间隔
+        self.tracker_iou_threshold = 0.3  # 检测与轨迹关联的最小IoU
+        self.tracker_min_confidence = 0.5  # 轨迹置信度低于该值时立即推理
+        self.tracker_use_flow = True  # 是否用稀疏光流传播轨迹
+        self.tracker_use_odometry = True  # 底盘运动时是否用里程计推算图像平移传播轨迹
+        self.tracker_reference_depth = 600.0  # 里程计推算图像平移时使用的目标参考深度，单位毫米
+
+
+class PrefilterSettings:
+    """推理前颜色/深度预筛选设置类"""
+    RELOADABLE = ('color_ranges', 'use_depth', 'depth_range', 'downsample', 'min_region_area', 'roi_margin',
+                  'crop_inference', 'max_rois', 'max_crop_fraction')
+    LIMITS = {'downsample': (1, 16), 'min_region_area': (0, None), 'roi_margin': (0, None), 'max_rois': (1, None),
+              'max_crop_fraction': (0.0, 1.0)}
+    CHOICES = {}
+
+    def __init__(self):
+        self.enabled = False  # 是否启用预筛选：没有候选区域的帧不调用模型
+        # 各类别成熟果实的HSV范围 [h_lo, s_lo, v_lo, h_hi, s_hi, v_hi]（OpenCV取值，H为0~180）
+        self.color_ranges = {
+            "tomato": [[0, 90, 60, 10, 255, 255], [170, 90, 60, 180, 255, 255]],
+            "apple": [[0, 80, 50, 12, 255, 255], [165, 80, 50, 180, 255, 255]],
+            "orange": [[10, 120, 80, 25, 255, 255]],
+        }
+        self.use_depth = True  # 是否要求候选区域的深度在depth_range内
+        self.depth_range = [200.0, 1500.0]  # 候选区域的深度范围，单位mm
+        self.downsample = 4  # 计算掩码前的降采样倍数
+        self.min_region_area = 200  # 候选区域最小面积，单位原图像素
+        self.roi_margin = 24  # ROI外扩像素数
+        self.crop_inference = True  # 是否只把ROI的外接矩形裁剪下来推理（每帧一次请求）
+        self.max_rois = 4  # ROI数量超过该值时整帧推理
+        self.max_crop_fraction = 0.5  # ROI外接矩形面积超过整帧的该比例时整帧推理
+
+
+class PipelineSettings:
+    """流水线运行时设置类"""
+    RELOADABLE = ()
+    LIMITS = {'capture_queue_size': (1, None), 'infer_queue_size': (1, None), 'queue_size': (1, None),
+              'infer_workers': (1, None)}
+    CHOICES = {'preprocess_executor': ("thread", "process")}
+
+    def __init__(self):
+        self.capture_queue_size = 1  # 预处理阶段输入队列容量，满时丢弃最旧帧
+        self.infer_queue_size = 1  # 推理阶段输入队列容量，满时丢弃最旧帧
+        self.queue_size = 2  # 定位、决策、执行阶段的输入队列容量，满时阻塞
+        self.preprocess_executor = "thread"  # 预处理阶段运行方式："thread"或"process"
+        self.infer_workers = 1  # 并发推理请求数（启用跟踪时固定为1）
+
+
+class StartupSettings:
+    """启动设置类"""
+    RELOADABLE = ()
+    LIMITS = {'settings_watch_interval': (0.0, None)}
+    CHOICES = {}
+
+    def __init__(self):
+        self.parallel = True  # 是否并行初始化相机、机械臂、底盘、模型和地图
+        self.report_file = ""  # 启动耗时报告的JSON路径，空表示只写日志
+        self.settings_watch_interval = 1.0  # 设置文件变化检查间隔，单位秒，0表示不热更新
+
+
+class MetricsSettings:
+    """性能指标设置类"""
+    RELOADABLE = ()
+    LIMITS = {'http_port': (0, 65535), 'export_interval': (0.1, None)}
+    CHOICES = {}
+
+    def __init__(self):
+        self.enabled = True  # 是否记录延迟直方图和计数器
+        self.http_port = 9108  # /metrics 端点端口，0表示不启动
+        self.http_host = "127.0.0.1"
+        self.export_file = ""  # 定期写入的Prometheus文本文件路径，空表示不写
+        self.export_interval = 10.0  # 写文件间隔，单位秒
+
 
 class LoggingSettings:
     """日志设置类"""
+    RELOADABLE = ()
+    LIMITS = {'max_log_size': (0, None), 'backup_count': (0, None), 'queue_size': (0, None),
+              'rate_limit_interval': (0.0, None), 'rate_limit_burst': (1, None)}
+    CHOICES = {'log_level': LOG_LEVELS, 'console_level': LOG_LEVELS + ("",)}
+
     def __init__(self):
         self.log_file = "robot_log.txt"
         self.log_level = "DEBUG"
         self.log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
         self.max_log_size = 10 * 1024 * 1024  # 10MB
         self.backup_count = 5  # 保留5个备份文件
+        self.json_lines = False  # 日志文件是否使用紧凑JSON行格式
+        self.console_level = "INFO"  # 控制台输出级别，空表示不输出到控制台
+        self.console_format = "%(asctime)s [%(levelname)s] %(message)s"
+        self.queue_size = 10000  # 异步日志队列容量，满时丢弃新记录
+        self.rate_limit_interval = 5.0  # 限流窗口，单位秒，0表示不限流
+        self.rate_limit_burst = 3  # 同一警告/错误在限流窗口内最多输出的条数
+
+
+class RecorderSettings:
+    """飞行记录器设置类"""
+    RELOADABLE = ('dump_on_failure', 'min_dump_interval', 'max_dumps')
+    LIMITS = {'capacity': (1, None), 'frame_width': (8, None), 'max_detections': (1, None),
+              'max_targets': (1, None), 'max_moves': (1, None), 'min_dump_interval': (0.0, None),
+              'max_dumps': (0, None)}
+    CHOICES = {}
+
+    def __init__(self):
+        self.enabled = True  # 是否在内存中记录最近的采摘周期
+        self.capacity = 64  # 保存的周期数
+        self.frame_width = 160  # 记录图像的宽度，单位像素，高度按相机宽高比计算
+        self.max_detections = 32  # 每个周期最多记录的检测框数
+        self.max_targets = 8  # 每个周期最多记录的目标数
+        self.max_moves = 32  # 每个周期最多记录的MoveL指令数
+        self.directory = "data/flight_recorder"  # 转储目录
+        self.dump_on_failure = True  # 异常或MoveL失败时是否自动转储
+        self.min_dump_interval = 10.0  # 自动转储的最小间隔，单位秒
+        self.max_dumps = 50  # 最多保留的转储文件数，0表示不限制
+
+
+class ProfilingSettings:
+    """运行时性能分析设置类"""
+    RELOADABLE = ('directory', 'default_duration', 'max_duration', 'sample_interval', 'top_n')
+    LIMITS = {'default_duration': (0.1, None), 'max_duration': (0.1, None), 'sample_interval': (0.001, 1.0),
+              'top_n': (1, None)}
+    CHOICES = {'signal_command': ("stacks", "cprofile", "sample", "stop", "tracemalloc snapshot")}
+
+    def __init__(self):
+        self.enabled = True  # 是否开启控制套接字和SIGUSR2信号
+        self.socket_path = "/tmp/agri-robot-profiler.sock"  # 本地控制套接字路径
+        self.signal_command = "stacks"  # 收到SIGUSR2时执行的命令
+        self.directory = "data/profiles"  # 分析结果目录
+        self.default_duration = 30.0  # 未指定时长时的分析时长，单位秒
+        self.max_duration = 600.0  # 单次分析的最长时长，单位秒
+        self.sample_interval = 0.01  # 采样分析的默认采样间隔，单位秒
+        self.top_n = 30  # 文本汇总中每个阶段列出的条目数
+
+
+def _coerce(path, default, value):
+    """按默认值的类型检查并转换取值，列表和字典逐元素递归检查
+
+    默认值为整数的字段（数量、尺寸、端口等）只接受整数值，连续量的默认值写为浮点数。
+    数值向量（如位姿）长度固定，字符串列表和嵌套列表长度可变；取值为列表的字典（如各类别的
+    颜色范围）视为映射，整体替换且可以增减键，其余字典（如相机内参）只能覆盖已有的键。
+    """
+    if isinstance(default, bool):
+        if not isinstance(value, bool):
+            raise SettingsError(f"{path}应为布尔值，实际为{value!r}")
+        return value
+    if isinstance(default, (int, float)):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise SettingsError(f"{path}应为数值，实际为{value!r}")
+        if isinstance(default, int) and not float(value).is_integer():
+            raise SettingsError(f"{path}应为整数，实际为{value!r}")
+        return type(default)(value)
+    if isinstance(default, str):
+        if not isinstance(value, str):
+            raise SettingsError(f"{path}应为字符串，实际为{value!r}")
+        return value
+    if isinstance(default, (list, tuple)):
+        if not isinstance(value, (list, tuple)):
+            raise SettingsError(f"{path}应为列表，实际为{value!r}")
+        if not default:
+            return type(default)(value)
+        if isinstance(default[0], (int, float)) and len(value) != len(default):
+            raise SettingsError(f"{path}应包含{len(default)}个元素，实际为{len(value)}个")
+        return type(default)(_coerce(f"{path}[{i}]", default[min(i, len(default) - 1)], v)
+                             for i, v in enumerate(value))
+    if isinstance(default, dict):
+        if not isinstance(value, dict):
+            raise SettingsError(f"{path}应为字典，实际为{value!r}")
+        if default and all(isinstance(v, list) for v in default.values()):
+            sample = next(iter(default.values()))
+            return {str(k): _coerce(f"{path}.{k}", sample, v) for k, v in value.items()}
+        unknown = set(value) - set(default)
+        if unknown:
+            raise SettingsError(f"{path}包含未知的键: {', '.join(sorted(unknown))}")
+        merged = dict(default)
+        merged.update({k: _coerce(f"{path}.{k}", default[k], v) for k, v in value.items()})
+        return merged
+    return value
+
+
+def _env_value(text):
+    """环境变量取值按JSON解析（数值、布尔、列表），解析失败时视为字符串"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
 
 
 class Settings:
-    """总设置类"""
+    """总设置类
+
+    默认值写在各部分的设置类中；Settings.load从JSON设置文件和AGRI_前缀的环境变量覆盖默认值，
+    并按默认值的类型以及各设置类的LIMITS、CHOICES检查取值。
+    """
+    SECTIONS = (
+        ('camera', CameraSettings),
+        ('robot', RobotSettings),
+        ('model', ModelSettings),
+        ('prefilter', PrefilterSettings),
+        ('pipeline', PipelineSettings),
+        ('metrics', MetricsSettings),
+        ('startup', StartupSettings),
+        ('logging', LoggingSettings),
+        ('recorder', RecorderSettings),
+        ('profiling', ProfilingSettings),
+    )
+
     def __init__(self):
         self.camera = CameraSettings()
         self.robot = RobotSettings()
         self.model = ModelSettings()
+        self.prefilter = PrefilterSettings()
+        self.pipeline = PipelineSettings()
+        self.metrics = MetricsSettings()
+        self.startup = StartupSettings()
         self.logging = LoggingSettings()
+        self.recorder = RecorderSettings()
+        self.profiling = ProfilingSettings()
+
+    @classmethod
+    def load(cls, path=None, environ=None):
+        """创建设置：默认值 <- 设置文件 <- 环境变量
+
+        参数:
+            path: JSON设置文件路径，形如 {"model": {"confidence_threshold": 0.6}}，None表示不读文件
+            environ: 环境变量字典，默认为os.environ
+
+        返回:
+            检查通过的Settings对象；文件无法解析或取值不合法时抛出SettingsError
+        """
+        settings = cls()
+        if path:
+            with open(path, encoding="utf-8") as f:
+                try:
+                    data = json.load(f)
+                except ValueError as e:
+                    raise SettingsError(f"设置文件{path}不是合法的JSON: {e}")
+            settings.update(data)
+        settings.update(cls.env_overrides(environ))
+        settings.validate()
+        return settings
+
+    @staticmethod
+    def env_overrides(environ=None):
+        """从环境变量中提取覆盖项，AGRI_MODEL__CONFIDENCE_THRESHOLD=0.6 -> {"model": {"confidence_threshold": 0.6}}"""
+        environ = os.environ if environ is None else environ
+        overrides = {}
+        for name, text in environ.items():
+            if not name.startswith(ENV_PREFIX) or "__" not in name:
+                continue
+            section, key = name[len(ENV_PREFIX):].lower().split("__", 1)
+            overrides.setdefault(section, {})[key] = _env_value(text)
+        return overrides
+
+    def update(self, data):
+        """用嵌套字典覆盖设置，全部字段检查通过后才写入，任一字段不合法时不做任何修改"""
+        if not isinstance(data, dict):
+            raise SettingsError("设置应为 {部分: {字段: 取值}} 形式的字典")
+        sections = dict(self.SECTIONS)
+        updates = []
+        for section, values in data.items():
+            if section not in sections:
+                raise SettingsError(f"未知的设置部分: {section}（可选: {', '.join(sections)}）")
+            if not isinstance(values, dict):
+                raise SettingsError(f"设置部分{section}应为字典")
+            current = getattr(self, section)
+            for key, value in values.items():
+                if key.isupper() or not hasattr(current, key):
+                    raise SettingsError(f"未知的设置字段: {section}.{key}")
+                updates.append((current, key, _coerce(f"{section}.{key}", getattr(current, key), value)))
+        for current, key, value in updates:
+            setattr(current, key, value)
+
+    def validate(self):
+        """检查取值范围、可选值以及字段之间的约束，不合法时抛出SettingsError"""
+        for section, _ in self.SECTIONS:
+            current = getattr(self, section)
+            for key, (low, high) in current.LIMITS.items():
+                value = getattr(current, key)
+                if (low is not None and value < low) or (high is not None and value > high):
+                    raise SettingsError(f"{section}.{key}={value}超出范围 [{low}, {high if high is not None else '∞'}]")
+            for key, choices in current.CHOICES.items():
+                if getattr(current, key) not in choices:
+                    raise SettingsError(f"{section}.{key}={getattr(current, key)!r}不是可选值: {', '.join(map(repr, choices))}")
+        if self.model.min_inference_interval > self.model.max_inference_interval:
+            raise SettingsError("model.min_inference_interval不能大于max_inference_interval")
+        if len(self.robot.camera_to_arm_transform) != 4:
+            raise SettingsError("robot.camera_to_arm_transform应为4x4矩阵")
+        if self.prefilter.depth_range[0] >= self.prefilter.depth_range[1]:
+            raise SettingsError("prefilter.depth_range的最小值应小于最大值")
+        names = set()
+        for i, arm in enumerate(self.robot.arms):
+            path = f"robot.arms[{i}]"
+            if not isinstance(arm, dict) or not isinstance(arm.get('name'), str):
+                raise SettingsError(f"{path}应为包含name的字典")
+            unknown = set(arm) - {'name', 'ip', 'mount', 'place_position'}
+            if unknown:
+                raise SettingsError(f"{path}包含未知的键: {', '.join(sorted(unknown))}")
+            if arm['name'] in names:
+                raise SettingsError(f"{path}.name={arm['name']!r}重复")
+            names.add(arm['name'])
+            _coerce(f"{path}.ip", self.robot.arm_ip, arm.get('ip', self.robot.arm_ip))
+            _coerce(f"{path}.mount", self.robot.arm_mount_pose, arm.get('mount', self.robot.arm_mount_pose))
+            _coerce(f"{path}.place_position", self.robot.arm_place_position,
+                    arm.get('place_position', self.robot.arm_place_position))
+
+    def to_dict(self):
+        return {section: {k: copy.deepcopy(v) for k, v in vars(getattr(self, section)).items()}
+                for section, _ in self.SECTIONS}
+
+    def diff(self, other):
+        """返回与other取值不同的字段集合，元素形如"model.confidence_threshold"。"""
+        changed = set()
+        for section, _ in self.SECTIONS:
+            mine, theirs = getattr(self, section), getattr(other, section)
+            for key, value in vars(mine).items():
+                if getattr(theirs, key) != value:
+                    changed.add(f"{section}.{key}")
+        return changed
+
+    @classmethod
+    def is_reloadable(cls, field):
+        """字段（"部分.字段"）能否在运行中热更新"""
+        section, key = field.split(".", 1)
+        return key in dict(cls.SECTIONS)[section].RELOADABLE
+
+
+def load_from_env(environ=None):
+    """按AGRI_SETTINGS_FILE指定的设置文件和AGRI_前缀的环境变量加载设置，供main()和命令行工具使用
+
+    返回:
+        Settings对象；文件无法读取时抛出OSError，无法解析或取值不合法时抛出SettingsError
+    """
+    environ = os.environ if environ is None else environ
+    return Settings.load(environ.get(SETTINGS_FILE_ENV) or None, environ=environ)
 
 
-# 全局设置实例
-settings = Settings()
\ No newline at end of file
+# 全局设置实例，设置了AGRI_SETTINGS_FILE时从该文件加载；设置文件或环境变量不合法时使用默认值，
+# 不影响导入，由main()加载设置时报错退出
+try:
+    settings = load_from_env()
+except (OSError, SettingsError):
+    settings = Settings()
\ No newline at end of file
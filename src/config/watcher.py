@@ -0,0 +1,137 @@
+import copy
+import logging
+import os
+import threading
+
+from config.settings import Settings, SettingsError
+
+logger = logging.getLogger(__name__)
+
+
+class SettingsWatcher:
+    """设置文件监视与热更新
+
+    后台线程定期检查设置文件的修改时间和大小，变化后重新加载整个文件（含环境变量覆盖）
+    并完整检查。文件不合法时保留当前设置；合法时只应用各设置类RELOADABLE中列出的字段，
+    其余字段记录警告、重启后生效。新设置作为一个完整的快照替换旧快照，所有订阅者收到
+    同一个快照，不会看到一半新一半旧的设置。
+    """
+
+    def __init__(self, path, settings, interval=1.0, environ=None):
+        """
+        参数:
+            path: JSON设置文件路径
+            settings: 当前生效的Settings对象
+            interval: 检查间隔，单位秒
+            environ: 环境变量字典，默认为os.environ
+        """
+        self.path = path
+        self.interval = interval
+        self.environ = environ
+        self._current = settings
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stamp = self._file_stamp()
+
+        self.stats = {
+            'reloads': 0,
+            'rejected': 0,
+            'restart_required': 0,
+        }
+
+    @property
+    def current(self):
+        """当前生效的设置快照"""
+        return self._current
+
+    def subscribe(self, callback, sections=None):
+        """订阅设置更新
+
+        参数:
+            callback: callback(settings)，settings为新的设置快照，在监视线程中调用
+            sections: 只在这些部分（如("model",)）有变化时通知，None表示任何变化都通知
+        """
+        with self._lock:
+            self._subscribers.append((callback, tuple(sections) if sections else None))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch_loop, name="settings-watcher", daemon=True)
+        self._thread.start()
+        logger.info("监视设置文件%s，每%.1f秒检查一次", self.path, self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1.0)
+            self._thread = None
+
+    def _watch_loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("检查设置文件失败")
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def check(self):
+        """文件有变化时重新加载，返回本次生效的字段集合"""
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return set()
+        self._stamp = stamp
+        return self.reload()
+
+    def reload(self):
+        """重新加载设置文件并通知订阅者，返回本次生效的字段集合"""
+        with self._lock:
+            try:
+                loaded = Settings.load(self.path, environ=self.environ)
+            except (OSError, SettingsError) as e:
+                self.stats['rejected'] += 1
+                logger.error("设置文件无效，保持当前设置: %s", e)
+                return set()
+
+            current = self._current
+            changed = current.diff(loaded)
+            hot = {field for field in changed if Settings.is_reloadable(field)}
+            cold = changed - hot
+            if cold:
+                self.stats['restart_required'] += 1
+                logger.warning("以下设置需重启后生效: %s", ", ".join(sorted(cold)))
+            if not hot:
+                return set()
+
+            updated = copy.deepcopy(current)
+            for field in hot:
+                section, key = field.split(".", 1)
+                setattr(getattr(updated, section), key, copy.deepcopy(getattr(getattr(loaded, section), key)))
+            try:
+                updated.validate()
+            except SettingsError as e:
+                self.stats['rejected'] += 1
+                logger.error("热更新后的设置不合法，保持当前设置: %s", e)
+                return set()
+
+            self._current = updated
+            self.stats['reloads'] += 1
+            logger.info("设置已更新: %s", ", ".join(sorted(hot)))
+            changed_sections = {field.split(".", 1)[0] for field in hot}
+            for callback, sections in self._subscribers:
+                if sections is not None and not changed_sections.intersection(sections):
+                    continue
+                try:
+                    callback(updated)
+                except Exception:
+                    logger.exception("应用设置更新失败: %r", callback)
+            return hot
@@ -1,204 +1,282 @@
+import logging
+import os
+import signal
+import threading
 import time
-import cv2
-import numpy as np
-from camera.gemini335 import Gemini335
-from robot.arm_controller import ArmController
-from robot.base_controller import BaseController
-from analysis.model_interface import ModelInterface
-from config.settings import Settings
-
-class MockCamera:
-    """模拟相机类，用于在没有实际相机设备的情况下测试项目"""
-    def __init__(self, color_width=640, color_height=480, depth_width=640, depth_height=480):
-        self.color_width = color_width
-        self.color_height = color_height
-        self.depth_width = depth_width
-        self.depth_height = depth_height
-        self.frame_count = 0
-        
-    def initialize_camera(self):
-        """初始化模拟相机"""
-        print("初始化模拟相机成功")
-        return True
-        
-    def capture_frame(self, align=True):
-        """捕捉模拟帧"""
-        self.frame_count += 1
-        
-        # 创建模拟彩色图像（蓝色背景，中间有一个绿色方块）
-        color_image = np.zeros((self.color_height, self.color_width, 3), dtype=np.uint8)
-        color_image[:] = (255, 0, 0)  # 蓝色背景
-        cv2.rectangle(color_image, (200, 150), (440, 330), (0, 255, 0), -1)  # 绿色方块
-        
-        # 创建模拟深度图像（中间深度值较小，周围深度值较大）
-        depth_image = np.ones((self.depth_height, self.depth_width), dtype=np.uint16) * 1000
-        cv2.rectangle(depth_image, (200, 150), (440, 330), 500, -1)
-        
-        return {
-            'color': color_image,
-            'depth': depth_image,
-            'color_timestamp': time.time(),
-            'depth_timestamp': time.time()
-        }
-        
-    def get_camera_intrinsics(self):
-        """获取模拟相机内参"""
-        return {
-            'color': {
-                'fx': 600.0,
-                'fy': 600.0,
-                'cx': self.color_width / 2,
-                'cy': self.color_height / 2,
-                'width': self.color_width,
-                'height': self.color_height
-            },
-            'depth': {
-                'fx': 600.0,
-                'fy': 600.0,
-                'cx': self.depth_width / 2,
-                'cy': self.depth_height / 2,
-                'width': self.depth_width,
-                'height': self.depth_height
-            }
-        }
-        
-    def release_camera(self):
-        """释放模拟相机资源"""
-        print("释放模拟相机资源")
-        return True
 
+_IMPORT_START = time.perf_counter()
+
+from analysis.grasp_pose import GraspPoseEstimator
+from config.settings import SettingsError, SETTINGS_FILE_ENV, load_from_env
+from planning.targets import TargetLocalizer
+from planning.coverage import RowLayout, CoveragePlanner, camera_footprint_length, reach_window_from_map
+from runtime.startup import StartupReport, warm_start
+from utils.metrics import metrics
+from utils.profiling import profiler
+from utils.log import setup_logging, shutdown_logging
+
+logger = logging.getLogger("main")
 
 def main():
-    # Load settings
-    settings = Settings()
-    
-    # Initialize camera
-    camera = None
+    startup = StartupReport(origin=_IMPORT_START)
+    startup.record("import", _IMPORT_START, time.perf_counter())
+
+    # 加载设置：默认值 <- AGRI_SETTINGS_FILE指定的JSON文件 <- AGRI_前缀的环境变量
+    settings_file = os.environ.get(SETTINGS_FILE_ENV) or None
     try:
-        camera = Gemini335(
-            color_width=settings.camera.color_width,
-            color_height=settings.camera.color_height,
-            color_fps=settings.camera.color_fps,
-            depth_width=settings.camera.depth_width,
-            depth_height=settings.camera.depth_height,
-            depth_fps=settings.camera.depth_fps
+        settings = load_from_env()
+    except (OSError, SettingsError) as e:
+        # 日志尚未配置，直接输出到标准错误并退出
+        raise SystemExit(f"设置加载失败（{SETTINGS_FILE_ENV}={settings_file or '未设置'}）: {e}")
+    setup_logging(settings.logging)
+
+    # 指标导出：本地 /metrics 端点供Prometheus抓取，或定期写入文本文件
+    metrics.enabled = settings.metrics.enabled
+    if settings.metrics.enabled:
+        if settings.metrics.http_port:
+            try:
+                metrics.start_http_server(settings.metrics.http_port, settings.metrics.http_host)
+                logger.info("指标端点: http://%s:%s/metrics", settings.metrics.http_host, settings.metrics.http_port)
+            except OSError as e:
+                logger.error("指标端点启动失败: %s", e)
+        if settings.metrics.export_file:
+            metrics.start_file_exporter(settings.metrics.export_file, settings.metrics.export_interval)
+
+    # 运行时性能分析：通过本地控制套接字（python -m utils.profiling ...）或SIGUSR2开始/停止分析、导出调用栈
+    if settings.profiling.enabled:
+        profiler.apply_settings(settings)
+        try:
+            profiler.serve(settings.profiling.socket_path)
+        except OSError as e:
+            logger.error("性能分析控制套接字启动失败: %s", e)
+        profiler.install_signal(settings.profiling.signal_command)
+    
+    # 并行初始化相机、机械臂、底盘、模型和地图，只导入settings中选中的后端
+    resources = warm_start(settings, startup, parallel=settings.startup.parallel)
+    camera = resources['camera']
+    arm_controller = resources['arm']
+    base_driver, base_controller = resources['base']
+    model_interface = resources['model']
+    reachability_map = resources['reachability']
+    fruit_map = resources['fruit_map']
+
+    setup_start = time.perf_counter()
+    intrinsics = camera.get_camera_intrinsics()
+    intrinsics = intrinsics['color'] if intrinsics else settings.camera.color_intrinsics
+
+    grasp_estimator = None
+    if settings.robot.arm_grasp_estimation:
+        grasp_estimator = GraspPoseEstimator(
+            intrinsics,
+            camera_to_arm=settings.robot.camera_to_arm_transform,
+            gripper_radius=settings.robot.arm_gripper_radius,
+            max_tilt=settings.robot.arm_grasp_max_tilt
         )
-        camera.initialize_camera()
-        print("使用实际相机设备")
-    except Exception as e:
-        print(f"实际相机初始化失败: {str(e)}")
-        print("切换到模拟相机模式")
-        camera = MockCamera(
-            color_width=settings.camera.color_width,
-            color_height=settings.camera.color_height,
-            depth_width=settings.camera.depth_width,
-            depth_height=settings.camera.depth_height
+
+    # 颜色/深度预筛选：没有候选区域的帧不调用模型，只把候选ROI裁剪下来推理
+    detector = model_interface
+    gate = None
+    if settings.prefilter.enabled:
+        from analysis.prefilter import GatedDetector
+
+        gate = GatedDetector.from_settings(model_interface, settings.prefilter)
+        detector = gate
+
+    # 多目标跟踪：降低模型调用频率，检测结果带稳定的track_id
+    if settings.model.tracking_enabled:
+        from analysis.tracker import MultiObjectTracker, InferenceScheduler, TrackedDetector, odometry_pixel_shift
+
+        motion_fn = None
+        if settings.model.tracker_use_odometry:
+            last_pose = [base_driver.get_pose()]
+
+            def motion_fn():
+                # 底盘静止时返回None，由光流处理果实自身的摆动
+                pose, prev = base_driver.get_pose(), last_pose[0]
+                last_pose[0] = pose
+                if pose.x == prev.x and pose.y == prev.y and pose.theta == prev.theta:
+                    return None
+                return odometry_pixel_shift(intrinsics, settings.robot.camera_to_arm_transform, prev, pose,
+                                            settings.model.tracker_reference_depth,
+                                            settings.robot.arm_mount_pose)
+        detector = TrackedDetector(
+            detector,
+            tracker=MultiObjectTracker(iou_threshold=settings.model.tracker_iou_threshold),
+            scheduler=InferenceScheduler(
+                min_interval=settings.model.min_inference_interval,
+                max_interval=settings.model.max_inference_interval,
+                max_drift=settings.model.tracker_max_drift,
+                min_confidence=settings.model.tracker_min_confidence
+            ),
+            use_flow=settings.model.tracker_use_flow,
+            motion_fn=motion_fn
         )
-        camera.initialize_camera()
-
-    # Initialize robot controllers
-    arm_controller = ArmController(
-        ip=settings.robot.arm_ip,
-        default_vel=settings.robot.arm_default_velocity,
-        default_acc=settings.robot.arm_default_acceleration,
-        gripper_open_time=settings.robot.arm_gripper_open_time,
-        gripper_close_time=settings.robot.arm_gripper_close_time,
-        approach_offset=settings.robot.arm_approach_offset
+
+    localizer = TargetLocalizer(
+        intrinsics,
+        settings.robot.camera_to_arm_transform,
+        reachability_map=reachability_map,
+        grasp_estimator=grasp_estimator
     )
-    
-    try:
-        arm_controller.connect()
-        arm_controller.enable()
-        print("机械臂初始化成功")
-    except Exception as e:
-        print(f"机械臂初始化失败: {str(e)}")
-        arm_controller = None
-    
-    base_controller = BaseController(
-        wheel_radius=settings.robot.base_wheel_radius,
+
+    # 行覆盖规划：停车间距由相机视野和机械臂可达窗口决定
+    reach_window = settings.robot.coverage_reach_window
+    if reachability_map is not None:
+        reach_window = reach_window_from_map(reachability_map, *settings.robot.coverage_canopy_position)
+    planner = CoveragePlanner(
+        RowLayout(
+            settings.robot.field_row_count,
+            settings.robot.field_row_length,
+            settings.robot.field_row_spacing,
+            headland=settings.robot.field_headland,
+            first_turn=settings.robot.field_first_turn
+        ),
+        footprint_length=camera_footprint_length(settings.robot.coverage_working_distance,
+                                                 intrinsics.get('width', settings.camera.color_width),
+                                                 intrinsics['fx']),
+        reach_window=reach_window,
+        min_overlap=settings.robot.coverage_min_overlap,
+        base_speed=settings.robot.base_speed,
+        base_acc=settings.robot.base_max_acceleration,
         wheel_separation=settings.robot.base_wheel_separation,
-        base_speed=settings.robot.base_speed
+        pick_cycle_time=settings.robot.arm_pick_cycle_time,
+        crawl_speed=settings.robot.base_crawl_speed,
+        mode=settings.robot.harvest_mode
     )
-    print("基础车辆初始化成功")
+    # 果实地图每次运行重新建立，启动时没有密度信息，按均匀密度规划
+    plan = planner.plan()
+    summary = plan.summary()
+    logger.info("覆盖规划: %d个停车点, 行驶%.1f米, 预计耗时%.1f分钟, 视野重叠%.0f%%",
+                summary['stops'], summary['travel_distance'], summary['expected_time'] / 60,
+                summary['overlap_ratio'] * 100)
 
-    # Initialize model interface
-    model_interface = ModelInterface()
+    # 飞行记录器：内存中保存最近的采摘周期，异常、MoveL失败或收到SIGUSR1时写盘
+    recorder = None
+    if settings.recorder.enabled:
+        from runtime.flight_recorder import FlightRecorder
+
+        recorder = FlightRecorder.from_settings(settings.recorder, settings.camera, meta={
+            'intrinsics': {k: float(v) for k, v in intrinsics.items() if isinstance(v, (int, float))},
+            'camera_to_arm': settings.robot.camera_to_arm_transform,
+        })
+        if arm_controller:
+            units = getattr(arm_controller, 'arms', None)
+            for controller in ([u.controller for u in units] if units else [arm_controller]):
+                controller.recorder = recorder
+        if hasattr(signal, 'SIGUSR1'):
+            # 信号处理函数在主线程中运行，主线程可能正持有记录器的锁，转储交给新线程
+            signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(
+                target=recorder.trigger, args=("manual",), daemon=True).start())
+
+    startup.record("setup", setup_start, time.perf_counter())
+    logger.info(startup.summary())
+    if settings.startup.report_file:
+        try:
+            startup.write(settings.startup.report_file)
+        except OSError as e:
+            logger.error("写入启动报告失败: %s", e)
+
+    # 设置文件热更新：阈值、速度和夹爪时间等字段修改后无需重启即可生效
+    watcher = None
+    if settings_file and settings.startup.settings_watch_interval > 0:
+        from config.watcher import SettingsWatcher
+
+        watcher = SettingsWatcher(settings_file, settings, interval=settings.startup.settings_watch_interval)
+        watcher.subscribe(model_interface.apply_settings, sections=("model",))
+        if gate is not None:
+            watcher.subscribe(gate.apply_settings, sections=("prefilter",))
+        watcher.subscribe(base_controller.apply_settings, sections=("robot",))
+        if arm_controller:
+            watcher.subscribe(arm_controller.apply_settings, sections=("robot",))
+        if recorder is not None:
+            watcher.subscribe(recorder.apply_settings, sections=("recorder",))
+        watcher.subscribe(profiler.apply_settings, sections=("profiling",))
+        watcher.start()
 
     try:
-        while True:
-            # Capture video frame
-            frame = camera.capture_frame()
-            
-            if not frame:
-                print("未获取到有效帧，跳过本次循环")
-                time.sleep(0.1)
-                continue
-                
-            # 获取彩色图像用于分析
-            color_frame = frame['color']
-
-            # Process frame and get detected objects
-            try:
-                detected_objects = model_interface.analyze_frame(color_frame)
-            except Exception as e:
-                print(f"模型分析失败: {str(e)}")
-                detected_objects = None
-            
-            # 如果检测到目标，执行采摘操作
-            if detected_objects:
-                # 假设取第一个检测到的目标
-                target = detected_objects[0]
-                
-                # 将图像坐标转换为世界坐标
-                # 这里需要根据相机内参和深度信息进行转换
-                # 简化处理，假设已经有转换后的坐标
-                world_x = target['x']
-                world_y = target['y']
-                world_z = frame['depth'][int(target['y']), int(target['x'])] / 1000.0  # 转换为米
-                
-                # 移动机械臂到目标位置
-                if arm_controller:
-                    try:
-                        arm_controller.move_to([world_x, world_y, world_z, 0, 0, 0])
-                        
-                        # 执行采摘操作
-                        # 这里需要根据实际的夹爪控制逻辑进行调整
-                        # 假设pick_pos是目标位置，place_pos是放置位置
-                        arm_controller.pick(
-                            pick_pos=[world_x, world_y, world_z, 0, 0, 0],
-                            place_pos=[0.5, 0, 0.5, 0, 0, 0]  # 示例放置位置
-                        )
-                        
-                        # 重置机械臂到初始位置
-                        arm_controller.calibrate()
-                    except Exception as e:
-                        print(f"机械臂操作失败: {str(e)}")
-                else:
-                    print("机械臂未初始化，无法执行采摘操作")
-                
-                # 移动基础车辆
-                base_controller.move_forward(0.1)  # 移动0.1米
-            else:
-                # 如果没有检测到目标，移动基础车辆继续搜索
-                base_controller.move_forward(0.1)
-            
-            # Sleep to control the loop rate
-            time.sleep(0.1)
+        if settings.robot.harvest_mode == "crawl":
+            # 连续爬行模式：底盘持续低速前进，检测结果按里程计和估计的曝光时刻（固定采集延迟）做运动补偿
+            from planning.crawl import CrawlHarvester
+
+            crawl_arm = arm_controller
+            if hasattr(arm_controller, 'arms'):
+                # 边走边采的运动补偿按单臂实现，多臂平台只使用安装在参考位姿（arm_mount_pose）的机械臂
+                units = [u for u in arm_controller.arms if list(u.mount) == list(settings.robot.arm_mount_pose)]
+                if not units:
+                    logger.error("爬行模式只支持单臂，且没有安装在arm_mount_pose处的机械臂")
+                    return
+                logger.warning("爬行模式只支持单臂，使用机械臂%s", units[0].name)
+                crawl_arm = units[0].controller
+            harvester = CrawlHarvester(
+                camera, detector, crawl_arm, base_controller, localizer,
+                place_pos=settings.robot.arm_place_position,
+                crawl_speed=settings.robot.base_crawl_speed,
+                arm_mount=settings.robot.arm_mount_pose,
+                approach_time=settings.robot.arm_approach_time,
+                drift_tolerance=settings.robot.crawl_drift_tolerance,
+                capture_latency=settings.camera.capture_latency,
+                use_blending=settings.robot.arm_use_blending,
+                fruit_map=fruit_map,
+                archive_distance=settings.robot.fruit_archive_distance,
+                recorder=recorder,
+                plan=plan
+            )
+            if watcher is not None:
+                watcher.subscribe(harvester.apply_settings, sections=("robot",))
+            harvester.run()
+            return
+
+        # 走走停停模式：采集、预处理、推理、定位、决策、执行各阶段并发运行
+        from runtime.harvest import StopAndGoHarvest
+
+        harvest = StopAndGoHarvest(
+            camera, model_interface, localizer, arm_controller, base_controller, plan,
+            place_pos=settings.robot.arm_place_position,
+            detector=detector if detector is not model_interface else None,
+            fruit_map=fruit_map,
+            arm_mount=settings.robot.arm_mount_pose,
+            use_blending=settings.robot.arm_use_blending,
+            max_picks_per_stop=settings.robot.coverage_max_picks_per_stop,
+            fruit_archive_distance=settings.robot.fruit_archive_distance,
+            recorder=recorder
+        )
+        if watcher is not None:
+            watcher.subscribe(harvest.apply_settings, sections=("robot",))
+        harvest.run(
+            capture_queue=settings.pipeline.capture_queue_size,
+            infer_queue=settings.pipeline.infer_queue_size,
+            queue_size=settings.pipeline.queue_size,
+            preprocess_executor=settings.pipeline.preprocess_executor,
+            infer_workers=settings.pipeline.infer_workers
+        )
 
     except KeyboardInterrupt:
-        print("Shutting down the robot control program.")
+        logger.info("Shutting down the robot control program.")
 
     finally:
         # 释放资源
+        if watcher is not None:
+            watcher.stop()
+        if recorder is not None:
+            recorder.close()
+        profiler.close()
         camera.release_camera()
         if arm_controller:
             try:
                 arm_controller.disable()
                 arm_controller.disconnect()
             except Exception as e:
-                print(f"释放机械臂资源失败: {str(e)}")
-        base_controller.stop()
+                logger.error("释放机械臂资源失败: %s", e)
+        base_controller.shutdown()
+        if fruit_map is not None:
+            try:
+                fruit_map.save(settings.robot.fruit_map_path)
+            except OSError as e:
+                logger.error("保存果实地图失败: %s", e)
+        metrics.stop()
+        import cv2
         cv2.destroyAllWindows()
+        shutdown_logging()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,258 @@
+import math
+import numpy as np
+
+from robot.sim_robot import trapezoid_duration
+
+
+def camera_footprint_length(working_distance, image_width, fx):
+    """相机视野沿行方向（图像宽度方向）的覆盖长度
+
+    参数:
+        working_distance: 相机到作物冠层的距离，单位mm
+        image_width: 图像宽度，单位像素
+        fx: 焦距，单位像素
+
+    返回:
+        覆盖长度，单位米
+    """
+    return working_distance * image_width / fx / 1000.0
+
+
+def reach_window_from_map(reachability_map, y, z, x_range=(-1000.0, 1000.0), step=10.0):
+    """用可达性地图计算机械臂沿行方向（机械臂x轴）的可达窗口长度
+
+    参数:
+        reachability_map: ReachabilityMap对象
+        y, z: 作物冠层在机械臂坐标系中的横向位置和高度，单位mm
+        x_range: 扫描范围，单位mm
+        step: 扫描步长，单位mm
+
+    返回:
+        最长连续可达区间的长度，单位米
+    """
+    xs = np.arange(x_range[0], x_range[1] + step, step)
+    points = np.stack([xs, np.full_like(xs, y), np.full_like(xs, z)], axis=1)
+    reachable, _ = reachability_map.query(points)
+    best = run = 0
+    for ok in reachable:
+        run = run + 1 if ok else 0
+        best = max(best, run)
+    return best * step / 1000.0
+
+
+class RowLayout:
+    """田间行布局：若干条平行于里程计x轴、等间距排列的作业通道
+
+    机器人从第0条通道起点出发，面向+x；后续通道按first_turn方向依次排列，
+    相邻通道行进方向相反（蛇形遍历），在地头掉头。
+    """
+
+    def __init__(self, row_count, row_length, row_spacing, headland=1.0, origin=(0.0, 0.0), first_turn="left"):
+        """
+        参数:
+            row_count: 通道数量
+            row_length: 行长度，单位米
+            row_spacing: 行间距，单位米
+            headland: 掉头前驶出行尾的距离，单位米
+            origin: 第0条通道起点的里程计坐标 (x, y)，单位米
+            first_turn: 第一次掉头的方向，"left"或"right"
+        """
+        if first_turn not in ("left", "right"):
+            raise ValueError(f"不支持的掉头方向: {first_turn}")
+        self.row_count = row_count
+        self.row_length = row_length
+        self.row_spacing = row_spacing
+        self.headland = headland
+        self.origin = origin
+        self.first_turn = first_turn
+
+    def lane(self, index):
+        """返回第index条通道的 (起点x, y, 行进方向)，方向为+1或-1"""
+        side = 1.0 if self.first_turn == "left" else -1.0
+        direction = 1.0 if index % 2 == 0 else -1.0
+        x0 = self.origin[0] if direction > 0 else self.origin[0] + self.row_length
+        return x0, self.origin[1] + side * index * self.row_spacing, direction
+
+
+class CoveragePlan:
+    """覆盖规划结果
+
+    actions为顺序执行的动作列表，每个动作是一个字典：
+        {'type': 'move', 'distance': 米}            直线行驶（负值为后退）
+        {'type': 'rotate', 'angle': 度}             原地转动（逆时针为正）
+        {'type': 'stop', 'lane': i, 'x': 米, 'expected_fruit': n}   停车采摘
+        {'type': 'crawl', 'lane': i, 'distance': 米, 'speed': 米/秒, 'expected_fruit': n}   爬行采摘
+    """
+
+    def __init__(self, actions, window, step, expected_time, mode):
+        self.actions = actions
+        self.window = window
+        self.step = step
+        self.expected_time = expected_time
+        self.mode = mode
+
+    @property
+    def stops(self):
+        return [a for a in self.actions if a['type'] == 'stop']
+
+    @property
+    def overlap_ratio(self):
+        """相邻停车点视野的重叠比例"""
+        if self.mode != "stop_and_go" or self.window <= 0:
+            return 0.0
+        return max(0.0, 1.0 - self.step / self.window)
+
+    def summary(self):
+        travel = sum(abs(a['distance']) for a in self.actions if a['type'] in ('move', 'crawl'))
+        return {
+            'mode': self.mode,
+            'stops': len(self.stops),
+            'travel_distance': travel,
+            'expected_time': self.expected_time,
+            'overlap_ratio': self.overlap_ratio,
+            'expected_fruit': sum(a.get('expected_fruit', 0.0) for a in self.actions),
+        }
+
+
+class CoveragePlanner:
+    """行覆盖规划器
+
+    停车间距由相机视野和机械臂可达窗口中较小者决定，只保留min_overlap比例的重叠
+    （用于覆盖跨越窗口边界的果实）。行尾驶出地头后原地转90°、横移一个行距、再转90°
+    进入下一条通道。给定果实密度时，已知没有果实的停车点会被跳过，停车时间和爬行速度
+    按预计果实数调整。
+    """
+
+    def __init__(self, layout, footprint_length, reach_window, min_overlap=0.05, base_speed=0.5,
+                 base_acc=0.5, wheel_separation=0.5, pick_cycle_time=7.5, capture_time=0.5,
+                 default_fruit_per_stop=1.0, crawl_speed=0.02, mode="stop_and_go", skip_empty=True):
+        """
+        参数:
+            layout: RowLayout对象
+            footprint_length: 相机视野沿行方向的长度，单位米
+            reach_window: 机械臂沿行方向的可达窗口长度，单位米
+            min_overlap: 相邻停车点之间保留的最小重叠比例
+            base_speed: 底盘最大速度，单位米/秒
+            base_acc: 底盘加速度，单位米/秒^2
+            wheel_separation: 轮距，单位米，用于估计原地转动时间
+            pick_cycle_time: 单个果实的采摘周期，单位秒
+            capture_time: 每个停车点的采集和推理时间，单位秒
+            default_fruit_per_stop: 没有密度信息时每个停车点的预计果实数
+            crawl_speed: 爬行模式的最大爬行速度，单位米/秒
+            mode: "stop_and_go"或"crawl"
+            skip_empty: 密度信息表明没有果实的停车点是否跳过
+        """
+        if mode not in ("stop_and_go", "crawl"):
+            raise ValueError(f"不支持的覆盖模式: {mode}")
+        self.layout = layout
+        self.footprint_length = footprint_length
+        self.reach_window = reach_window
+        self.min_overlap = min_overlap
+        self.base_speed = base_speed
+        self.base_acc = base_acc
+        self.angular_speed = 2 * base_speed / wheel_separation
+        self.angular_acc = 2 * base_acc / wheel_separation
+        self.pick_cycle_time = pick_cycle_time
+        self.capture_time = capture_time
+        self.default_fruit_per_stop = default_fruit_per_stop
+        self.crawl_speed = crawl_speed
+        self.mode = mode
+        self.skip_empty = skip_empty
+
+    @property
+    def window(self):
+        return min(self.footprint_length, self.reach_window)
+
+    def stop_positions(self):
+        """返回通道内停车点到通道起点的距离列表和实际停车间距（米）"""
+        length, window = self.layout.row_length, self.window
+        if length <= window:
+            return [length / 2.0], window
+        max_step = window * (1.0 - self.min_overlap)
+        count = int(math.ceil((length - window) / max_step)) + 1
+        step = (length - window) / (count - 1)
+        return [window / 2.0 + k * step for k in range(count)], step
+
+    def _move_time(self, distance):
+        return trapezoid_duration(abs(distance), self.base_speed, self.base_acc)
+
+    def _rotate_time(self, angle):
+        return trapezoid_duration(abs(math.radians(angle)), self.angular_speed, self.angular_acc)
+
+    def plan(self, density=None):
+        """生成覆盖规划
+
+        参数:
+            density: 可选，每条通道每个停车窗口内的预计果实数，形如 [[n0, n1, ...], ...]，
+                顺序与stop_positions一致（例如来自事先的巡田估产）；None表示未知，
+                某条通道为None表示该通道未知
+
+        返回:
+            CoveragePlan对象
+        """
+        positions, step = self.stop_positions()
+        length = self.layout.row_length
+        actions = []
+        total = 0.0
+
+        for lane in range(self.layout.row_count):
+            known = density is not None and density[lane] is not None
+            counts = density[lane] if known else [self.default_fruit_per_stop] * len(positions)
+            x0, _, direction = self.layout.lane(lane)
+
+            if self.mode == "crawl":
+                fruit = float(sum(counts))
+                # 爬行速度要保证窗口经过期间来得及采完窗口内的果实
+                per_window = max(counts) if len(counts) else 0.0
+                speed = self.crawl_speed
+                if per_window > 0:
+                    speed = min(speed, self.window / (per_window * self.pick_cycle_time))
+                actions.append({'type': 'crawl', 'lane': lane, 'distance': length, 'speed': speed,
+                                'expected_fruit': fruit})
+                total += max(length / speed, fruit * self.pick_cycle_time)
+            else:
+                travelled = 0.0
+                for k, s in enumerate(positions):
+                    if self.skip_empty and known and counts[k] <= 0:
+                        continue
+                    if s > travelled:
+                        actions.append({'type': 'move', 'distance': s - travelled})
+                        total += self._move_time(s - travelled)
+                        travelled = s
+                    actions.append({'type': 'stop', 'lane': lane, 'x': x0 + direction * s,
+                                    'expected_fruit': float(counts[k])})
+                    total += self.capture_time + counts[k] * self.pick_cycle_time
+                if length > travelled:
+                    actions.append({'type': 'move', 'distance': length - travelled})
+                    total += self._move_time(length - travelled)
+
+            if lane == self.layout.row_count - 1:
+                break
+            # 地头掉头：驶出、转90°、横移一个行距、再转90°、驶回行首
+            side = 1.0 if self.layout.first_turn == "left" else -1.0
+            angle = 90.0 * side * (1.0 if lane % 2 == 0 else -1.0)
+            turn = [
+                {'type': 'move', 'distance': self.layout.headland},
+                {'type': 'rotate', 'angle': angle},
+                {'type': 'move', 'distance': self.layout.row_spacing},
+                {'type': 'rotate', 'angle': angle},
+                {'type': 'move', 'distance': self.layout.headland},
+            ]
+            for a in turn:
+                total += self._move_time(a['distance']) if a['type'] == 'move' else self._rotate_time(a['angle'])
+            actions.extend(turn)
+
+        return CoveragePlan(actions, self.window, step, total, self.mode)
+
+
+def apply_action(base_controller, action):
+    """用BaseController执行一个move或rotate动作（阻塞到完成），超时未完成时返回False"""
+    if action['type'] == 'move':
+        if action['distance'] >= 0:
+            return base_controller.move_forward(action['distance']) is not None
+        return base_controller.move_backward(-action['distance']) is not None
+    if action['type'] == 'rotate':
+        if action['angle'] >= 0:
+            return base_controller.turn_left(action['angle']) is not None
+        return base_controller.turn_right(-action['angle']) is not None
+    return True
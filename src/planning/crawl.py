@@ -0,0 +1,338 @@
+import logging
+import math
+import time
+
+from planning.coverage import apply_action
+from utils.clock import RealClock
+from utils.helpers import arm_to_odom, odom_to_arm, predict_base_pose
+from utils.metrics import metrics
+from utils.profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlHarvester:
+    """连续爬行采摘模式
+
+    底盘以较低的恒定速度持续前进，采集和推理不停顿。每个检测结果先按估计的曝光时刻
+    （capture_frame返回时刻减去固定的capture_latency）对应的里程计位姿变换到里程计
+    坐标系（果实在该坐标系中静止），再用预计夹爪
+    到达时刻的底盘位姿变换回机械臂坐标系，使机械臂瞄准果实"此时此刻"的位置。
+    只有在夹爪闭合期间底盘移动造成的偏移超过容差时才刹车采摘。
+    给定覆盖规划时按规划逐条通道爬行，到达行尾停车后执行地头掉头动作。
+    """
+
+    def __init__(self, camera, model_interface, arm_controller, base_controller, localizer,
+                 place_pos, crawl_speed=0.02, arm_mount=(0.0, 0.0, 0.0), approach_time=1.0,
+                 drift_tolerance=15.0, capture_latency=0.03, use_blending=True, clock=None,
+                 brake_timeout=3.0, fruit_map=None, archive_distance=2.0, recorder=None, plan=None):
+        """初始化爬行采摘
+
+        参数:
+            camera: 相机对象（Gemini335或MockCamera）
+            model_interface: ModelInterface对象
+            arm_controller: ArmController对象，可为None（只巡检不采摘）
+            base_controller: BaseController对象
+            localizer: TargetLocalizer对象
+            place_pos: 放置位姿，单位mm, °
+            crawl_speed: 爬行速度，单位米/秒
+            arm_mount: 机械臂基座在车体坐标系中的位姿 (x mm, y mm, yaw °)
+            approach_time: 从下发指令到夹爪到达目标的预计时间，单位秒
+            drift_tolerance: 夹爪闭合期间允许的目标偏移，单位mm，超过则刹车采摘
+            capture_latency: 曝光到capture_frame返回之间的固定延迟，单位秒，用于估计帧的曝光时刻
+            use_blending: 是否使用平滑连续轨迹采摘
+            clock: 时钟对象，需与底盘控制器使用同一时钟
+            brake_timeout: 等待底盘停稳的最长时间，单位秒
+            fruit_map: FruitMap对象，可为None；用于合并重复观测并跳过已采摘或已放弃的果实
+            archive_distance: 果实落后底盘超过该距离（单位米）后从地图内存中移出
+            recorder: 可选，FlightRecorder对象，记录每帧的检测、目标、MoveL指令和耗时
+            plan: 可选，爬行模式的CoveragePlan；None表示沿当前航向持续爬行直到stop()
+        """
+        self.camera = camera
+        self.model_interface = model_interface
+        self.arm = arm_controller
+        self.base = base_controller
+        self.driver = base_controller.driver
+        self.localizer = localizer
+        self.place_pos = place_pos
+        self.crawl_speed = crawl_speed
+        self.arm_mount = arm_mount
+        self.approach_time = approach_time
+        self.drift_tolerance = drift_tolerance
+        self.capture_latency = capture_latency
+        self.use_blending = use_blending
+        self.clock = clock if clock is not None else RealClock()
+        self.brake_timeout = brake_timeout
+        self.fruit_map = fruit_map
+        self.archive_distance = archive_distance
+        self.recorder = recorder
+        self.plan = plan
+        self._lane_speed = None  # 当前通道的规划爬行速度
+        self._running = False
+        self._speed_changed = False
+        self._iterations = 0
+        self._braked_time = 0.0
+
+        self.stats = {
+            'frames': 0,
+            'empty_frames': 0,
+            'detections': 0,
+            'picks': 0,
+            'picks_on_move': 0,
+            'brakes': 0,
+            'failures': 0,
+            'skipped_known': 0,
+            'lanes': 0,
+        }
+
+    def _target_speed(self):
+        """当前爬行速度：通道的规划速度，不超过（可热更新的）crawl_speed"""
+        if self._lane_speed is None:
+            return self.crawl_speed
+        return min(self._lane_speed, self.crawl_speed)
+
+    def start(self):
+        """开始以爬行速度前进"""
+        self._running = True
+        self.base.set_velocity(self._target_speed())
+
+    def stop(self):
+        self._running = False
+        self.base.stop()
+
+    def apply_settings(self, new_settings):
+        """应用热更新的爬行速度和采摘参数（SettingsWatcher订阅回调）
+
+        新的爬行速度由采摘循环在下一次run_once时下发，底盘指令始终只来自采摘循环线程。
+        """
+        robot = new_settings.robot
+        self.approach_time = robot.arm_approach_time
+        self.drift_tolerance = robot.crawl_drift_tolerance
+        self.use_blending = robot.arm_use_blending
+        if robot.base_crawl_speed != self.crawl_speed:
+            self.crawl_speed = robot.base_crawl_speed
+            self._speed_changed = True
+
+    def run(self, max_iterations=None):
+        """运行爬行采摘循环，直到stop()被调用、规划执行完毕或run_once达到max_iterations次"""
+        self._iterations = 0
+        try:
+            if self.plan is None:
+                self.start()
+                self._crawl(None, max_iterations)
+            else:
+                self._running = True
+                self._run_plan(max_iterations)
+        finally:
+            self.stop()
+
+    def _run_plan(self, max_iterations):
+        """按覆盖规划执行：每条通道爬行规划的距离，行尾停车，再执行地头掉头等动作"""
+        overshoot = 0.0
+        for action in self.plan.actions:
+            if not self._running:
+                return
+            if action['type'] == 'crawl':
+                distance = action['distance'] - overshoot
+                self._lane_speed = action['speed']
+                self.stats['lanes'] += 1
+                logger.info("通道%s：爬行%.2f米，速度%.3f米/秒", action['lane'], distance, self._target_speed())
+                self.base.set_velocity(self._target_speed())
+                lane_start = self._crawl(distance, max_iterations)
+                # 行尾停车；采摘期间底盘仍在爬行，越过行尾的距离从下一段直线行驶中扣除
+                self.base.set_velocity(0.0)
+                self._wait_until_stopped()
+                if lane_start is None:
+                    return
+                overshoot = self._travelled_since(lane_start) - distance
+                continue
+            if action['type'] == 'move' and overshoot:
+                action = dict(action, distance=action['distance'] - overshoot)
+            overshoot = 0.0
+            if not apply_action(self.base, action):
+                logger.error("底盘动作未完成，停止作业: %s", action)
+                return
+        logger.info("覆盖规划执行完毕，共%s条通道", self.stats['lanes'])
+
+    def _travelled_since(self, start):
+        """从start位姿起沿其航向行驶的距离，单位米"""
+        pose = self.driver.get_pose()
+        return (pose.x - start.x) * math.cos(start.theta) + (pose.y - start.y) * math.sin(start.theta)
+
+    def _crawl(self, distance, max_iterations):
+        """爬行并反复执行run_once，直到沿起始航向行驶了distance米（None表示不限）
+
+        返回:
+            走完distance时返回起始位姿；stop()被调用、达到max_iterations或底盘停滞时返回None
+        """
+        start = self.driver.get_pose()
+        t_start = self.clock.now()
+        self._braked_time = 0.0
+        while self._running and (max_iterations is None or self._iterations < max_iterations):
+            if distance is not None:
+                if self._travelled_since(start) >= distance:
+                    return start
+                # 扣除刹车采摘的时间后，超过预计耗时的1.5倍加余量仍未走完视为底盘停滞（如编码器数据中断）
+                timeout = distance / max(self._target_speed(), 1e-6) * 1.5 + self.base.move_timeout_margin
+                if self.clock.now() - t_start - self._braked_time > timeout:
+                    logger.error("爬行%.1f秒仍未走完%.2f米，停止作业", timeout, distance)
+                    metrics.inc("base_move_timeouts_total")
+                    return None
+            session = profiler.session
+            if session is None:
+                self.run_once()
+            else:
+                session.enter("crawl")
+                try:
+                    self.run_once()
+                finally:
+                    session.exit("crawl")
+            self._iterations += 1
+        return None
+
+    def _compensate(self, positions, frame_time, at_time):
+        """把帧时刻的机械臂坐标补偿到at_time时刻（底盘按当前速度外推）"""
+        pose_frame = self.driver.pose_at(frame_time)
+        odom_points = arm_to_odom(positions, pose_frame, self.arm_mount)
+        pose_then = predict_base_pose(self.driver.get_pose(), at_time)
+        return odom_to_arm(odom_points, pose_then, self.arm_mount)
+
+    def run_once(self):
+        """执行一次采集-推理-（可能的）采摘
+
+        返回:
+            本次采摘的MoveL错误码，没有采摘时返回None
+        """
+        if self._speed_changed:
+            self._speed_changed = False
+            if self._running:
+                self.base.set_velocity(self._target_speed())
+        if not self.driver.threaded:
+            self.driver.step()
+        t_capture = time.monotonic()
+        frame = self.camera.capture_frame()
+        # 帧自带的color_timestamp来自相机设备时钟（Gemini335为设备毫秒计时），与里程计时钟
+        # 没有同步，曝光时刻按返回时刻减去固定延迟估计
+        frame_time = self.clock.now() - self.capture_latency
+        if not frame:
+            self.stats['empty_frames'] += 1
+            metrics.inc("frame_drops_total", labels={'reason': 'capture'})
+            return None
+        self.stats['frames'] += 1
+        metrics.inc("frames_total")
+        rec = None
+        if self.recorder is not None:
+            rec = self.recorder.begin(self.stats['frames'], frame['color'], frame['depth'])
+            t_infer = time.monotonic()
+            self.recorder.record_stage_times(rec, {'capture': t_infer - t_capture})
+
+        try:
+            detections = self.model_interface.analyze_frame(frame['color'], depth=frame['depth'])
+        except Exception as e:
+            logger.error("模型分析失败: %s", e)
+            if rec is not None:
+                self.recorder.trigger("exception")
+            return None
+        if rec is not None:
+            self.recorder.record_detections(rec, detections)
+            self.recorder.record_stage_times(rec, {'infer': time.monotonic() - t_infer})
+        if not detections:
+            return None
+        self.stats['detections'] += len(detections)
+
+        depth_image = frame['depth']
+        candidates, positions = self.localizer.localize(depth_image, detections)
+        if len(positions) == 0:
+            return None
+
+        fruits = None
+        if self.fruit_map is not None:
+            # 帧时刻的里程计坐标即果实的固定位置，与地图合并后只保留仍待采摘的果实
+            odom_points = arm_to_odom(positions, self.driver.pose_at(frame_time), self.arm_mount)
+            fruits = self.fruit_map.observe_batch(
+                odom_points,
+                labels=[d.get('class') for d in candidates],
+                scores=[d.get('score', 0.0) for d in candidates],
+                timestamp=frame_time
+            )
+            keep = [i for i, fruit in enumerate(fruits) if self.fruit_map.is_pickable(fruit)]
+            self.stats['skipped_known'] += len(fruits) - len(keep)
+            self.fruit_map.archive_behind(self.driver.get_pose(), self.archive_distance)
+            if not keep:
+                return None
+            candidates = [candidates[i] for i in keep]
+            fruits = [fruits[i] for i in keep]
+            positions = positions[keep]
+
+        # 以预计夹爪到达时刻的位置判断可达性；暂时不可达的前方目标会随着底盘前进进入工作空间
+        predicted = self._compensate(positions, frame_time, self.clock.now() + self.approach_time)
+        order = self.localizer.rank(predicted)
+        if len(order) == 0 or self.arm is None:
+            return None
+        index = order[0]
+        pick_pos, approach_dir = self.localizer.grasp(depth_image, candidates[index], positions[index])
+        fruit = fruits[index] if fruits is not None else None
+
+        drift = abs(self.driver.get_pose().v) * self.arm.gripper_close_time * 1000.0
+        if drift <= self.drift_tolerance:
+            pick_pos = [float(c) for c in predicted[index]] + list(pick_pos[3:6])
+            ret = self._pick(pick_pos, approach_dir, fruit, rec)
+            if ret == 0:
+                self.stats['picks_on_move'] += 1
+            return ret
+
+        # 边走边采偏移过大：刹车，按停稳后的位姿重新计算目标，采摘后恢复爬行
+        self.stats['brakes'] += 1
+        t_brake = self.clock.now()
+        self.base.set_velocity(0.0)
+        self._wait_until_stopped()
+        now = self.clock.now()
+        current = self._compensate(positions[index:index + 1], frame_time, now)[0]
+        pick_pos = [float(c) for c in current] + list(pick_pos[3:6])
+        ret = self._pick(pick_pos, approach_dir, fruit, rec)
+        self._braked_time += self.clock.now() - t_brake
+        if self._running:
+            self.base.set_velocity(self._target_speed())
+        return ret
+
+    def _pick(self, pick_pos, approach_dir, fruit=None, rec=None):
+        if fruit is not None:
+            self.fruit_map.mark_attempted(fruit.fruit_id)
+            if fruit.attempts > 1:
+                metrics.inc("pick_retries_total")
+        if rec is not None:
+            self.recorder.record_decision(rec, 'pick', [(pick_pos, approach_dir)])
+            self.recorder.activate(rec)
+        start = time.monotonic()
+        pick_method = self.arm.pick_blended if self.use_blending else self.arm.pick
+        try:
+            ret = pick_method(pick_pos=pick_pos, place_pos=self.place_pos, approach_dir=approach_dir)
+        except Exception as e:
+            logger.error("机械臂操作失败: %s", e)
+            ret = None
+            if rec is not None:
+                self.recorder.trigger("exception")
+        if rec is not None:
+            self.recorder.end(rec, ret, error=ret is None, act_time=time.monotonic() - start)
+        if ret == 0:
+            self.stats['picks'] += 1
+            metrics.inc("picks_total")
+        else:
+            self.stats['failures'] += 1
+            metrics.inc("pick_failures_total")
+        if fruit is not None:
+            self.fruit_map.mark_result(fruit.fruit_id, ret == 0)
+        return ret
+
+    def _wait_until_stopped(self, speed_eps=0.002):
+        period = 1.0 / self.driver.rate_hz
+        deadline = self.clock.now() + self.brake_timeout
+        while self.clock.now() < deadline:
+            if not self.driver.threaded:
+                self.driver.step()
+            pose = self.driver.get_pose()
+            if abs(pose.v) < speed_eps and abs(pose.omega) < speed_eps:
+                return True
+            self.clock.sleep(period)
+        logger.warning("等待底盘停稳超时")
+        return False
@@ -0,0 +1,314 @@
+import json
+import math
+import os
+import threading
+
+# 果实状态
+STATE_SEEN = "seen"  # 已观测，尚未尝试采摘
+STATE_ATTEMPTED = "attempted"  # 已下发采摘，尚未得到结果
+STATE_PICKED = "picked"  # 采摘成功
+STATE_FAILED = "failed"  # 采摘失败次数达到上限，不再尝试
+
+FRUIT_STATES = (STATE_SEEN, STATE_ATTEMPTED, STATE_PICKED, STATE_FAILED)
+
+
+class Fruit:
+    """地图中的一个果实"""
+
+    __slots__ = ('fruit_id', 'position', 'label', 'score', 'observations', 'state',
+                 'attempts', 'first_seen', 'last_seen', '_key')
+
+    def __init__(self, fruit_id, position, label=None, score=0.0, timestamp=0.0):
+        self.fruit_id = fruit_id
+        self.position = list(position)  # 里程计坐标系位置 [x, y, z]，单位米
+        self.label = label
+        self.score = score
+        self.observations = 1
+        self.state = STATE_SEEN
+        self.attempts = 0
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self._key = None
+
+    def to_dict(self):
+        return {
+            'id': self.fruit_id,
+            'position': self.position,
+            'label': self.label,
+            'score': self.score,
+            'observations': self.observations,
+            'state': self.state,
+            'attempts': self.attempts,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        fruit = cls(data['id'], data['position'], data.get('label'), data.get('score', 0.0),
+                    data.get('first_seen', 0.0))
+        fruit.observations = data.get('observations', 1)
+        fruit.state = data.get('state', STATE_SEEN)
+        fruit.attempts = data.get('attempts', 0)
+        fruit.last_seen = data.get('last_seen', fruit.first_seen)
+        return fruit
+
+
+class FruitMap:
+    """里程计坐标系下的持久化果实地图
+
+    以体素哈希作为空间索引：体素边长不小于合并半径，因此任何邻域查询只需检查
+    常数个体素，插入、合并和邻域查询的代价与地图规模无关。同一果实的重复观测
+    按观测次数加权平均合并，并跟踪 seen / attempted / picked / failed 状态，
+    避免同一果实被重复检测或在失败后被反复作为目标。
+    """
+
+    def __init__(self, merge_radius=0.03, voxel_size=None, max_attempts=2, archive_path=None):
+        """初始化果实地图
+
+        参数:
+            merge_radius: 新观测与已有果实距离小于该值时视为同一果实，单位米
+            voxel_size: 空间索引体素边长，单位米，默认等于merge_radius
+            max_attempts: 单个果实的最大采摘尝试次数，失败达到该次数后标记为failed
+            archive_path: archive_behind移出的果实追加写入的JSON Lines文件，None表示直接丢弃
+        """
+        self.merge_radius = merge_radius
+        self.voxel_size = max(voxel_size or merge_radius, merge_radius)
+        self.max_attempts = max_attempts
+        self.archive_path = archive_path
+        self._fruits = {}
+        self._voxels = {}
+        self._next_id = 1
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._fruits)
+
+    def _key(self, position):
+        s = self.voxel_size
+        return (math.floor(position[0] / s), math.floor(position[1] / s), math.floor(position[2] / s))
+
+    def _index(self, fruit):
+        key = self._key(fruit.position)
+        if key == fruit._key:
+            return
+        if fruit._key is not None:
+            bucket = self._voxels.get(fruit._key)
+            if bucket is not None:
+                bucket.discard(fruit.fruit_id)
+                if not bucket:
+                    del self._voxels[fruit._key]
+        self._voxels.setdefault(key, set()).add(fruit.fruit_id)
+        fruit._key = key
+
+    def _unindex(self, fruit):
+        bucket = self._voxels.get(fruit._key)
+        if bucket is not None:
+            bucket.discard(fruit.fruit_id)
+            if not bucket:
+                del self._voxels[fruit._key]
+        fruit._key = None
+
+    def query_radius(self, position, radius):
+        """返回距离position不超过radius的果实列表，按距离从近到远排序"""
+        with self._lock:
+            r_voxels = int(math.ceil(radius / self.voxel_size))
+            cx, cy, cz = self._key(position)
+            radius2 = radius * radius
+            found = []
+            for dx in range(-r_voxels, r_voxels + 1):
+                for dy in range(-r_voxels, r_voxels + 1):
+                    for dz in range(-r_voxels, r_voxels + 1):
+                        bucket = self._voxels.get((cx + dx, cy + dy, cz + dz))
+                        if not bucket:
+                            continue
+                        for fruit_id in bucket:
+                            fruit = self._fruits[fruit_id]
+                            d2 = sum((fruit.position[i] - position[i]) ** 2 for i in range(3))
+                            if d2 <= radius2:
+                                found.append((d2, fruit))
+            found.sort(key=lambda item: item[0])
+            return [fruit for _, fruit in found]
+
+    def nearest(self, position, max_distance=None):
+        """返回max_distance（默认合并半径）内最近的果实，没有则返回None"""
+        result = self.query_radius(position, max_distance if max_distance is not None else self.merge_radius)
+        return result[0] if result else None
+
+    def observe(self, position, label=None, score=0.0, timestamp=0.0):
+        """加入一次观测，与合并半径内最近的同类果实合并
+
+        参数:
+            position: 里程计坐标系位置 [x, y, z]，单位米
+            label: 类别
+            score: 检测置信度
+            timestamp: 观测时间
+
+        返回:
+            (Fruit对象, 是否为新果实)
+        """
+        with self._lock:
+            for fruit in self.query_radius(position, self.merge_radius):
+                if label is not None and fruit.label is not None and fruit.label != label:
+                    continue
+                n = fruit.observations
+                fruit.position = [(fruit.position[i] * n + position[i]) / (n + 1) for i in range(3)]
+                fruit.observations = n + 1
+                fruit.score = max(fruit.score, score)
+                fruit.last_seen = timestamp
+                self._index(fruit)
+                return fruit, False
+
+            fruit = Fruit(self._next_id, position, label, score, timestamp)
+            self._next_id += 1
+            self._fruits[fruit.fruit_id] = fruit
+            self._index(fruit)
+            return fruit, True
+
+    def observe_batch(self, positions, labels=None, scores=None, timestamp=0.0):
+        """批量加入一帧的观测，返回对应的Fruit列表"""
+        fruits = []
+        for i, position in enumerate(positions):
+            label = labels[i] if labels is not None else None
+            score = scores[i] if scores is not None else 0.0
+            fruits.append(self.observe(position, label, score, timestamp)[0])
+        return fruits
+
+    def get(self, fruit_id):
+        return self._fruits.get(fruit_id)
+
+    def mark_attempted(self, fruit_id):
+        with self._lock:
+            fruit = self._fruits[fruit_id]
+            fruit.state = STATE_ATTEMPTED
+            fruit.attempts += 1
+
+    def mark_result(self, fruit_id, success):
+        """记录采摘结果：成功标记为picked；失败次数达到上限标记为failed，否则回到seen"""
+        with self._lock:
+            fruit = self._fruits[fruit_id]
+            if success:
+                fruit.state = STATE_PICKED
+            elif fruit.attempts >= self.max_attempts:
+                fruit.state = STATE_FAILED
+            else:
+                fruit.state = STATE_SEEN
+
+    def is_pickable(self, fruit):
+        return fruit.state == STATE_SEEN
+
+    def pickable_near(self, position, radius):
+        """返回radius内仍可采摘的果实，按距离排序"""
+        return [f for f in self.query_radius(position, radius) if self.is_pickable(f)]
+
+    def count_by_state(self):
+        counts = dict.fromkeys(FRUIT_STATES, 0)
+        for fruit in self._fruits.values():
+            counts[fruit.state] += 1
+        return counts
+
+    def density(self, x_min, x_max, bin_size):
+        """统计沿x方向（行进方向）各区间内仍可采摘的果实数量，用于覆盖规划
+
+        返回:
+            每个区间的果实数量列表
+        """
+        bins = max(1, int(math.ceil((x_max - x_min) / bin_size)))
+        counts = [0] * bins
+        for fruit in self._fruits.values():
+            if not self.is_pickable(fruit):
+                continue
+            i = int((fruit.position[0] - x_min) // bin_size)
+            if 0 <= i < bins:
+                counts[i] += 1
+        return counts
+
+    def archive_behind(self, pose, distance, path=None):
+        """把沿底盘当前航向落后超过distance且不再需要处理的果实移出内存
+
+        按果实相对底盘的位置在航向 (cosθ, sinθ) 上的投影判断，与底盘沿+x还是-x行驶无关
+        （蛇形覆盖的回程车道航向为-x）。
+
+        参数:
+            pose: 底盘位姿，需要x、y、theta属性（如BasePose），单位米、弧度
+            distance: 落后距离阈值，单位米
+            path: 追加写入的JSON Lines文件，默认使用archive_path
+
+        返回:
+            移出的果实数量
+        """
+        path = path if path is not None else self.archive_path
+        hx, hy = math.cos(pose.theta), math.sin(pose.theta)
+        with self._lock:
+            removed = [f for f in self._fruits.values()
+                       if (f.position[0] - pose.x) * hx + (f.position[1] - pose.y) * hy < -distance
+                       and f.state != STATE_ATTEMPTED]
+            if path is not None and removed:
+                with open(path, 'a') as f:
+                    for fruit in removed:
+                        f.write(json.dumps(fruit.to_dict(), ensure_ascii=False) + "\n")
+            for fruit in removed:
+                self._unindex(fruit)
+                del self._fruits[fruit.fruit_id]
+            return len(removed)
+
+    def save(self, path):
+        """保存地图到JSON文件（先写临时文件再替换，避免中途断电损坏）"""
+        with self._lock:
+            data = {
+                'merge_radius': self.merge_radius,
+                'voxel_size': self.voxel_size,
+                'max_attempts': self.max_attempts,
+                'next_id': self._next_id,
+                'fruits': [fruit.to_dict() for fruit in self._fruits.values()],
+            }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, archive_path=None):
+        """从save保存的JSON文件加载地图"""
+        with open(path) as f:
+            data = json.load(f)
+        fruit_map = cls(data['merge_radius'], data['voxel_size'], data.get('max_attempts', 2), archive_path)
+        for item in data['fruits']:
+            fruit = Fruit.from_dict(item)
+            fruit_map._fruits[fruit.fruit_id] = fruit
+            fruit_map._index(fruit)
+        fruit_map._next_id = data.get('next_id', max(fruit_map._fruits, default=0) + 1)
+        return fruit_map
+
+
+def archive_saved_map(path, archive_path=None):
+    """把save保存的地图中的果实追加到归档文件并删除地图文件
+
+    底盘里程计每次启动都从原点开始，上次运行保存的坐标与本次运行的里程计坐标系不对应，
+    不能作为本次运行的地图；归档记录带有archived_from和saved_at字段以区分来源。
+    archive_path为空时把地图文件改名为 <path>.prev。
+
+    返回:
+        归档的果实数量，地图文件不存在时返回0
+    """
+    try:
+        saved_at = os.path.getmtime(path)
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return 0
+    fruits = data.get('fruits', [])
+    if not archive_path:
+        os.replace(path, path + '.prev')
+        return len(fruits)
+    directory = os.path.dirname(archive_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(archive_path, 'a') as f:
+        for item in fruits:
+            f.write(json.dumps(dict(item, archived_from=path, saved_at=saved_at), ensure_ascii=False) + "\n")
+    os.remove(path)
+    return len(fruits)
@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class TargetLocalizer:
+    """把检测结果定位到机械臂基坐标系，并按可达性筛选、排序
+
+    检测框中心按相机内参和深度反投影，再经相机到机械臂的变换得到目标位置（单位mm）。
+    配置了可达性地图时剔除够不到或处于奇异区域的目标，配置了抓取位姿估计器时
+    为选中的目标计算6自由度抓取位姿和接近方向。
+    """
+
+    def __init__(self, intrinsics, camera_to_arm, reachability_map=None, grasp_estimator=None,
+                 depth_scale=1.0):
+        """
+        参数:
+            intrinsics: 彩色相机内参字典（fx, fy, cx, cy）
+            camera_to_arm: 相机到机械臂基坐标系的4x4变换矩阵，单位mm
+            reachability_map: ReachabilityMap对象，可为None
+            grasp_estimator: GraspPoseEstimator对象，可为None
+            depth_scale: 深度图数值换算为mm的比例
+        """
+        self.intrinsics = intrinsics
+        self.camera_to_arm = np.asarray(camera_to_arm, dtype=np.float64)
+        self.reachability_map = reachability_map
+        self.grasp_estimator = grasp_estimator
+        self.depth_scale = depth_scale
+
+    def localize(self, depth_image, detections):
+        """计算每个检测目标在机械臂坐标系下的位置
+
+        参数:
+            depth_image: 与彩色图对齐的深度图
+            detections: analyze_frame返回的目标列表
+
+        返回:
+            (有效深度的检测列表, 对应的机械臂坐标数组(N, 3)，单位mm)
+        """
+        if not detections:
+            return [], np.empty((0, 3))
+        h, w = depth_image.shape[:2]
+        u = np.clip(np.array([int(d['x']) for d in detections]), 0, w - 1)
+        v = np.clip(np.array([int(d['y']) for d in detections]), 0, h - 1)
+        depth = depth_image[v, u].astype(np.float64) * self.depth_scale
+        valid = depth > 0
+        if not valid.any():
+            return [], np.empty((0, 3))
+        u, v, z = u[valid], v[valid], depth[valid]
+        intr = self.intrinsics
+        camera_points = np.stack([(u - intr['cx']) * z / intr['fx'],
+                                  (v - intr['cy']) * z / intr['fy'], z], axis=1)
+        R, t = self.camera_to_arm[:3, :3], self.camera_to_arm[:3, 3]
+        kept = [d for d, ok in zip(detections, valid) if ok]
+        return kept, camera_points @ R.T + t
+
+    def rank(self, positions):
+        """返回可达目标的下标，按可操作度从高到低排序；没有可达性地图时保持原顺序"""
+        if self.reachability_map is None:
+            return np.arange(len(positions))
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64)
+        return self.reachability_map.rank(positions)
+
+    def suggest_base_shift(self, positions, axis=0):
+        """所有目标都不可达时，给出底盘移动建议（见ReachabilityMap.suggest_base_shift）"""
+        if self.reachability_map is None or len(positions) == 0:
+            return None
+        return self.reachability_map.suggest_base_shift(positions, axis=axis)
+
+    def grasp(self, depth_image, detection, position):
+        """计算抓取位姿
+
+        返回:
+            (pick_pos [x, y, z, rx, ry, rz], approach_dir或None)
+        """
+        pick_pos = [float(c) for c in position] + [0.0, 0.0, 0.0]
+        if self.grasp_estimator is None:
+            return pick_pos, None
+        grasp = self.grasp_estimator.estimate(depth_image, detection)
+        if grasp is None:
+            return pick_pos, None
+        return grasp['desc_pos'], grasp['approach_dir']
@@ -1,9 +1,24 @@
-from fairino import Robot
-import time
+import logging
+
+from utils.clock import RealClock
+from robot.state_monitor import RobotStateMonitor
+from robot.trajectory import PickTrajectoryBuilder, supports_blending
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
 
 class ArmController:
     def __init__(self, ip="192.168.58.2", default_vel=20.0, default_acc=50.0, 
-                 gripper_open_time=0.5, gripper_close_time=0.5, approach_offset=50):
+                 gripper_open_time=0.5, gripper_close_time=0.5, approach_offset=50,
+                 rpc_factory=None, clock=None, blend_radius=20.0, recorder=None):
+        """
+        blend_radius: pick_blended默认使用的平滑过渡半径，单位mm
+        rpc_factory: 以ip为参数创建RPC对象的可调用对象，默认使用fairino的Robot.RPC，
+                     传入SimRobotRPC.factory(...)即可切换到仿真后端
+        clock: 时钟对象，夹爪等待等操作通过它完成，默认使用真实时钟
+        recorder: 可选的FlightRecorder，设置后每条MoveL的目标位姿和返回码都记入当前采摘周期；
+                  也可在连接后再给recorder属性赋值
+        """
         self.ip = ip
         self.default_vel = default_vel
         self.default_acc = default_acc
@@ -13,27 +28,97 @@ class ArmController:
         self.robot = None
         self.connected = False
         self.position = None  # 机械臂当前位置
+        self.rpc_factory = rpc_factory
+        self.clock = clock if clock is not None else RealClock()
+        self.state_monitor = None
+        self._state_robot = None  # 状态监视线程专用的RPC连接
+        self.blend_radius = blend_radius
+        self.recorder = recorder
+
+    def apply_settings(self, new_settings):
+        """应用热更新的速度、加速度、夹爪时间和接近偏移（SettingsWatcher订阅回调），下一次运动起生效"""
+        robot = new_settings.robot
+        self.default_vel = robot.arm_default_velocity
+        self.default_acc = robot.arm_default_acceleration
+        self.gripper_open_time = robot.arm_gripper_open_time
+        self.gripper_close_time = robot.arm_gripper_close_time
+        self.approach_offset = robot.arm_approach_offset
+        self.blend_radius = robot.arm_blend_radius
+
+    def _open_rpc(self):
+        factory = self.rpc_factory
+        if factory is None:
+            # 只在连接实际机械臂时导入fairino SDK，仿真后端和未安装SDK的环境不受影响
+            try:
+                from fairino import Robot
+            except ImportError:
+                raise RuntimeError("未安装fairino SDK，无法连接实际机械臂")
+            factory = Robot.RPC
+        return factory(self.ip)
 
     def connect(self):
-        self.robot = Robot.RPC(self.ip)
+        self.robot = self._open_rpc()
         self.connected = True
-        print(f"Connected to robot at {self.ip}")
+        logger.info("Connected to robot at %s", self.ip)
 
     def disconnect(self):
+        self.stop_state_monitor()
         if self.robot:
             self.robot.CloseRPC()
             self.connected = False
-            print("Disconnected from robot.")
+            logger.info("Disconnected from robot.")
 
     def enable(self):
         if self.robot:
             ret = self.robot.RobotEnable(1)
-            print(f"Robot enable: {ret}")
+            logger.info("Robot enable: %s", ret)
 
     def disable(self):
         if self.robot:
             ret = self.robot.RobotEnable(0)
-            print(f"Robot disable: {ret}")
+            logger.info("Robot disable: %s", ret)
+
+    def start_state_monitor(self, rate_hz=50.0, poll_gripper=True):
+        """
+        启动后台状态监视线程，之后get_position优先返回缓存的位姿
+        rate_hz: 轮询频率，单位Hz
+        """
+        if not self.robot:
+            return None
+        if self.state_monitor is None:
+            # fairino的RPC对象基于xmlrpc.client.ServerProxy，不能被多个线程同时使用；
+            # 控制线程阻塞在MoveL时监视线程仍要轮询，因此监视线程使用单独的连接
+            if getattr(self.robot, 'thread_safe', False):
+                state_robot = self.robot
+            else:
+                try:
+                    state_robot = self._state_robot = self._open_rpc()
+                except Exception as e:
+                    logger.error("状态监视连接失败，不启动状态监视: %s", e)
+                    return None
+            self.state_monitor = RobotStateMonitor(state_robot, rate_hz=rate_hz,
+                                                   clock=self.clock, poll_gripper=poll_gripper)
+        self.state_monitor.start()
+        return self.state_monitor
+
+    def stop_state_monitor(self):
+        if self.state_monitor is not None:
+            self.state_monitor.stop()
+            self.state_monitor = None
+        if self._state_robot is not None:
+            try:
+                self._state_robot.CloseRPC()
+            except Exception as e:
+                logger.warning("关闭状态监视连接失败: %s", e)
+            self._state_robot = None
+
+    def get_state(self):
+        """
+        返回(RobotState, 年龄秒数)，未启动状态监视时返回(None, None)
+        """
+        if self.state_monitor is None:
+            return None, None
+        return self.state_monitor.get_state()
 
     def move_to(self, desc_pos, tool=0, user=0, vel=None, acc=None):
         """
@@ -46,9 +131,10 @@ class ArmController:
         if self.robot:
             vel = vel if vel is not None else self.default_vel
             acc = acc if acc is not None else self.default_acc
-            ret = self.robot.MoveL(desc_pos, tool, user, vel=vel, acc=acc)
-            print(f"MoveL to {desc_pos}, ret={ret}")
-            self.position = desc_pos
+            ret = self._move_l(desc_pos, tool, user, vel=vel, acc=acc)
+            logger.debug("MoveL to %s, ret=%s", desc_pos, ret)
+            self._update_position_after_move(ret, desc_pos)
+            return ret
 
     def calibrate(self, zero_pos=[0, 0, 0, 0, 0, 0], tool=0, user=0, vel=None, acc=None):
         """
@@ -57,39 +143,73 @@ class ArmController:
         if self.robot:
             vel = vel if vel is not None else self.default_vel
             acc = acc if acc is not None else self.default_acc
-            ret = self.robot.MoveL(zero_pos, tool, user, vel=vel, acc=acc)
-            print(f"Calibrate (MoveL to zero), ret={ret}")
-            self.position = zero_pos
+            ret = self._move_l(zero_pos, tool, user, vel=vel, acc=acc)
+            logger.debug("Calibrate (MoveL to zero), ret=%s", ret)
+            self._update_position_after_move(ret, zero_pos)
+            return ret
 
-    def get_position(self):
-        if self.robot:
-            ret, pos = self.robot.GetActualTCPPose()
-            if ret == 0:
+    def _move_l(self, desc_pos, tool, user, **kwargs):
+        """调用MoveL并记录耗时和错误次数"""
+        with metrics.span("arm_movel_seconds"):
+            ret = self.robot.MoveL(desc_pos, tool, user, **kwargs)
+        if ret != 0:
+            metrics.inc("arm_movel_errors_total")
+        if self.recorder is not None:
+            self.recorder.record_move(desc_pos, ret)
+        return ret
+
+    def _update_position_after_move(self, ret, desc_pos):
+        """
+        运动成功才把目标位姿记为当前位置；失败时以实际位姿为准
+        """
+        if ret == 0:
+            self.position = list(desc_pos)
+        else:
+            self.position = self.get_position(max_age=0)
+
+    def get_position(self, max_age=None):
+        """
+        获取TCP位姿。状态监视线程运行时返回缓存值，不产生RPC往返；
+        缓存超过max_age（默认两个轮询周期）或监视未启动时直接查询机械臂
+        max_age: 允许的缓存年龄，单位秒
+        """
+        if not self.robot:
+            return None
+        monitor = self.state_monitor
+        if monitor is not None and monitor.running:
+            if max_age is None:
+                max_age = 2.0 / monitor.rate_hz
+            pos, _ = monitor.get_pose(max_age)
+            if pos is not None:
                 self.position = pos
-                print(f"Current TCP position: {pos}")
                 return pos
-            else:
-                print(f"Get position failed, ret={ret}")
-                return None
+        ret, pos = self.robot.GetActualTCPPose()
+        if ret == 0:
+            self.position = list(pos)
+            return self.position
+        else:
+            logger.warning("Get position failed, ret=%s", ret)
+            return None
 
     def stop(self):
         if self.robot:
             ret = self.robot.StopMotion()
-            print(f"Stop motion, ret={ret}")
+            logger.info("Stop motion, ret=%s", ret)
 
     def pause(self):
         if self.robot:
             ret = self.robot.PauseMotion()
-            print(f"Pause motion, ret={ret}")
+            logger.info("Pause motion, ret=%s", ret)
 
     def resume(self):
         if self.robot:
             ret = self.robot.ResumeMotion()
-            print(f"Resume motion, ret={ret}")
+            logger.info("Resume motion, ret=%s", ret)
 
-    def pick(self, pick_pos, place_pos, tool=0, user=0, vel=None, acc=None):
+    def pick(self, pick_pos, place_pos, tool=0, user=0, vel=None, acc=None, approach_dir=None):
         """
-        执行摘取操作：
+        approach_dir: 接近方向单位向量（从目标指向夹爪后退的方向），默认沿+Z
+        执行摘取操作，返回第一个非零的MoveL错误码，全部成功返回0：
         1. 移动到pick_pos上方
         2. 打开夹爪
         3. 下移到目标
@@ -100,52 +220,135 @@ class ArmController:
         8. 抬起回避
         """
         if not self.robot:
-            print("Robot not connected.")
-            return
+            logger.error("Robot not connected.")
+            return None
         
         vel = vel if vel is not None else self.default_vel
         acc = acc if acc is not None else self.default_acc
+        err = 0  # 记录第一个非零的MoveL错误码
         
-        # 1. 移动到pick_pos上方
-        approach_offset = [0, 0, self.approach_offset, 0, 0, 0]
+        # 1. 移动到pick_pos上方（沿接近方向后退approach_offset）
+        approach_dir = approach_dir if approach_dir is not None else (0, 0, 1)
+        approach_offset = [self.approach_offset * approach_dir[i] for i in range(3)] + [0, 0, 0]
         approach_pos = [pick_pos[i] + approach_offset[i] for i in range(6)]
-        self.robot.MoveL(approach_pos, tool, user, vel=vel, acc=acc)
-        time.sleep(self.gripper_open_time)
+        ret = self._move_l(approach_pos, tool, user, vel=vel, acc=acc)
+        err = err or ret
+        self.clock.sleep(self.gripper_open_time)
         
         # 2. 打开夹爪
         if hasattr(self.robot, 'ActivateGripper'):
             self.robot.ActivateGripper()
         if hasattr(self.robot, 'ControlGripper'):
             self.robot.ControlGripper(open=True)
-        time.sleep(self.gripper_open_time)
+        self.clock.sleep(self.gripper_open_time)
         
         # 3. 下移到pick_pos
-        self.robot.MoveL(pick_pos, tool, user, vel=vel, acc=acc)
-        time.sleep(self.gripper_close_time)
+        ret = self._move_l(pick_pos, tool, user, vel=vel, acc=acc)
+        err = err or ret
+        self.clock.sleep(self.gripper_close_time)
         
         # 4. 关闭夹爪夹取
         if hasattr(self.robot, 'ControlGripper'):
             self.robot.ControlGripper(open=False)
-        time.sleep(self.gripper_close_time)
+        self.clock.sleep(self.gripper_close_time)
         
         # 5. 抬起
-        self.robot.MoveL(approach_pos, tool, user, vel=vel, acc=acc)
-        time.sleep(self.gripper_open_time)
+        ret = self._move_l(approach_pos, tool, user, vel=vel, acc=acc)
+        err = err or ret
+        self.clock.sleep(self.gripper_open_time)
         
         # 6. 移动到place_pos上方
-        place_approach_pos = [place_pos[i] + approach_offset[i] for i in range(6)]
-        self.robot.MoveL(place_approach_pos, tool, user, vel=vel, acc=acc)
-        time.sleep(self.gripper_open_time)
+        place_offset = [0, 0, self.approach_offset, 0, 0, 0]
+        place_approach_pos = [place_pos[i] + place_offset[i] for i in range(6)]
+        ret = self._move_l(place_approach_pos, tool, user, vel=vel, acc=acc)
+        err = err or ret
+        self.clock.sleep(self.gripper_open_time)
         
         # 7. 下移到place_pos
-        self.robot.MoveL(place_pos, tool, user, vel=vel, acc=acc)
-        time.sleep(self.gripper_open_time)
+        ret = self._move_l(place_pos, tool, user, vel=vel, acc=acc)
+        err = err or ret
+        self.clock.sleep(self.gripper_open_time)
         
         # 8. 打开夹爪放下
         if hasattr(self.robot, 'ControlGripper'):
             self.robot.ControlGripper(open=True)
-        time.sleep(self.gripper_open_time)
+        self.clock.sleep(self.gripper_open_time)
         
         # 9. 抬起回避
-        self.robot.MoveL(place_approach_pos, tool, user, vel=vel, acc=acc)
-        print("Pick and place finished.")
\ No newline at end of file
+        ret = self._move_l(place_approach_pos, tool, user, vel=vel, acc=acc)
+        err = err or ret
+        logger.info("Pick and place finished.")
+        return err
+
+    def _control_gripper(self, open, activate=False):
+        if activate and hasattr(self.robot, 'ActivateGripper'):
+            self.robot.ActivateGripper()
+        if hasattr(self.robot, 'ControlGripper'):
+            self.robot.ControlGripper(open=open)
+
+    def execute_trajectory(self, trajectory, tool=0, user=0, vel=None, acc=None, blend=None):
+        """
+        执行Trajectory：无夹爪动作的路点以blendR平滑经过，其余路点停稳后执行夹爪动作。
+        SDK不支持blendR时退化为逐段停稳的MoveL。
+        blend: 是否使用平滑过渡，None表示根据SDK能力自动判断
+        返回第一个非零的MoveL错误码，全部成功返回0
+        """
+        if not self.robot:
+            logger.error("Robot not connected.")
+            return None
+
+        vel = vel if vel is not None else self.default_vel
+        acc = acc if acc is not None else self.default_acc
+        blend = supports_blending(self.robot) if blend is None else blend
+
+        # 预先发出的夹爪动作与运动并行，到达需要夹爪的路点前再补足剩余等待时间
+        gripper_ready_at = self.clock.now()
+        if trajectory.pre_action is not None:
+            opening = trajectory.pre_action == "open"
+            self._control_gripper(opening, activate=True)
+            gripper_ready_at += self.gripper_open_time if opening else self.gripper_close_time
+
+        for wp in trajectory:
+            if blend and wp.action is None and wp.blend_radius >= 0:
+                ret = self._move_l(wp.pose, tool, user, vel=vel, acc=acc, blendR=wp.blend_radius)
+            else:
+                ret = self._move_l(wp.pose, tool, user, vel=vel, acc=acc)
+            if ret != 0:
+                logger.error("Trajectory MoveL to %s failed, ret=%s", wp.label, ret)
+                if blend:
+                    # 丢弃已经排队的平滑运动段，避免继续执行半条轨迹
+                    self.robot.StopMotion()
+                self._update_position_after_move(ret, wp.pose)
+                return ret
+
+            if wp.action is not None:
+                remaining = gripper_ready_at - self.clock.now()
+                if remaining > 0:
+                    self.clock.sleep(remaining)
+                opening = wp.action == "open"
+                self._control_gripper(opening)
+                self.clock.sleep(self.gripper_open_time if opening else self.gripper_close_time)
+                gripper_ready_at = self.clock.now()
+
+        self._update_position_after_move(0, trajectory.waypoints[-1].pose)
+        return 0
+
+    def pick_blended(self, pick_pos, place_pos, tool=0, user=0, vel=None, acc=None,
+                     blend_radius=None, approach_dir=None):
+        """
+        以平滑连续轨迹执行摘取-放置，路点与pick相同，
+        但接近点、抬起点和转运点不停稳，也不做固定等待
+        blend_radius: 平滑过渡半径，单位mm，默认使用构造时的blend_radius
+        approach_dir: 接近方向单位向量，默认沿+Z
+        """
+        if not self.robot:
+            logger.error("Robot not connected.")
+            return None
+
+        blend_radius = blend_radius if blend_radius is not None else self.blend_radius
+        builder = PickTrajectoryBuilder(approach_offset=self.approach_offset, blend_radius=blend_radius)
+        trajectory = builder.build(pick_pos, place_pos, approach_dir=approach_dir, start_pos=self.position)
+        ret = self.execute_trajectory(trajectory, tool, user, vel=vel, acc=acc)
+        if ret == 0:
+            logger.info("Blended pick and place finished.")
+        return ret
@@ -1,16 +1,65 @@
+import concurrent.futures
+import logging
+
+from robot.base_driver import BaseDriver, SimBaseBackend
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
 class BaseController:
-    def __init__(self, wheel_radius=0.1, wheel_separation=0.5, base_speed=0.5):
+    def __init__(self, wheel_radius=0.1, wheel_separation=0.5, base_speed=0.5, driver=None,
+                 move_timeout_margin=2.0):
+        """
+        driver: BaseDriver实例，默认创建使用仿真后端的BaseDriver
+        move_timeout_margin: 移动超时余量，单位秒；超过预计耗时的1.5倍加该余量仍未完成时
+                             （如编码器数据中断）取消目标并停车
+        """
         self.wheel_radius = wheel_radius  # 车轮半径，单位米
         self.wheel_separation = wheel_separation  # 车轮间距，单位米
         self.base_speed = base_speed  # 基础速度，单位米/秒
-        self.current_speed = 0.0  # 当前速度，单位米/秒
-        self.current_angular_speed = 0.0  # 当前角速度，单位弧度/秒
+        if driver is None:
+            driver = BaseDriver(SimBaseBackend(), wheel_radius=wheel_radius,
+                                wheel_separation=wheel_separation, max_speed=base_speed)
+        self.driver = driver
+        self.move_timeout_margin = move_timeout_margin
+
+    def apply_settings(self, new_settings):
+        """应用热更新的基础速度（SettingsWatcher订阅回调）"""
+        self.base_speed = new_settings.robot.base_speed
+        self.driver.max_speed = new_settings.robot.base_speed
+        self.move_timeout_margin = new_settings.robot.base_move_timeout_margin
+        
+    @property
+    def current_speed(self):
+        """当前速度，单位米/秒（来自里程计）"""
+        return self.driver.get_pose().v
+        
+    @property
+    def current_angular_speed(self):
+        """当前角速度，单位弧度/秒（来自里程计）"""
+        return self.driver.get_pose().omega
+        
+    def get_pose(self):
+        """
+        获取里程计位姿BasePose(x, y, theta, v, omega, timestamp)
+        """
+        return self.driver.get_pose()
+        
+    def set_velocity(self, v, omega=0.0):
+        """
+        设置速度设定值，底盘持续以该速度运动直到下一条指令
+        v: 线速度，单位米/秒
+        omega: 角速度，单位弧度/秒，逆时针为正
+        """
+        self.driver.set_velocity(v, omega)
         
-    def move_forward(self, distance, speed=None):
+    def move_forward(self, distance, speed=None, wait=True):
         """
         控制基础车辆向前移动指定距离
         distance: 移动距离，单位米
         speed: 移动速度，单位米/秒，默认使用基础速度
+        wait: 是否阻塞到移动完成；为False时立即返回Future
+        返回: Future；阻塞等待超时时返回None
         """
         speed = speed if speed is not None else self.base_speed
         # 确保速度不超过基础速度
@@ -18,25 +67,24 @@ class BaseController:
         
         # 计算移动所需时间
         if speed == 0:
-            print("速度为0，无法移动")
+            logger.warning("速度为0，无法移动")
             return
         
         time = distance / speed
-        print(f"向前移动{distance}米，速度{speed}米/秒，预计耗时{time:.2f}秒")
+        logger.info("向前移动%s米，速度%s米/秒，预计耗时%.2f秒", distance, speed, time)
         
-        # 这里应该添加实际的移动控制代码
-        # 例如：发送命令到硬件控制器
-        self.current_speed = speed
-        # 模拟移动过程
-        import time as t
-        t.sleep(time)
-        self.current_speed = 0.0
+        future = self.driver.drive_distance(distance, speed)
+        if wait:
+            return self._wait(future, time)
+        return future
         
-    def move_backward(self, distance, speed=None):
+    def move_backward(self, distance, speed=None, wait=True):
         """
         控制基础车辆向后移动指定距离
         distance: 移动距离，单位米
         speed: 移动速度，单位米/秒，默认使用基础速度
+        wait: 是否阻塞到移动完成；为False时立即返回Future
+        返回: Future；阻塞等待超时时返回None
         """
         speed = speed if speed is not None else self.base_speed
         # 确保速度不超过基础速度
@@ -44,25 +92,24 @@ class BaseController:
         
         # 计算移动所需时间
         if speed == 0:
-            print("速度为0，无法移动")
+            logger.warning("速度为0，无法移动")
             return
         
         time = distance / speed
-        print(f"向后移动{distance}米，速度{speed}米/秒，预计耗时{time:.2f}秒")
+        logger.info("向后移动%s米，速度%s米/秒，预计耗时%.2f秒", distance, speed, time)
         
-        # 这里应该添加实际的移动控制代码
-        # 例如：发送命令到硬件控制器
-        self.current_speed = -speed
-        # 模拟移动过程
-        import time as t
-        t.sleep(time)
-        self.current_speed = 0.0
+        future = self.driver.drive_distance(-distance, speed)
+        if wait:
+            return self._wait(future, time)
+        return future
         
-    def turn_left(self, angle, angular_speed=None):
+    def turn_left(self, angle, angular_speed=None, wait=True):
         """
         控制基础车辆向左转指定角度
         angle: 转动角度，单位度
         angular_speed: 角速度，单位度/秒，默认使用最大角速度
+        wait: 是否阻塞到转动完成；为False时立即返回Future
+        返回: Future；阻塞等待超时时返回None
         """
         # 转换角度为弧度
         angle_rad = angle * 3.1415926535 / 180
@@ -80,25 +127,24 @@ class BaseController:
         
         # 计算转动所需时间
         if angular_speed_rad == 0:
-            print("角速度为0，无法转动")
+            logger.warning("角速度为0，无法转动")
             return
         
         time = angle_rad / angular_speed_rad
-        print(f"向左转{angle}度，角速度{angular_speed}度/秒，预计耗时{time:.2f}秒")
+        logger.info("向左转%s度，角速度%s度/秒，预计耗时%.2f秒", angle, angular_speed, time)
         
-        # 这里应该添加实际的转动控制代码
-        # 例如：发送命令到硬件控制器
-        self.current_angular_speed = angular_speed_rad
-        # 模拟转动过程
-        import time as t
-        t.sleep(time)
-        self.current_angular_speed = 0.0
+        future = self.driver.rotate(angle_rad, angular_speed_rad)
+        if wait:
+            return self._wait(future, time)
+        return future
         
-    def turn_right(self, angle, angular_speed=None):
+    def turn_right(self, angle, angular_speed=None, wait=True):
         """
         控制基础车辆向右转指定角度
         angle: 转动角度，单位度
         angular_speed: 角速度，单位度/秒，默认使用最大角速度
+        wait: 是否阻塞到转动完成；为False时立即返回Future
+        返回: Future；阻塞等待超时时返回None
         """
         # 转换角度为弧度
         angle_rad = angle * 3.1415926535 / 180
@@ -116,26 +162,40 @@ class BaseController:
         
         # 计算转动所需时间
         if angular_speed_rad == 0:
-            print("角速度为0，无法转动")
+            logger.warning("角速度为0，无法转动")
             return
         
         time = angle_rad / angular_speed_rad
-        print(f"向右转{angle}度，角速度{angular_speed}度/秒，预计耗时{time:.2f}秒")
-        
-        # 这里应该添加实际的转动控制代码
-        # 例如：发送命令到硬件控制器
-        self.current_angular_speed = -angular_speed_rad
-        # 模拟转动过程
-        import time as t
-        t.sleep(time)
-        self.current_angular_speed = 0.0
-        
+        logger.info("向右转%s度，角速度%s度/秒，预计耗时%.2f秒", angle, angular_speed, time)
+        
+        future = self.driver.rotate(-angle_rad, angular_speed_rad)
+        if wait:
+            return self._wait(future, time)
+        return future
+        
+    def _wait(self, future, expected):
+        """阻塞等待目标完成，超时时取消目标、停车并返回None"""
+        # 预计耗时未计入接近目标时的减速段，由倍数和余量覆盖
+        timeout = abs(expected) * 1.5 + self.move_timeout_margin
+        try:
+            with metrics.span("base_move_seconds"):
+                self.driver.wait(future, timeout)
+        except (TimeoutError, concurrent.futures.TimeoutError):
+            logger.error("底盘移动%.1f秒仍未完成（预计%.1f秒），停止底盘", timeout, abs(expected))
+            metrics.inc("base_move_timeouts_total")
+            self.stop()
+            return None
+        return future
+
     def stop(self):
         """
         停止基础车辆
         """
-        print("停止基础车辆")
-        # 这里应该添加实际的停止控制代码
-        # 例如：发送命令到硬件控制器
-        self.current_speed = 0.0
-        self.current_angular_speed = 0.0
\ No newline at end of file
+        logger.info("停止基础车辆")
+        self.driver.stop()
+        
+    def shutdown(self):
+        """
+        停止基础车辆并释放控制线程和后端资源
+        """
+        self.driver.shutdown()
\ No newline at end of file
@@ -0,0 +1,396 @@
+import logging
+import math
+import random
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import Future
+from utils.clock import RealClock
+
+logger = logging.getLogger(__name__)
+
+# 底盘位姿快照（里程计坐标系），创建后不再修改，可以在线程间直接共享
+BasePose = namedtuple('BasePose', [
+    'x',          # 位置x，单位米
+    'y',          # 位置y，单位米
+    'theta',      # 航向角，单位弧度
+    'v',          # 线速度，单位米/秒
+    'omega',      # 角速度，单位弧度/秒
+    'timestamp',  # 时间戳（时钟的now()），单位秒
+])
+
+
+def _wrap_angle(angle):
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+
+class SimBaseBackend:
+    """仿真差速底盘后端
+
+    按指令轮速积分车轮转角，可选加速度限制和编码器噪声，时间取自注入的时钟。
+    """
+
+    def __init__(self, clock=None, max_wheel_acc=20.0, noise=0.0, seed=None):
+        """
+        参数:
+            clock: 时钟对象，默认使用真实时钟
+            max_wheel_acc: 车轮角加速度上限，单位弧度/秒^2
+            noise: 编码器读数的相对噪声（0表示无噪声）
+            seed: 噪声随机种子
+        """
+        self.clock = clock if clock is not None else RealClock()
+        self.max_wheel_acc = max_wheel_acc
+        self.noise = noise
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._command = (0.0, 0.0)
+        self._speed = [0.0, 0.0]
+        self._angles = [0.0, 0.0]
+        self._last_time = self.clock.now()
+
+    def _integrate(self):
+        now = self.clock.now()
+        dt = now - self._last_time
+        self._last_time = now
+        if dt <= 0:
+            return
+        for i in range(2):
+            target = self._command[i]
+            max_delta = self.max_wheel_acc * dt
+            start = self._speed[i]
+            end = start + max(-max_delta, min(max_delta, target - start))
+            travelled = (start + end) / 2.0 * dt
+            if self.noise > 0:
+                travelled *= 1.0 + self._random.gauss(0.0, self.noise)
+            self._angles[i] += travelled
+            self._speed[i] = end
+
+    def send_wheel_velocities(self, left, right):
+        """设置左右轮角速度，单位弧度/秒"""
+        with self._lock:
+            self._integrate()
+            self._command = (left, right)
+
+    def read_wheel_angles(self):
+        """返回左右轮累计转角(left, right)，单位弧度"""
+        with self._lock:
+            self._integrate()
+            return self._angles[0], self._angles[1]
+
+    def close(self):
+        self.send_wheel_velocities(0.0, 0.0)
+
+
+class SerialBaseBackend:
+    """串口差速底盘后端
+
+    与底盘下位机按行文本协议通信：
+    - 发送  "V <左轮角速度> <右轮角速度>\\n"，单位弧度/秒
+    - 接收  "E <左轮编码器计数> <右轮编码器计数>\\n"，累计计数
+    """
+
+    def __init__(self, port="/dev/ttyUSB0", baudrate=115200, ticks_per_rev=4096, timeout=0.0):
+        """
+        参数:
+            port: 串口设备
+            baudrate: 波特率
+            ticks_per_rev: 车轮每转的编码器计数
+            timeout: 串口读超时，单位秒，0表示非阻塞
+        """
+        import serial
+
+        self.serial = serial.Serial(port, baudrate, timeout=timeout)
+        self.ticks_per_rev = ticks_per_rev
+        self._buffer = b""
+        self._angles = (0.0, 0.0)
+        self._ticks_offset = None
+
+    def send_wheel_velocities(self, left, right):
+        self.serial.write(f"V {left:.4f} {right:.4f}\n".encode('ascii'))
+
+    def read_wheel_angles(self):
+        """读取串口缓冲区中最新的编码器数据，返回左右轮累计转角，单位弧度"""
+        waiting = self.serial.in_waiting
+        if waiting:
+            self._buffer += self.serial.read(waiting)
+        latest = None
+        while b"\n" in self._buffer:
+            line, self._buffer = self._buffer.split(b"\n", 1)
+            parts = line.strip().split()
+            if len(parts) == 3 and parts[0] == b"E":
+                try:
+                    latest = (int(parts[1]), int(parts[2]))
+                except ValueError:
+                    continue
+        if latest is not None:
+            if self._ticks_offset is None:
+                self._ticks_offset = latest
+            scale = 2 * math.pi / self.ticks_per_rev
+            self._angles = ((latest[0] - self._ticks_offset[0]) * scale,
+                            (latest[1] - self._ticks_offset[1]) * scale)
+        return self._angles
+
+    def close(self):
+        try:
+            self.send_wheel_velocities(0.0, 0.0)
+        finally:
+            self.serial.close()
+
+
+class _Goal:
+    """距离或角度目标"""
+
+    def __init__(self, kind, target, speed, start_pose):
+        self.kind = kind  # "distance" 或 "angle"
+        self.target = target
+        self.speed = speed
+        self.start_pose = start_pose
+        self.progress = 0.0
+        self.last_theta = start_pose.theta
+        self.future = Future()
+
+
+class BaseDriver:
+    """差速底盘速度控制器
+
+    以固定频率运行控制循环：读取编码器、积分差速里程计、推进距离/角度目标，
+    并把速度设定值换算为左右轮角速度下发给后端。位姿以不可变快照发布，
+    任何线程都可以无锁读取；距离和角度目标以Future形式异步完成。
+    """
+
+    def __init__(self, backend, wheel_radius=0.1, wheel_separation=0.5, rate_hz=50.0,
+                 max_speed=0.5, max_angular_speed=None, max_acc=0.5, clock=None,
+                 threaded=True, history_size=500):
+        """初始化底盘控制器
+
+        参数:
+            backend: SimBaseBackend或SerialBaseBackend
+            wheel_radius: 车轮半径，单位米
+            wheel_separation: 车轮间距，单位米
+            rate_hz: 控制频率，单位Hz
+            max_speed: 最大线速度，单位米/秒
+            max_angular_speed: 最大角速度，单位弧度/秒，默认由max_speed和轮距推算
+            max_acc: 接近目标时的减速度，单位米/秒^2
+            clock: 时钟对象，默认使用真实时钟
+            threaded: 是否使用后台线程运行控制循环；为False时由调用方调用step()
+            history_size: 位姿历史长度，用于按时间戳查询位姿
+        """
+        self.backend = backend
+        self.wheel_radius = wheel_radius
+        self.wheel_separation = wheel_separation
+        self.rate_hz = rate_hz
+        self.max_speed = max_speed
+        self.max_angular_speed = (max_angular_speed if max_angular_speed is not None
+                                  else 2 * max_speed / wheel_separation)
+        self.max_acc = max_acc
+        self.clock = clock if clock is not None else RealClock()
+        self.threaded = threaded
+        self.tolerance = 0.002  # 距离目标容差，单位米
+        self.angle_tolerance = math.radians(0.5)  # 角度目标容差
+
+        self._lock = threading.Lock()
+        self._setpoint = (0.0, 0.0)
+        self._goal = None
+        self._last_angles = None
+        self._pose = BasePose(0.0, 0.0, 0.0, 0.0, 0.0, self.clock.now())
+        self._history = deque([self._pose], maxlen=history_size)
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.stats = {'steps': 0, 'overruns': 0}
+
+    # ------------------------------------------------------------------
+    # 线程管理
+    # ------------------------------------------------------------------
+    def start(self):
+        """启动控制线程"""
+        if not self.threaded or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="base-driver", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout=1.0):
+        """停止底盘并结束控制线程"""
+        self.stop()
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.backend.close()
+
+    def _run(self):
+        period = 1.0 / self.rate_hz
+        next_time = self.clock.now()
+        while not self._stop_event.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                logger.error("底盘控制循环异常: %s", e)
+            next_time += period
+            remaining = next_time - self.clock.now()
+            if remaining > 0:
+                if isinstance(self.clock, RealClock):
+                    self._stop_event.wait(remaining)
+                else:
+                    self.clock.sleep(remaining)
+            else:
+                self.stats['overruns'] += 1
+                next_time = self.clock.now()
+
+    # ------------------------------------------------------------------
+    # 控制接口
+    # ------------------------------------------------------------------
+    def set_velocity(self, v, omega=0.0):
+        """设置速度设定值，会取消正在执行的距离/角度目标
+
+        参数:
+            v: 线速度，单位米/秒
+            omega: 角速度，单位弧度/秒，逆时针为正
+        """
+        with self._lock:
+            self._cancel_goal()
+            self._setpoint = self._clamp(v, omega)
+        self.start()
+
+    def stop(self):
+        """速度设定值清零并取消目标"""
+        with self._lock:
+            self._cancel_goal()
+            self._setpoint = (0.0, 0.0)
+        if not self.threaded or self._thread is None:
+            self.backend.send_wheel_velocities(0.0, 0.0)
+
+    def drive_distance(self, distance, speed=None):
+        """沿当前航向行驶指定距离（负值为后退），返回完成时结果为最终位姿的Future"""
+        speed = abs(speed) if speed is not None else self.max_speed
+        return self._submit("distance", distance, min(speed, self.max_speed))
+
+    def rotate(self, angle, angular_speed=None):
+        """原地转动指定角度（弧度，逆时针为正），返回Future"""
+        angular_speed = abs(angular_speed) if angular_speed is not None else self.max_angular_speed
+        return self._submit("angle", angle, min(angular_speed, self.max_angular_speed))
+
+    def _submit(self, kind, target, speed):
+        with self._lock:
+            self._cancel_goal()
+            goal = _Goal(kind, target, speed, self._pose)
+            if speed <= 0 or target == 0:
+                goal.future.set_result(self._pose)
+                return goal.future
+            self._goal = goal
+        self.start()
+        return goal.future
+
+    def _cancel_goal(self):
+        if self._goal is not None:
+            self._goal.future.cancel()
+            self._goal = None
+
+    def _clamp(self, v, omega):
+        v = max(-self.max_speed, min(self.max_speed, v))
+        omega = max(-self.max_angular_speed, min(self.max_angular_speed, omega))
+        return v, omega
+
+    def wait(self, future, timeout=None):
+        """等待Future完成；非线程模式下由本方法驱动控制循环"""
+        if self.threaded:
+            return future.result(timeout)
+        period = 1.0 / self.rate_hz
+        deadline = None if timeout is None else self.clock.now() + timeout
+        while not future.done():
+            if deadline is not None and self.clock.now() >= deadline:
+                raise TimeoutError("等待底盘目标超时")
+            self.clock.sleep(period)
+            self.step()
+        return future.result()
+
+    # ------------------------------------------------------------------
+    # 控制循环
+    # ------------------------------------------------------------------
+    def step(self):
+        """执行一次控制循环：里程计积分、目标推进、下发轮速"""
+        angles = self.backend.read_wheel_angles()
+        now = self.clock.now()
+        with self._lock:
+            pose = self._integrate_odometry(angles, now)
+            v, omega = self._update_goal(pose)
+        r = self.wheel_radius
+        half = self.wheel_separation / 2.0
+        self.backend.send_wheel_velocities((v - omega * half) / r, (v + omega * half) / r)
+        self.stats['steps'] += 1
+        return pose
+
+    def _integrate_odometry(self, angles, now):
+        prev = self._pose
+        if self._last_angles is None:
+            self._last_angles = angles
+            return prev
+        dl = (angles[0] - self._last_angles[0]) * self.wheel_radius
+        dr = (angles[1] - self._last_angles[1]) * self.wheel_radius
+        self._last_angles = angles
+        ds = (dl + dr) / 2.0
+        dtheta = (dr - dl) / self.wheel_separation
+        heading = prev.theta + dtheta / 2.0
+        dt = now - prev.timestamp
+        pose = BasePose(prev.x + ds * math.cos(heading), prev.y + ds * math.sin(heading),
+                        _wrap_angle(prev.theta + dtheta),
+                        ds / dt if dt > 0 else prev.v, dtheta / dt if dt > 0 else prev.omega, now)
+        self._pose = pose
+        self._history.append(pose)
+        return pose
+
+    def _update_goal(self, pose):
+        goal = self._goal
+        if goal is None:
+            return self._setpoint
+        if goal.kind == "distance":
+            start = goal.start_pose
+            goal.progress = ((pose.x - start.x) * math.cos(start.theta) +
+                             (pose.y - start.y) * math.sin(start.theta))
+            remaining = abs(goal.target) - math.copysign(1.0, goal.target) * goal.progress
+            tolerance = self.tolerance
+        else:
+            goal.progress += _wrap_angle(pose.theta - goal.last_theta)
+            goal.last_theta = pose.theta
+            remaining = abs(goal.target) - math.copysign(1.0, goal.target) * goal.progress
+            tolerance = self.angle_tolerance
+        if remaining <= tolerance:
+            self._goal = None
+            self._setpoint = (0.0, 0.0)
+            goal.future.set_result(pose)
+            return self._setpoint
+
+        # 按剩余距离限制速度，使底盘在目标处平稳停下
+        if goal.kind == "distance":
+            speed = min(goal.speed, math.sqrt(2.0 * self.max_acc * remaining))
+            return math.copysign(speed, goal.target), 0.0
+        angular_acc = 2.0 * self.max_acc / self.wheel_separation
+        speed = min(goal.speed, math.sqrt(2.0 * angular_acc * remaining))
+        return 0.0, math.copysign(speed, goal.target)
+
+    # ------------------------------------------------------------------
+    # 位姿查询
+    # ------------------------------------------------------------------
+    def get_pose(self):
+        """返回最新的BasePose快照"""
+        return self._pose
+
+    def pose_at(self, t):
+        """按时间戳在位姿历史中线性插值，超出历史范围时返回最近的端点"""
+        history = list(self._history)
+        if not history or t >= history[-1].timestamp:
+            return history[-1] if history else self._pose
+        if t <= history[0].timestamp:
+            return history[0]
+        lo, hi = 0, len(history) - 1
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if history[mid].timestamp <= t:
+                lo = mid
+            else:
+                hi = mid
+        a, b = history[lo], history[hi]
+        span = b.timestamp - a.timestamp
+        s = (t - a.timestamp) / span if span > 0 else 1.0
+        return BasePose(a.x + (b.x - a.x) * s, a.y + (b.y - a.y) * s,
+                        _wrap_angle(a.theta + _wrap_angle(b.theta - a.theta) * s),
+                        a.v + (b.v - a.v) * s, a.omega + (b.omega - a.omega) * s, t)
@@ -0,0 +1,284 @@
+import json
+import os
+import numpy as np
+
+# 6轴协作臂的标准DH参数（a, d, alpha），单位mm/弧度。
+# 默认值为FR5的示例参数，使用前需按实际机械臂型号核对
+FR5_DH = {
+    'a': [0.0, -425.0, -395.0, 0.0, 0.0, 0.0],
+    'd': [152.0, 0.0, 0.0, 102.0, 102.0, 100.0],
+    'alpha': [np.pi / 2, 0.0, 0.0, np.pi / 2, -np.pi / 2, 0.0],
+}
+
+# 关节限位，单位度
+FR5_JOINT_LIMITS = [(-175.0, 175.0), (-265.0, 85.0), (-160.0, 160.0),
+                    (-265.0, 85.0), (-175.0, 175.0), (-175.0, 175.0)]
+
+
+def forward_kinematics(q, dh=FR5_DH):
+    """批量正运动学，只计算TCP位置
+
+    参数:
+        q: 关节角数组，形状(N, 6)，单位弧度
+        dh: DH参数字典
+
+    返回:
+        TCP位置数组，形状(N, 3)，单位mm
+    """
+    q = np.asarray(q, dtype=np.float64)
+    n = q.shape[0]
+    T = np.broadcast_to(np.eye(4), (n, 4, 4)).copy()
+    for i in range(6):
+        ct, st = np.cos(q[:, i]), np.sin(q[:, i])
+        ca, sa = np.cos(dh['alpha'][i]), np.sin(dh['alpha'][i])
+        A = np.zeros((n, 4, 4))
+        A[:, 0, 0] = ct
+        A[:, 0, 1] = -st * ca
+        A[:, 0, 2] = st * sa
+        A[:, 0, 3] = dh['a'][i] * ct
+        A[:, 1, 0] = st
+        A[:, 1, 1] = ct * ca
+        A[:, 1, 2] = -ct * sa
+        A[:, 1, 3] = dh['a'][i] * st
+        A[:, 2, 1] = sa
+        A[:, 2, 2] = ca
+        A[:, 2, 3] = dh['d'][i]
+        A[:, 3, 3] = 1.0
+        T = T @ A
+    return T[:, :3, 3]
+
+
+def position_manipulability(q, dh=FR5_DH, eps=1e-4):
+    """计算位置雅可比的可操作度 sqrt(det(J J^T))，接近0表示处于奇异位形
+
+    参数:
+        q: 关节角数组，形状(N, 6)，单位弧度
+
+    返回:
+        (TCP位置(N, 3), 可操作度(N,))
+    """
+    q = np.asarray(q, dtype=np.float64)
+    p0 = forward_kinematics(q, dh)
+    J = np.empty((q.shape[0], 3, 6))
+    for i in range(6):
+        dq = q.copy()
+        dq[:, i] += eps
+        J[:, :, i] = (forward_kinematics(dq, dh) - p0) / eps
+    det = np.linalg.det(J @ np.transpose(J, (0, 2, 1)))
+    return p0, np.sqrt(np.clip(det, 0.0, None))
+
+
+def _fill_holes(values, iterations=2, min_neighbors=4):
+    """填补随机采样在工作空间内部留下的空体素
+
+    空体素的6邻域中至少有min_neighbors个可达体素时，取邻域最小值填入，
+    保守地估计其可操作度；工作空间外边界处邻居不足，不会被外扩。
+    """
+    for _ in range(iterations):
+        padded = np.pad(values, 1)
+        neighbors = np.stack([
+            padded[2:, 1:-1, 1:-1], padded[:-2, 1:-1, 1:-1],
+            padded[1:-1, 2:, 1:-1], padded[1:-1, :-2, 1:-1],
+            padded[1:-1, 1:-1, 2:], padded[1:-1, 1:-1, :-2],
+        ])
+        reached = neighbors > 0
+        candidates = (values == 0) & (reached.sum(axis=0) >= min_neighbors)
+        if not candidates.any():
+            break
+        lowest = np.where(reached, neighbors, np.inf).min(axis=0)
+        values = np.where(candidates, lowest, values).astype(values.dtype)
+    return values
+
+
+class ReachabilityMap:
+    """机械臂工作空间可达性体素地图
+
+    体素中保存量化后的可操作度（uint8）：0表示不可达，1~255对应归一化的可操作度。
+    地图离线构建后保存为.npy（体素数据）和.json（元数据）两个文件，
+    加载时使用内存映射，批量查询只是一次数组索引，耗时在微秒级。
+    坐标均为机械臂基坐标系，单位mm。
+    """
+
+    def __init__(self, grid, origin, voxel_size, min_score=0.05, meta=None):
+        """
+        参数:
+            grid: uint8体素数组，形状(nx, ny, nz)
+            origin: 体素(0, 0, 0)的最小角点坐标 [x, y, z]
+            voxel_size: 体素边长，单位mm
+            min_score: 可操作度低于该值（0~1）的体素视为奇异区域，按不可达处理
+            meta: 其他元数据
+        """
+        self.grid = grid
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.voxel_size = float(voxel_size)
+        self.min_score = min_score
+        self.meta = meta or {}
+        self._shape = np.asarray(grid.shape)
+        self._min_level = max(1, int(np.ceil(min_score * 255)))
+
+    @classmethod
+    def build(cls, bounds=((-1000, 1000), (-1000, 1000), (-500, 1200)), voxel_size=20.0,
+              samples=2000000, dh=FR5_DH, joint_limits=FR5_JOINT_LIMITS, batch=100000,
+              seed=0, min_score=0.05):
+        """通过关节空间随机采样离线构建可达性地图
+
+        参数:
+            bounds: 地图范围 ((xmin, xmax), (ymin, ymax), (zmin, zmax))，单位mm
+            voxel_size: 体素边长，单位mm
+            samples: 关节空间采样数量，越多空洞越少
+            dh: DH参数
+            joint_limits: 关节限位列表，单位度
+            batch: 每批计算的采样数量
+            seed: 随机种子
+
+        返回:
+            ReachabilityMap对象
+        """
+        origin = np.array([b[0] for b in bounds], dtype=np.float64)
+        shape = tuple(int(np.ceil((b[1] - b[0]) / voxel_size)) for b in bounds)
+        best = np.zeros(shape, dtype=np.float32)
+        lower = np.radians([lim[0] for lim in joint_limits])
+        upper = np.radians([lim[1] for lim in joint_limits])
+        rng = np.random.default_rng(seed)
+
+        remaining = samples
+        while remaining > 0:
+            n = min(batch, remaining)
+            remaining -= n
+            q = rng.uniform(lower, upper, size=(n, 6))
+            pos, w = position_manipulability(q, dh)
+            idx = np.floor((pos - origin) / voxel_size).astype(np.int64)
+            inside = np.all((idx >= 0) & (idx < shape), axis=1)
+            idx, w = idx[inside], w[inside]
+            np.maximum.at(best, (idx[:, 0], idx[:, 1], idx[:, 2]), w.astype(np.float32))
+
+        best = _fill_holes(best)
+        w_max = float(best.max()) if best.size else 0.0
+        grid = np.zeros(shape, dtype=np.uint8)
+        if w_max > 0:
+            reached = best > 0
+            grid[reached] = np.clip(np.ceil(best[reached] / w_max * 255), 1, 255).astype(np.uint8)
+        meta = {
+            'samples': samples,
+            'manipulability_max': w_max,
+            'dh': {k: [float(v) for v in vals] for k, vals in dh.items()},
+            'joint_limits': [list(lim) for lim in joint_limits],
+        }
+        return cls(grid, origin, voxel_size, min_score=min_score, meta=meta)
+
+    def save(self, path):
+        """保存到path.npy和path.json"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.save(path + '.npy', np.ascontiguousarray(self.grid))
+        with open(path + '.json', 'w') as f:
+            json.dump({
+                'origin': self.origin.tolist(),
+                'voxel_size': self.voxel_size,
+                'shape': list(self.grid.shape),
+                'meta': self.meta,
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap=True, min_score=0.05):
+        """从path.npy和path.json加载地图
+
+        参数:
+            path: 不含扩展名的文件路径
+            mmap: 是否以只读内存映射方式加载体素数据
+            min_score: 奇异区域阈值（0~1）
+        """
+        with open(path + '.json') as f:
+            header = json.load(f)
+        grid = np.load(path + '.npy', mmap_mode='r' if mmap else None)
+        if list(grid.shape) != header['shape']:
+            raise ValueError(f"可达性地图尺寸与元数据不一致: {grid.shape} != {header['shape']}")
+        return cls(grid, header['origin'], header['voxel_size'], min_score=min_score,
+                   meta=header.get('meta'))
+
+    def _levels(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        idx = np.floor((points - self.origin) / self.voxel_size).astype(np.int64)
+        inside = np.all((idx >= 0) & (idx < self._shape), axis=1)
+        levels = np.zeros(points.shape[0], dtype=np.uint8)
+        if inside.any():
+            idx = idx[inside]
+            levels[inside] = self.grid[idx[:, 0], idx[:, 1], idx[:, 2]]
+        return levels
+
+    def query(self, points):
+        """批量查询目标点的可达性
+
+        参数:
+            points: 目标点数组，形状(N, 3)，机械臂基坐标系，单位mm
+
+        返回:
+            (reachable布尔数组(N,), 可操作度评分数组(N,)，范围0~1)
+        """
+        levels = self._levels(points)
+        return levels >= self._min_level, levels.astype(np.float32) / 255.0
+
+    def rank(self, points):
+        """返回可达目标按可操作度从高到低排序的下标"""
+        reachable, score = self.query(points)
+        candidates = np.flatnonzero(reachable)
+        return candidates[np.argsort(-score[candidates], kind='stable')]
+
+    def suggest_base_shift(self, points, axis=0, max_shift=500.0, step=None, min_gain=1):
+        """评估沿底盘行进方向平移后可达目标的数量，给出底盘移动建议
+
+        参数:
+            points: 目标点数组，形状(N, 3)，机械臂基坐标系，单位mm
+            axis: 底盘行进方向对应的机械臂坐标轴（0为x，1为y）
+            max_shift: 考虑的最大平移量，单位mm
+            step: 平移候选步长，默认一个体素
+            min_gain: 可达目标至少增加多少个才建议移动
+
+        返回:
+            字典：should_move、shift（底盘应移动的距离，mm，正值为沿axis正方向）、
+            reachable_now、reachable_after
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        step = step if step is not None else self.voxel_size
+        shifts = np.arange(-max_shift, max_shift + step / 2, step)
+        # 底盘沿axis移动s后，目标在机械臂坐标系下的坐标变为p - s
+        moved = np.repeat(points[None, :, :], len(shifts), axis=0)
+        moved[:, :, axis] -= shifts[:, None]
+        reachable = (self._levels(moved.reshape(-1, 3)) >= self._min_level).reshape(len(shifts), -1)
+        counts = reachable.sum(axis=1)
+        now = int(self.query(points)[0].sum())
+        # 可达数量相同时优先选择移动距离最小的平移
+        order = np.lexsort((np.abs(shifts), -counts))
+        best = order[0]
+        gain = int(counts[best]) - now
+        return {
+            'should_move': gain >= min_gain,
+            'shift': float(shifts[best]) if gain >= min_gain else 0.0,
+            'reachable_now': now,
+            'reachable_after': int(counts[best]) if gain >= min_gain else now,
+        }
+
+
+# 离线构建可达性地图
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="离线构建机械臂可达性地图")
+    parser.add_argument('--out', default=os.path.join('data', 'reachability_fr5'), help="输出路径（不含扩展名）")
+    parser.add_argument('--voxel', type=float, default=20.0, help="体素边长，单位mm")
+    parser.add_argument('--samples', type=int, default=2000000, help="关节空间采样数量")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    reach_map = ReachabilityMap.build(voxel_size=args.voxel, samples=args.samples)
+    reach_map.save(args.out)
+    print(f"可达性地图已保存到 {args.out}.npy，尺寸 {reach_map.grid.shape}，"
+          f"可达体素 {int((reach_map.grid > 0).sum())}，耗时 {time.perf_counter() - t0:.1f}s")
+
+    loaded = ReachabilityMap.load(args.out)
+    test_points = np.array([[400, 0, 200], [0, 400, 300], [2000, 0, 0], [0, 0, 150]], dtype=np.float64)
+    reachable, score = loaded.query(test_points)
+    for p, r, s in zip(test_points, reachable, score):
+        print(f"目标 {p.tolist()}: 可达={bool(r)}, 可操作度={s:.2f}")
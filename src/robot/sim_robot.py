@@ -0,0 +1,425 @@
+import math
+import random
+import threading
+from utils.clock import RealClock
+
+# 仿真后端使用的错误码（0表示成功，其余取值仅在仿真中有意义）
+ERR_SUCCESS = 0
+ERR_COMMUNICATION = -2  # 模拟RPC通信失败
+ERR_MOTION_STOPPED = 14  # 运动被StopMotion中止
+ERR_NOT_ENABLED = 18  # 机械臂未使能
+ERR_OUT_OF_REACH = 112  # 目标位姿超出工作空间
+
+
+def trapezoid_duration(distance, max_speed, max_acc, ramp_in=True, ramp_out=True):
+    """按梯形速度曲线计算走完指定距离所需时间
+
+    参数:
+        distance: 运动距离（mm或°）
+        max_speed: 最大速度
+        max_acc: 最大加速度
+        ramp_in: 起点是否需要从静止加速（与上一段平滑过渡时为False）
+        ramp_out: 终点是否需要减速到静止（与下一段平滑过渡时为False）
+
+    返回:
+        运动时间，单位秒
+    """
+    if distance <= 0:
+        return 0.0
+    ramps = int(ramp_in) + int(ramp_out)
+    if ramps == 0:
+        return distance / max_speed
+    # 每段加/减速过程走过的距离为 v^2 / (2a)
+    ramp_distance = max_speed * max_speed / (2.0 * max_acc)
+    if distance >= ramps * ramp_distance:
+        return distance / max_speed + ramps * max_speed / (2.0 * max_acc)
+    # 距离太短，达不到最大速度，退化为三角形速度曲线
+    if ramps == 2:
+        return 2.0 * math.sqrt(distance / max_acc)
+    return math.sqrt(2.0 * distance / max_acc)
+
+
+class _Segment:
+    """仿真中排队执行的一段直线运动"""
+
+    def __init__(self, start_pose, end_pose, t_start, t_end, ramp_out_time, blend_out):
+        self.start_pose = start_pose
+        self.end_pose = end_pose
+        self.t_start = t_start
+        self.t_end = t_end
+        self.ramp_out_time = ramp_out_time  # 终点减速所占时间，被后续平滑段衔接时扣除
+        self.blend_out = blend_out
+
+    def pose_at(self, t):
+        if t >= self.t_end or self.t_end <= self.t_start:
+            return list(self.end_pose)
+        if t <= self.t_start:
+            return list(self.start_pose)
+        s = (t - self.t_start) / (self.t_end - self.t_start)
+        return [a + (b - a) * s for a, b in zip(self.start_pose, self.end_pose)]
+
+
+class SimRobotRPC:
+    """fairino Robot.RPC 的仿真替身
+
+    实现了ArmController使用到的接口（MoveL、GetActualTCPPose、RobotEnable、
+    StopMotion、PauseMotion、ResumeMotion以及夹爪相关接口），返回值格式与SDK一致。
+    运动时间按vel/acc百分比换算出的梯形速度曲线计算，支持blendR平滑过渡、
+    RPC延时和随机故障注入，所有等待都通过可注入的时钟完成，配合VirtualClock
+    可以快于实时地运行完整的采摘循环。
+    所有接口读写内部状态（包括stats）时都持有内部锁，RPC延时和阻塞等待在锁外进行，
+    可以被多个线程（如状态监视线程）共用同一个对象。
+    """
+    thread_safe = True
+
+    def __init__(self, ip="192.168.58.2", clock=None, rpc_latency=0.002, failure_rate=0.0,
+                 max_linear_speed=1000.0, max_linear_acc=5000.0,
+                 max_angular_speed=180.0, max_angular_acc=720.0,
+                 reach_radius=900.0, min_radius=100.0, gripper_travel_time=0.4,
+                 initial_pose=None, seed=None):
+        """初始化仿真机械臂
+
+        参数:
+            ip: 机械臂IP，仅用于保持与Robot.RPC一致的构造方式
+            clock: 时钟对象，默认使用真实时钟
+            rpc_latency: 每次RPC调用的往返延时，单位秒
+            failure_rate: 每次RPC调用随机失败的概率（0~1）
+            max_linear_speed: vel=100%时的TCP线速度，单位mm/s
+            max_linear_acc: acc=100%时的TCP线加速度，单位mm/s^2
+            max_angular_speed: vel=100%时的姿态角速度，单位°/s
+            max_angular_acc: acc=100%时的姿态角加速度，单位°/s^2
+            reach_radius: 最大可达半径，单位mm
+            min_radius: 最小可达半径（基座附近的奇异区域），单位mm
+            gripper_travel_time: 夹爪以100%速度从全闭到全开所需时间，单位秒
+            initial_pose: 初始TCP位姿，默认[0, 0, 0, 0, 0, 0]
+            seed: 故障注入使用的随机种子
+        """
+        self.ip = ip
+        self.clock = clock if clock is not None else RealClock()
+        self.rpc_latency = rpc_latency
+        self.failure_rate = failure_rate
+        self.max_linear_speed = max_linear_speed
+        self.max_linear_acc = max_linear_acc
+        self.max_angular_speed = max_angular_speed
+        self.max_angular_acc = max_angular_acc
+        self.reach_radius = reach_radius
+        self.min_radius = min_radius
+        self.gripper_travel_time = gripper_travel_time
+        self.poll_interval = 0.01  # 阻塞运动时检查停止/暂停的间隔，单位秒
+
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+        self._pose = list(initial_pose) if initial_pose is not None else [0.0] * 6
+        self._target_pose = list(self._pose)
+        self._segments = []
+        self._busy_until = self.clock.now()
+        self._motion_epoch = 0
+        self._paused_at = None
+        self._enabled = False
+        self._connected = True
+        self._error_code = [0, 0]
+
+        self._gripper_active = False
+        self._gripper_pos = 0.0
+        self._gripper_target = 0.0
+        self._gripper_t_start = self._busy_until
+        self._gripper_t_end = self._busy_until
+
+        self.stats = {
+            'rpc_calls': 0,
+            'rpc_failures': 0,
+            'moves': 0,
+            'motion_time': 0.0,
+        }
+
+    @classmethod
+    def factory(cls, **kwargs):
+        """返回与Robot.RPC签名一致的构造函数，可作为ArmController的rpc_factory"""
+        def create(ip):
+            return cls(ip, **kwargs)
+        return create
+
+    # ------------------------------------------------------------------
+    # 内部工具
+    # ------------------------------------------------------------------
+    def _rpc(self):
+        """模拟一次RPC往返，返回非零错误码表示通信失败"""
+        with self._lock:
+            self.stats['rpc_calls'] += 1
+        self.clock.sleep(self.rpc_latency)
+        with self._lock:
+            if not self._connected:
+                return ERR_COMMUNICATION
+            if self.failure_rate > 0 and self._random.random() < self.failure_rate:
+                self.stats['rpc_failures'] += 1
+                return ERR_COMMUNICATION
+        return ERR_SUCCESS
+
+    def _effective_time(self, now):
+        return self._paused_at if self._paused_at is not None else now
+
+    def _update(self, now):
+        """丢弃已经执行完的运动段并刷新当前位姿，调用方需持有锁"""
+        t = self._effective_time(now)
+        while self._segments and self._segments[0].t_end <= t:
+            self._pose = list(self._segments[0].end_pose)
+            self._segments.pop(0)
+        if self._segments:
+            return self._segments[0].pose_at(t)
+        return list(self._pose)
+
+    def _segment_duration(self, start, end, vel, acc, ramp_in, ramp_out):
+        vel_ratio = max(min(vel, 100.0), 0.1) / 100.0
+        acc_ratio = max(min(acc, 100.0), 0.1) / 100.0 if acc > 0 else 1.0
+        linear = math.sqrt(sum((end[i] - start[i]) ** 2 for i in range(3)))
+        angular = max(abs(_wrap_angle(end[i] - start[i])) for i in range(3, 6))
+        return max(
+            trapezoid_duration(linear, self.max_linear_speed * vel_ratio,
+                               self.max_linear_acc * acc_ratio, ramp_in, ramp_out),
+            trapezoid_duration(angular, self.max_angular_speed * vel_ratio,
+                               self.max_angular_acc * acc_ratio, ramp_in, ramp_out),
+        )
+
+    def is_reachable(self, desc_pos):
+        """判断目标位置是否在仿真工作空间内"""
+        r = math.sqrt(desc_pos[0] ** 2 + desc_pos[1] ** 2 + desc_pos[2] ** 2)
+        # ArmController.calibrate默认回到[0,0,0,0,0,0]，仿真中将其视为合法的回零点
+        return r == 0 or self.min_radius <= r <= self.reach_radius
+
+    # ------------------------------------------------------------------
+    # 运动接口
+    # ------------------------------------------------------------------
+    def MoveL(self, desc_pos, tool=0, user=0, joint_pos=None, vel=20.0, acc=0.0, ovl=100.0,
+              blendR=-1.0, exaxis_pos=None, search=0, offset_flag=0, offset_pos=None, **kwargs):
+        """笛卡尔空间直线运动
+
+        blendR为-1时阻塞到运动完成；blendR>=0时立即返回，运动进入队列，
+        blendR>0时与下一段运动平滑衔接（仿真只计入省去的减速/加速时间，
+        不区分过渡半径的大小）。
+        """
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err
+        target = [float(v) for v in desc_pos]
+        with self._lock:
+            if not self._enabled:
+                self._error_code = [ERR_NOT_ENABLED, 0]
+                return ERR_NOT_ENABLED
+            if not self.is_reachable(target):
+                self._error_code = [ERR_OUT_OF_REACH, 0]
+                return ERR_OUT_OF_REACH
+
+            now = self.clock.now()
+            self._update(now)
+            speed = vel * max(min(ovl, 100.0), 0.0) / 100.0
+            # blendR>=0时接口非阻塞；半径为0时仍需在路点处减速到静止
+            nonblocking = blendR is not None and blendR >= 0
+            blend_out = nonblocking and blendR > 0
+
+            # 上一段设置了平滑半径且尚未执行完，则取消其终点减速，直接衔接
+            ramp_in = True
+            if self._segments and self._segments[-1].blend_out:
+                prev = self._segments[-1]
+                new_end = max(prev.t_end - prev.ramp_out_time, prev.t_start, now)
+                self.stats['motion_time'] -= prev.t_end - new_end
+                prev.t_end = new_end
+                prev.ramp_out_time = 0.0
+                self._busy_until = prev.t_end
+                ramp_in = False
+
+            start = list(self._target_pose)
+            duration = self._segment_duration(start, target, speed, acc, ramp_in, True)
+            ramp_out_time = 0.0
+            if blend_out:
+                ramp_out_time = duration - self._segment_duration(start, target, speed, acc, ramp_in, False)
+            t_start = max(now, self._busy_until)
+            segment = _Segment(start, target, t_start, t_start + duration, ramp_out_time, blend_out)
+            self._segments.append(segment)
+            self._target_pose = target
+            self._busy_until = segment.t_end
+            self.stats['moves'] += 1
+            self.stats['motion_time'] += duration
+            epoch = self._motion_epoch
+
+        if nonblocking:
+            return ERR_SUCCESS
+        return self._wait_motion(segment, epoch)
+
+    def _wait_motion(self, segment, epoch):
+        """阻塞等待指定运动段完成"""
+        while True:
+            with self._lock:
+                if self._motion_epoch != epoch:
+                    return ERR_MOTION_STOPPED
+                now = self.clock.now()
+                self._update(now)
+                if self._paused_at is not None:
+                    remaining = self.poll_interval
+                else:
+                    remaining = segment.t_end - now
+            if remaining <= 0:
+                return ERR_SUCCESS
+            if self._clock_is_shared():
+                remaining = min(remaining, self.poll_interval)
+            self.clock.sleep(remaining)
+
+    def _clock_is_shared(self):
+        """时钟是否随真实时间流逝（纯虚拟时钟下无需分段等待，一次推进到位即可）"""
+        return getattr(self.clock, 'speedup', 1) is not None
+
+    def StopMotion(self):
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err
+        with self._lock:
+            now = self.clock.now()
+            self._pose = self._update(now)
+            self._target_pose = list(self._pose)
+            self._segments = []
+            self._busy_until = now
+            self._paused_at = None
+            self._motion_epoch += 1
+        return ERR_SUCCESS
+
+    def PauseMotion(self):
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err
+        with self._lock:
+            if self._paused_at is None:
+                now = self.clock.now()
+                self._update(now)
+                self._paused_at = now
+        return ERR_SUCCESS
+
+    def ResumeMotion(self):
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err
+        with self._lock:
+            if self._paused_at is not None:
+                delay = self.clock.now() - self._paused_at
+                for segment in self._segments:
+                    segment.t_start += delay
+                    segment.t_end += delay
+                self._busy_until += delay
+                self._paused_at = None
+        return ERR_SUCCESS
+
+    # ------------------------------------------------------------------
+    # 状态接口
+    # ------------------------------------------------------------------
+    def GetActualTCPPose(self, flag=1):
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err, None
+        with self._lock:
+            return ERR_SUCCESS, self._update(self.clock.now())
+
+    def GetRobotMotionDone(self):
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err, None
+        with self._lock:
+            self._update(self.clock.now())
+            return ERR_SUCCESS, 0 if self._segments else 1
+
+    def GetRobotErrorCode(self):
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err, None
+        with self._lock:
+            return ERR_SUCCESS, list(self._error_code)
+
+    def ResetAllError(self):
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err
+        with self._lock:
+            self._error_code = [0, 0]
+        return ERR_SUCCESS
+
+    def RobotEnable(self, state):
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err
+        with self._lock:
+            self._enabled = bool(state)
+            if not self._enabled:
+                now = self.clock.now()
+                self._pose = self._update(now)
+                self._target_pose = list(self._pose)
+                self._segments = []
+                self._busy_until = now
+                self._motion_epoch += 1
+        return ERR_SUCCESS
+
+    def CloseRPC(self):
+        with self._lock:
+            self._connected = False
+
+    # ------------------------------------------------------------------
+    # 夹爪接口
+    # ------------------------------------------------------------------
+    def _gripper_position(self, now):
+        if now >= self._gripper_t_end or self._gripper_t_end <= self._gripper_t_start:
+            self._gripper_pos = self._gripper_target
+            return self._gripper_pos
+        s = (now - self._gripper_t_start) / (self._gripper_t_end - self._gripper_t_start)
+        return self._gripper_pos + (self._gripper_target - self._gripper_pos) * s
+
+    def ActivateGripper(self, index=1, action=1):
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err
+        with self._lock:
+            self._gripper_active = bool(action)
+        return ERR_SUCCESS
+
+    def MoveGripper(self, index=1, pos=100, vel=50, force=50, maxtime=30000, block=0,
+                    type=0, rotNum=0, rotVel=0, rotTorque=0):
+        """控制夹爪开合，pos为开口百分比（0全闭，100全开），block为0时阻塞"""
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err
+        with self._lock:
+            if not self._gripper_active:
+                return ERR_NOT_ENABLED
+            now = self.clock.now()
+            self._gripper_pos = self._gripper_position(now)
+            self._gripper_target = float(pos)
+            stroke = abs(self._gripper_target - self._gripper_pos) / 100.0
+            duration = stroke * self.gripper_travel_time * 100.0 / max(min(vel, 100.0), 1.0)
+            self._gripper_t_start = now
+            self._gripper_t_end = now + duration
+        if block == 0:
+            self.clock.sleep(duration)
+        return ERR_SUCCESS
+
+    def ControlGripper(self, open=True):
+        """ArmController使用的简化夹爪接口：打开或关闭夹爪"""
+        with self._lock:
+            active = self._gripper_active
+        if not active:
+            self.ActivateGripper(1, 1)
+        return self.MoveGripper(1, 100 if open else 0, 100, 50, 30000, 1)
+
+    def GetGripperMotionDone(self):
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err, None
+        with self._lock:
+            done = 1 if self.clock.now() >= self._gripper_t_end else 0
+        return ERR_SUCCESS, [0, done]
+
+    def GetGripperCurPosition(self):
+        err = self._rpc()
+        if err != ERR_SUCCESS:
+            return err, None, None
+        with self._lock:
+            return ERR_SUCCESS, 0, self._gripper_position(self.clock.now())
+
+
+def _wrap_angle(angle):
+    """将角度差规范到[-180, 180)"""
+    return (angle + 180.0) % 360.0 - 180.0
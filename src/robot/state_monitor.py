@@ -0,0 +1,175 @@
+import logging
+import threading
+from collections import namedtuple
+from utils.clock import RealClock
+
+logger = logging.getLogger(__name__)
+
+# 机械臂状态快照，创建后不再修改，可以在线程间直接共享
+RobotState = namedtuple('RobotState', [
+    'tcp_pose',             # TCP位姿 [x, y, z, rx, ry, rz]，单位mm, °；读取失败时为None
+    'motion_done',          # 运动是否完成：True/False，未知时为None
+    'error_code',           # 机械臂错误码 [主错误码, 子错误码]，未知时为None
+    'gripper_position',     # 夹爪开口百分比，未知时为None
+    'gripper_motion_done',  # 夹爪动作是否完成，未知时为None
+    'timestamp',            # 采样时间（时钟的now()），单位秒
+    'ok',                   # 本次轮询TCP位姿是否读取成功
+])
+
+
+class RobotStateMonitor:
+    """机械臂状态监视线程
+
+    以固定频率轮询TCP位姿、运动状态、错误码和夹爪状态，并将结果保存为
+    不可变的RobotState快照。快照通过单次引用赋值发布，读取方无需加锁，
+    可以在每一帧中读取位姿而不产生额外的RPC往返。
+    """
+
+    def __init__(self, robot, rate_hz=50.0, clock=None, poll_gripper=True):
+        """初始化状态监视器
+
+        参数:
+            robot: fairino Robot.RPC对象或SimRobotRPC；fairino的RPC对象不是线程安全的，
+                   应使用与控制线程不同的连接
+            rate_hz: 轮询频率，单位Hz
+            clock: 时钟对象，默认使用真实时钟。使用VirtualClock时应设置speedup，
+                   或者不启动线程而是手动调用poll_once()
+            poll_gripper: 是否同时轮询夹爪状态
+        """
+        if rate_hz <= 0:
+            raise ValueError("轮询频率必须为正数")
+        self.robot = robot
+        self.rate_hz = rate_hz
+        self.clock = clock if clock is not None else RealClock()
+        self.poll_gripper = poll_gripper
+
+        self._snapshot = None
+        self._last_good = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        self.stats = {
+            'polls': 0,
+            'failures': 0,
+            'last_poll_duration': 0.0,
+        }
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动轮询线程"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="robot-state-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """停止轮询线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        interval = 1.0 / self.rate_hz
+        while not self._stop_event.is_set():
+            t_start = self.clock.now()
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.stats['failures'] += 1
+                logger.warning("机械臂状态轮询异常: %s", e)
+            remaining = interval - (self.clock.now() - t_start)
+            if remaining > 0:
+                self._wait(remaining)
+
+    def _wait(self, seconds):
+        if isinstance(self.clock, RealClock):
+            self._stop_event.wait(seconds)
+        else:
+            self.clock.sleep(seconds)
+
+    def poll_once(self):
+        """执行一次完整轮询并发布新的快照
+
+        返回:
+            新的RobotState快照
+        """
+        t_start = self.clock.now()
+        robot = self.robot
+
+        ret, pose = robot.GetActualTCPPose()
+        ok = ret == 0 and pose is not None
+        if ok:
+            pose = tuple(pose)
+        elif self._last_good is not None:
+            # 读取失败时保留上一次成功的位姿，由ok字段和年龄区分
+            pose = self._last_good.tcp_pose
+        else:
+            pose = None
+
+        motion_done = None
+        if hasattr(robot, 'GetRobotMotionDone'):
+            ret, state = robot.GetRobotMotionDone()
+            if ret == 0 and state is not None:
+                motion_done = bool(state)
+
+        error_code = None
+        if hasattr(robot, 'GetRobotErrorCode'):
+            ret, code = robot.GetRobotErrorCode()
+            if ret == 0 and code is not None:
+                error_code = tuple(code)
+
+        gripper_position = None
+        gripper_motion_done = None
+        if self.poll_gripper:
+            if hasattr(robot, 'GetGripperCurPosition'):
+                result = robot.GetGripperCurPosition()
+                if result and result[0] == 0:
+                    gripper_position = result[-1]
+            if hasattr(robot, 'GetGripperMotionDone'):
+                ret, status = robot.GetGripperMotionDone()
+                if ret == 0 and status is not None:
+                    gripper_motion_done = bool(status[-1])
+
+        snapshot = RobotState(pose, motion_done, error_code, gripper_position,
+                              gripper_motion_done, self.clock.now(), ok)
+        self._snapshot = snapshot
+        if ok:
+            self._last_good = snapshot
+        else:
+            self.stats['failures'] += 1
+        self.stats['polls'] += 1
+        self.stats['last_poll_duration'] = self.clock.now() - t_start
+        return snapshot
+
+    def get_state(self):
+        """获取最新的状态快照
+
+        返回:
+            (RobotState, 快照年龄秒数)；尚无快照时返回(None, None)
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None, None
+        return snapshot, self.clock.now() - snapshot.timestamp
+
+    def get_pose(self, max_age=None):
+        """获取缓存的TCP位姿
+
+        参数:
+            max_age: 允许的最大快照年龄，单位秒；None表示不限制
+
+        返回:
+            (位姿列表, 年龄)；没有满足条件的有效位姿时返回(None, None)
+        """
+        snapshot = self._last_good
+        if snapshot is None:
+            return None, None
+        age = self.clock.now() - snapshot.timestamp
+        if max_age is not None and age > max_age:
+            return None, None
+        return list(snapshot.tcp_pose), age
@@ -0,0 +1,164 @@
+import inspect
+import math
+
+
+class Waypoint:
+    """轨迹中的一个路点
+
+    blend_radius小于0表示在该点停稳（阻塞），大于等于0表示以该半径平滑经过。
+    action为到达该点后执行的夹爪动作：None、"open"或"close"，有动作的路点总是停稳。
+    """
+
+    def __init__(self, pose, blend_radius=-1.0, action=None, label=""):
+        self.pose = list(pose)
+        self.blend_radius = blend_radius
+        self.action = action
+        self.label = label
+
+    def __repr__(self):
+        return f"Waypoint({self.label}, pose={self.pose}, blendR={self.blend_radius}, action={self.action})"
+
+
+class Trajectory:
+    """由路点组成的连续轨迹"""
+
+    def __init__(self, waypoints, pre_action=None):
+        """
+        参数:
+            waypoints: Waypoint列表
+            pre_action: 开始运动前发出的夹爪动作（不等待完成，与运动并行）
+        """
+        self.waypoints = waypoints
+        self.pre_action = pre_action
+
+    def __len__(self):
+        return len(self.waypoints)
+
+    def __iter__(self):
+        return iter(self.waypoints)
+
+
+def _distance(a, b):
+    return math.sqrt(sum((a[i] - b[i]) ** 2 for i in range(3)))
+
+
+class PickTrajectoryBuilder:
+    """将接近、抓取、抬起、转运、放置编译为一条平滑轨迹
+
+    与ArmController.pick逐点停稳的方式相比，中间的接近点、抬起点和转运点
+    以blendR平滑经过，只在需要夹爪动作的抓取点和放置点停稳，
+    并去掉了每段运动后固定的等待时间。
+    """
+
+    def __init__(self, approach_offset=50.0, blend_radius=20.0, min_blend_ratio=0.5):
+        """初始化轨迹构建器
+
+        参数:
+            approach_offset: 接近/抬起时相对目标点的偏移量，单位mm
+            blend_radius: 平滑过渡半径，单位mm
+            min_blend_ratio: 过渡半径不超过相邻两段中较短一段长度的比例，避免过渡区重叠
+        """
+        self.approach_offset = approach_offset
+        self.blend_radius = blend_radius
+        self.min_blend_ratio = min_blend_ratio
+
+    def _offset(self, pos, approach_dir):
+        return [pos[i] + self.approach_offset * approach_dir[i] for i in range(3)] + list(pos[3:6])
+
+    def build(self, pick_pos, place_pos, approach_dir=None, start_pos=None):
+        """构建一次摘取-放置的轨迹
+
+        参数:
+            pick_pos: 抓取位姿 [x, y, z, rx, ry, rz]
+            place_pos: 放置位姿 [x, y, z, rx, ry, rz]
+            approach_dir: 接近方向单位向量（从目标指向夹爪后退的方向），默认沿+Z
+            start_pos: 当前TCP位姿，用于限制第一个过渡半径，可为None
+
+        返回:
+            Trajectory对象
+        """
+        approach_dir = approach_dir if approach_dir is not None else (0.0, 0.0, 1.0)
+        approach_pos = self._offset(pick_pos, approach_dir)
+        place_approach_pos = self._offset(place_pos, (0.0, 0.0, 1.0))
+
+        waypoints = [
+            Waypoint(approach_pos, self.blend_radius, label="approach"),
+            Waypoint(pick_pos, -1.0, action="close", label="grasp"),
+            Waypoint(approach_pos, self.blend_radius, label="lift"),
+            Waypoint(place_approach_pos, self.blend_radius, label="transfer"),
+            Waypoint(place_pos, -1.0, action="open", label="place"),
+            Waypoint(place_approach_pos, -1.0, label="retreat"),
+        ]
+        self._clamp_blend_radii(waypoints, start_pos)
+        return Trajectory(waypoints, pre_action="open")
+
+    def _clamp_blend_radii(self, waypoints, start_pos):
+        for i, wp in enumerate(waypoints):
+            if wp.blend_radius < 0:
+                continue
+            prev_pose = waypoints[i - 1].pose if i > 0 else start_pos
+            next_pose = waypoints[i + 1].pose if i + 1 < len(waypoints) else None
+            limits = []
+            if prev_pose is not None:
+                limits.append(_distance(prev_pose, wp.pose))
+            if next_pose is not None:
+                limits.append(_distance(wp.pose, next_pose))
+            if limits:
+                wp.blend_radius = min(wp.blend_radius, self.min_blend_ratio * min(limits))
+
+
+def supports_blending(robot):
+    """判断RPC对象的MoveL是否支持blendR平滑参数"""
+    move = getattr(robot, 'MoveL', None)
+    if move is None:
+        return False
+    try:
+        params = inspect.signature(move).parameters
+    except (TypeError, ValueError):
+        return False
+    return 'blendR' in params or any(p.kind == p.VAR_KEYWORD for p in params.values())
+
+
+def measure_pick_cycle_times(pick_pos, place_pos, blend_radius=20.0, vel=20.0, acc=50.0,
+                             gripper_open_time=0.5, gripper_close_time=0.5,
+                             approach_offset=50, **sim_kwargs):
+    """在仿真机械臂上测量逐点停稳与平滑轨迹两种摘取方式的节拍
+
+    返回:
+        包含两种方式的总耗时、其中纯运动耗时（虚拟时间，单位秒）和节省比例的字典
+    """
+    from robot.arm_controller import ArmController
+    from robot.sim_robot import SimRobotRPC
+    from utils.clock import VirtualClock
+
+    results = {}
+    for mode in ("segmented", "blended"):
+        clock = VirtualClock()
+        arm = ArmController(default_vel=vel, default_acc=acc,
+                            gripper_open_time=gripper_open_time,
+                            gripper_close_time=gripper_close_time,
+                            approach_offset=approach_offset,
+                            rpc_factory=SimRobotRPC.factory(clock=clock, **sim_kwargs),
+                            clock=clock)
+        arm.connect()
+        arm.enable()
+        start = clock.now()
+        if mode == "segmented":
+            arm.pick(pick_pos, place_pos)
+        else:
+            arm.pick_blended(pick_pos, place_pos, blend_radius=blend_radius)
+        results[mode] = clock.now() - start
+        results[mode + '_motion'] = arm.robot.stats['motion_time']
+        arm.disconnect()
+
+    results['saving'] = results['segmented'] - results['blended']
+    results['saving_ratio'] = results['saving'] / results['segmented'] if results['segmented'] > 0 else 0.0
+    return results
+
+
+# 测试代码
+if __name__ == "__main__":
+    result = measure_pick_cycle_times([400, 0, 200, 0, 0, 0], [0, 400, 300, 0, 0, 0])
+    print(f"逐点停稳: {result['segmented']:.2f}s (运动 {result['segmented_motion']:.2f}s), "
+          f"平滑轨迹: {result['blended']:.2f}s (运动 {result['blended_motion']:.2f}s), "
+          f"节省 {result['saving']:.2f}s ({result['saving_ratio'] * 100:.1f}%)")
@@ -0,0 +1,68 @@
+import importlib
+import threading
+
+
+class BackendRegistry:
+    """硬件与模型后端注册表
+
+    每个后端以 "模块:属性" 字符串登记，只有在create/resolve时才导入对应模块，
+    未选中的后端（以及它依赖的SDK，如pyorbbecsdk、fairino、pyserial）不会被导入，
+    缺少SDK也不会影响其他后端的使用。
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, kind, name, target):
+        """登记后端
+
+        参数:
+            kind: 后端类别，如"camera"、"arm"、"base"、"model"
+            name: 后端名称，对应settings中的backend取值
+            target: "模块:属性"字符串，或直接给出可调用对象
+        """
+        with self._lock:
+            self._entries[(kind, name)] = target
+
+    def names(self, kind):
+        return sorted(name for k, name in self._entries if k == kind)
+
+    def resolve(self, kind, name):
+        """导入并返回后端对应的类或工厂函数"""
+        try:
+            target = self._entries[(kind, name)]
+        except KeyError:
+            raise ValueError(f"未知的{kind}后端: {name}（可选: {', '.join(self.names(kind))}）")
+        if isinstance(target, str):
+            module_name, attr = target.split(":")
+            target = getattr(importlib.import_module(module_name), attr)
+            with self._lock:
+                self._entries[(kind, name)] = target
+        return target
+
+    def create(self, kind, name, *args, **kwargs):
+        """导入后端并以给定参数构造"""
+        return self.resolve(kind, name)(*args, **kwargs)
+
+
+def _fairino_rpc_factory(**kwargs):
+    from fairino import Robot
+    return Robot.RPC
+
+
+def _sim_rpc_factory(**kwargs):
+    from robot.sim_robot import SimRobotRPC
+    return SimRobotRPC.factory(**kwargs)
+
+
+# 全局后端注册表
+backends = BackendRegistry()
+backends.register("camera", "gemini335", "camera.gemini335:Gemini335")
+backends.register("camera", "mock", "camera.mock_camera:MockCamera")
+# 机械臂后端返回传给ArmController的rpc_factory
+backends.register("arm", "fairino", _fairino_rpc_factory)
+backends.register("arm", "sim", _sim_rpc_factory)
+backends.register("base", "serial", "robot.base_driver:SerialBaseBackend")
+backends.register("base", "sim", "robot.base_driver:SimBaseBackend")
+backends.register("model", "http", "analysis.model_interface:ModelInterface")
@@ -0,0 +1,500 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DUMP_VERSION = 1
+STAGES = ('capture', 'preprocess', 'infer', 'localize', 'plan', 'act')
+DECISIONS = ('', 'pick', 'pick_batch', 'shift', 'next')
+NO_RESULT = np.iinfo(np.int32).min  # 采摘没有返回码（未执行或抛出异常）
+
+
+class FlightRecorder:
+    """飞行记录器：内存中保存最近capacity个采摘周期的紧凑记录，故障时异步写盘
+
+    每个周期（流水线中的一帧）占用环形缓冲区的一个槽位，保存降采样的彩色图和深度图、
+    检测框、决策和目标位姿、执行阶段下发的每条MoveL位姿及返回码、各阶段耗时以及采摘
+    返回码。所有数组在构造时一次分配，运行中只做原地写入。
+
+    发生异常、MoveL返回非零或手动触发（trigger）时把缓冲区按时间顺序复制一份，交给后台
+    线程压缩写入npz文件，不阻塞流水线；执行阶段进行中的触发推迟到该周期结束再写，使
+    转储包含完整的失败周期。各阶段并发写入不同槽位，转储时正在写入的槽位可能不完整。
+    """
+
+    def __init__(self, capacity=64, frame_size=(160, 100), max_detections=32, max_targets=8, max_moves=32,
+                 directory="data/flight_recorder", dump_on_failure=True, min_dump_interval=10.0, max_dumps=50,
+                 meta=None):
+        """
+        参数:
+            capacity: 保存的周期数
+            frame_size: 降采样后的图像尺寸 (宽, 高)
+            max_detections: 每个周期最多保存的检测框数
+            max_targets: 每个周期最多保存的目标数（多臂批量采摘）
+            max_moves: 每个周期最多保存的MoveL指令数
+            directory: 转储目录
+            dump_on_failure: MoveL失败时是否自动转储
+            min_dump_interval: 自动转储的最小间隔，单位秒，避免连续故障时反复写盘；手动触发不受限制
+            max_dumps: 目录中最多保留的转储文件数，超过时删除最旧的
+            meta: 写入每个转储的附加信息（如相机内参、手眼标定矩阵），需可JSON序列化
+        """
+        self.capacity = capacity
+        self.frame_size = tuple(frame_size)
+        self.directory = directory
+        self.dump_on_failure = dump_on_failure
+        self.min_dump_interval = min_dump_interval
+        self.max_dumps = max_dumps
+        self.meta = dict(meta or {})
+
+        width, height = self.frame_size
+        self.seq = np.full(capacity, -1, dtype=np.int64)
+        self.capture_time = np.zeros(capacity, dtype=np.float64)
+        self.source_shape = np.zeros((capacity, 2), dtype=np.int32)
+        self.color = np.zeros((capacity, height, width, 3), dtype=np.uint8)
+        self.depth = np.zeros((capacity, height, width), dtype=np.uint16)
+        # 检测框：x0, y0, x1, y1, 置信度, 类别编号（原图坐标）
+        self.detections = np.zeros((capacity, max_detections, 6), dtype=np.float32)
+        self.detection_count = np.zeros(capacity, dtype=np.int16)
+        self.decision = np.zeros(capacity, dtype=np.int8)
+        # 目标：抓取位姿6维 + 接近方向3维（机械臂坐标系）
+        self.targets = np.zeros((capacity, max_targets, 9), dtype=np.float64)
+        self.target_count = np.zeros(capacity, dtype=np.int16)
+        self.moves = np.zeros((capacity, max_moves, 6), dtype=np.float64)
+        self.move_ret = np.zeros((capacity, max_moves), dtype=np.int32)
+        self.move_count = np.zeros(capacity, dtype=np.int16)
+        self.stage_times = np.full((capacity, len(STAGES)), np.nan, dtype=np.float32)
+        self.result = np.full(capacity, NO_RESULT, dtype=np.int32)
+        self.error = np.zeros(capacity, dtype=np.bool_)
+
+        self._labels = {}
+        self._cursor = 0
+        self._active = None
+        self._pending = []
+        self._last_dump = -np.inf
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+        self.stats = {
+            'cycles': 0,
+            'dumps': 0,
+            'suppressed': 0,
+            'write_errors': 0,
+        }
+
+    @classmethod
+    def from_settings(cls, recorder_settings, camera_settings, meta=None):
+        width = recorder_settings.frame_width
+        height = max(int(round(width * camera_settings.color_height / camera_settings.color_width)), 1)
+        return cls(
+            capacity=recorder_settings.capacity,
+            frame_size=(width, height),
+            max_detections=recorder_settings.max_detections,
+            max_targets=recorder_settings.max_targets,
+            max_moves=recorder_settings.max_moves,
+            directory=recorder_settings.directory,
+            dump_on_failure=recorder_settings.dump_on_failure,
+            min_dump_interval=recorder_settings.min_dump_interval,
+            max_dumps=recorder_settings.max_dumps,
+            meta=meta
+        )
+
+    def apply_settings(self, new_settings):
+        """应用热更新的转储参数（SettingsWatcher订阅回调）"""
+        recorder = new_settings.recorder
+        self.dump_on_failure = recorder.dump_on_failure
+        self.min_dump_interval = recorder.min_dump_interval
+        self.max_dumps = recorder.max_dumps
+
+    # ---- 记录 ----
+
+    def begin(self, seq, color, depth=None, capture_time=None):
+        """开始记录一个周期，返回槽位编号，后续记录都以它为参数"""
+        with self._lock:
+            slot = self._cursor % self.capacity
+            self._cursor += 1
+            self.seq[slot] = seq
+            self.detection_count[slot] = 0
+            self.target_count[slot] = 0
+            self.move_count[slot] = 0
+            self.decision[slot] = 0
+            self.stage_times[slot] = np.nan
+            self.result[slot] = NO_RESULT
+            self.error[slot] = False
+        self.stats['cycles'] += 1
+        self.capture_time[slot] = capture_time if capture_time is not None else time.time()
+        self.source_shape[slot] = color.shape[:2]
+        # 线性插值比INTER_AREA快一个数量级，缩略图用于诊断，混叠可以接受
+        self.color[slot] = cv2.resize(color, self.frame_size, interpolation=cv2.INTER_LINEAR)
+        if depth is not None:
+            # 深度用最近邻降采样，避免无效的0值与有效深度混合
+            self.depth[slot] = cv2.resize(depth, self.frame_size, interpolation=cv2.INTER_NEAREST)
+        else:
+            self.depth[slot] = 0
+        return slot
+
+    def record_detections(self, slot, detections):
+        n = min(len(detections), self.detections.shape[1])
+        rows = self.detections[slot]
+        for i in range(n):
+            det = detections[i]
+            label = det.get('class')
+            code = self._labels.setdefault(label, len(self._labels))
+            rows[i, :4] = det['bbox']
+            rows[i, 4] = det.get('score', 0.0)
+            rows[i, 5] = code
+        self.detection_count[slot] = n
+
+    def record_decision(self, slot, decision, targets=()):
+        """记录决策和目标，targets为 [(pick_pos, approach_dir), ...]"""
+        self.decision[slot] = DECISIONS.index(decision) if decision in DECISIONS else 0
+        n = min(len(targets), self.targets.shape[1])
+        rows = self.targets[slot]
+        for i in range(n):
+            pick_pos, approach_dir = targets[i]
+            rows[i, :6] = pick_pos
+            rows[i, 6:] = approach_dir if approach_dir is not None else (0.0, 0.0, 1.0)
+        self.target_count[slot] = n
+
+    def record_stage_times(self, slot, times):
+        """times: {阶段名称: 耗时秒数}，即Pipeline(timing_key=...)写入数据的耗时字典"""
+        for name, seconds in times.items():
+            if name in STAGES:
+                self.stage_times[slot, STAGES.index(name)] = seconds
+
+    def activate(self, slot):
+        """执行阶段开始：之后的record_move记入该槽位"""
+        with self._lock:
+            self._active = slot
+
+    def record_move(self, pose, ret):
+        """记录一条MoveL指令及返回码（ArmController在每次MoveL后调用），返回码非零时触发转储"""
+        slot = self._active
+        if slot is not None:
+            # 多臂时各臂线程写入同一槽位
+            with self._lock:
+                k = int(self.move_count[slot])
+                if k < self.moves.shape[1]:
+                    self.moves[slot, k] = pose
+                    self.move_ret[slot, k] = ret if ret is not None else NO_RESULT
+                    self.move_count[slot] = k + 1
+        if ret != 0 and self.dump_on_failure:
+            self.trigger("movel_failed")
+
+    def end(self, slot, result=None, error=False, act_time=None):
+        """执行阶段结束，记录采摘返回码；执行期间有触发时在此写出转储"""
+        self.result[slot] = result if result is not None else NO_RESULT
+        self.error[slot] = error
+        if act_time is not None:
+            self.stage_times[slot, STAGES.index('act')] = act_time
+        # trigger可能来自其他线程（SIGUSR1转储线程、多臂的各臂线程），与_active/_pending的交接在锁内完成
+        with self._lock:
+            self._active = None
+            reasons, self._pending = self._pending, []
+        if reasons:
+            self._dump("+".join(dict.fromkeys(reasons)), manual='manual' in reasons)
+
+    # ---- 转储 ----
+
+    def trigger(self, reason="manual"):
+        """请求转储；执行阶段进行中时推迟到该周期结束"""
+        with self._lock:
+            if self._active is not None:
+                self._pending.append(reason)
+                return None
+        return self._dump(reason, manual=reason == "manual")
+
+    def _dump(self, reason, manual=False):
+        now = time.monotonic()
+        with self._lock:
+            if not manual and now - self._last_dump < self.min_dump_interval:
+                self.stats['suppressed'] += 1
+                return None
+            self._last_dump = now
+            snapshot = self.snapshot()
+        wall = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(wall))
+        path = os.path.join(self.directory, f"flight-{stamp}-{int(wall * 1000) % 1000:03d}-{reason}.npz")
+        meta = dict(self.meta, version=DUMP_VERSION, reason=reason, time=wall, stages=list(STAGES),
+                    decisions=list(DECISIONS), labels=[label for label, _ in
+                                                       sorted(self._labels.items(), key=lambda kv: kv[1])],
+                    frame_size=list(self.frame_size))
+        with self._writer_lock:
+            self._queue.put((path, meta, snapshot))
+            if self._writer is None:
+                # 写入线程常驻，只在close放入结束标记后退出，入队的转储一定会被写出
+                self._writer = threading.Thread(target=self._write_loop, name="flight-recorder", daemon=True)
+                self._writer.start()
+        logger.warning("飞行记录器转储（%s）: %s", reason, path)
+        return path
+
+    def snapshot(self):
+        """按时间从旧到新复制已记录的周期，返回 {数组名: 数组}"""
+        count = min(self._cursor, self.capacity)
+        order = (np.arange(self._cursor - count, self._cursor) % self.capacity)
+        names = ('seq', 'capture_time', 'source_shape', 'color', 'depth', 'detections', 'detection_count',
+                 'decision', 'targets', 'target_count', 'moves', 'move_ret', 'move_count', 'stage_times',
+                 'result', 'error')
+        return {name: getattr(self, name)[order] for name in names}
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            path, meta, snapshot = item
+            try:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                tmp = path + ".tmp"
+                with open(tmp, 'wb') as f:
+                    np.savez_compressed(f, meta=np.array(json.dumps(meta, ensure_ascii=False)), **snapshot)
+                os.replace(tmp, path)
+                self.stats['dumps'] += 1
+                metrics.inc("flight_recorder_dumps_total", labels={'reason': meta['reason']})
+                self._prune()
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                logger.error("写入飞行记录失败: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        if self.max_dumps <= 0:
+            return
+        dumps = sorted(f for f in os.listdir(self.directory) if f.startswith("flight-") and f.endswith(".npz"))
+        for name in dumps[:-self.max_dumps]:
+            os.remove(os.path.join(self.directory, name))
+
+    def flush(self):
+        """等待已请求的转储全部写完"""
+        self._queue.join()
+
+    def close(self):
+        """写完已请求的转储并结束写入线程；之后再有转储时会重新启动写入线程"""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                self._queue.put(None)
+        if writer is not None:
+            writer.join()
+
+
+class FlightDump:
+    """读取的飞行记录转储，可逐周期查看、导出为回放目录或作为相机回放"""
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files if name != 'meta'}
+            meta = json.loads(str(data['meta']))
+        if meta.get('version') != DUMP_VERSION:
+            raise ValueError(f"不支持的飞行记录版本: {meta.get('version')}")
+        return cls(meta, arrays)
+
+    def __len__(self):
+        return len(self.arrays['seq'])
+
+    def frame(self, i):
+        """第i个周期的帧，放大回原图尺寸（检测框和内参均对应原图）"""
+        h, w = (int(v) for v in self.arrays['source_shape'][i])
+        color = cv2.resize(self.arrays['color'][i], (w, h), interpolation=cv2.INTER_LINEAR)
+        depth = cv2.resize(self.arrays['depth'][i], (w, h), interpolation=cv2.INTER_NEAREST)
+        stamp = float(self.arrays['capture_time'][i])
+        return {'color': color, 'depth': depth, 'color_timestamp': stamp, 'depth_timestamp': stamp}
+
+    def cycle(self, i):
+        """第i个周期的记录，检测结果的格式与ModelInterface.analyze_frame相同"""
+        a, labels = self.arrays, self.meta['labels']
+        detections = []
+        for x0, y0, x1, y1, score, code in a['detections'][i, :a['detection_count'][i]].tolist():
+            detections.append({'x': (x0 + x1) / 2.0, 'y': (y0 + y1) / 2.0, 'bbox': [x0, y0, x1, y1],
+                               'score': score, 'class': labels[int(code)]})
+        targets = [(row[:6], row[6:]) for row in a['targets'][i, :a['target_count'][i]].tolist()]
+        k = int(a['move_count'][i])
+        result = int(a['result'][i])
+        return {
+            'seq': int(a['seq'][i]),
+            'capture_time': float(a['capture_time'][i]),
+            'detections': detections,
+            'decision': self.meta['decisions'][int(a['decision'][i])],
+            'targets': targets,
+            'moves': list(zip(a['moves'][i, :k].tolist(), a['move_ret'][i, :k].tolist())),
+            'stage_times': {name: float(t) for name, t in zip(self.meta['stages'], a['stage_times'][i])
+                            if not np.isnan(t)},
+            'result': None if result == NO_RESULT else result,
+            'error': bool(a['error'][i]),
+        }
+
+    def export(self, directory):
+        """导出为color_*.png、depth_*.npy、boxes_*.json，可直接用于benchmarks的--replay"""
+        os.makedirs(directory, exist_ok=True)
+        for i in range(len(self)):
+            frame = self.frame(i)
+            cv2.imwrite(os.path.join(directory, f"color_{i:04d}.png"), frame['color'])
+            np.save(os.path.join(directory, f"depth_{i:04d}.npy"), frame['depth'])
+            with open(os.path.join(directory, f"boxes_{i:04d}.json"), 'w') as f:
+                json.dump([d['bbox'] for d in self.cycle(i)['detections']], f)
+        return len(self)
+
+    def camera(self, fps=30.0, loop=False):
+        return DumpCamera(self, fps=fps, loop=loop)
+
+
+class DumpCamera:
+    """按记录顺序输出转储中的帧的相机，接口与Gemini335/MockCamera相同，可直接替换流水线的相机"""
+
+    def __init__(self, dump, fps=30.0, loop=False):
+        self.dump = dump
+        self.frame_interval = 1.0 / fps if fps else 0.0
+        self.loop = loop
+        self._index = 0
+        self._next = time.monotonic()
+
+    def initialize_camera(self):
+        return True
+
+    @property
+    def exhausted(self):
+        return not self.loop and self._index >= len(self.dump)
+
+    def capture_frame(self, align=True):
+        """返回下一帧；不循环播放且已播放完时返回None"""
+        if self.exhausted or len(self.dump) == 0:
+            return None
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+        self._next = max(now, self._next) + self.frame_interval
+        frame = self.dump.frame(self._index % len(self.dump))
+        self._index += 1
+        return frame
+
+    def get_camera_intrinsics(self):
+        intrinsics = self.dump.meta.get('intrinsics')
+        return {'color': intrinsics} if intrinsics else None
+
+    def release_camera(self):
+        return True
+
+
+def replay(dump, localizer, detector=None, on_result=None):
+    """把转储送入推理、定位、决策流水线重新计算（不驱动机械臂）
+
+    参数:
+        dump: FlightDump对象
+        localizer: TargetLocalizer对象，内参和手眼标定应与记录时一致
+        detector: 可选，带analyze_frame的检测器；None时使用记录的检测结果，只重新计算定位和决策
+        on_result: 可选，on_result(记录的周期, 重新计算的目标列表) 每个周期调用一次
+
+    返回:
+        [(记录的周期, 重新计算的目标列表)]，按记录顺序
+    """
+    from runtime.pipeline import Pipeline, Stage
+
+    camera = dump.camera(fps=0)
+    results = []
+    pipeline = Pipeline(timing_key='stage_times')
+
+    def capture():
+        index = camera._index
+        frame = camera.capture_frame()
+        if frame is None:
+            pipeline.stop()
+            return None
+        return {'cycle': dump.cycle(index), 'frame': frame}
+
+    def infer(item):
+        if detector is None:
+            item['detections'] = item['cycle']['detections']
+        else:
+            item['detections'] = detector.analyze_frame(item['frame']['color'], depth=item['frame']['depth'])
+        return item
+
+    def localize(item):
+        item['candidates'], item['arm_points'] = localizer.localize(item['frame']['depth'], item['detections'])
+        return item
+
+    def plan(item):
+        targets = []
+        for i in localizer.rank(item['arm_points']):
+            targets.append(localizer.grasp(item['frame']['depth'], item['candidates'][i], item['arm_points'][i]))
+        results.append((item['cycle'], targets))
+        if on_result is not None:
+            on_result(item['cycle'], targets)
+        return None
+
+    pipeline.add_stage(Stage("capture", capture))
+    pipeline.add_stage(Stage("infer", infer))
+    pipeline.add_stage(Stage("localize", localize))
+    pipeline.add_stage(Stage("plan", plan))
+    pipeline.run()
+    return results
+
+
+# 查看、导出和回放转储
+# 用法（在src目录下）:
+#     python -m runtime.flight_recorder show data/flight_recorder/flight-xxx.npz
+#     python -m runtime.flight_recorder export data/flight_recorder/flight-xxx.npz data/replay
+#     python -m runtime.flight_recorder replay data/flight_recorder/flight-xxx.npz [--model]
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="飞行记录转储的查看、导出和回放")
+    parser.add_argument('command', choices=('show', 'export', 'replay'))
+    parser.add_argument('dump', help="转储文件路径")
+    parser.add_argument('directory', nargs='?', help="export的输出目录")
+    parser.add_argument('--model', action='store_true', help="replay时重新调用模型服务，而不是使用记录的检测结果")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    dump = FlightDump.load(args.dump)
+    print(f"转储原因: {dump.meta['reason']}  时间: {time.ctime(dump.meta['time'])}  周期数: {len(dump)}")
+
+    if args.command == 'show':
+        for i in range(len(dump)):
+            c = dump.cycle(i)
+            times = " ".join(f"{k}={v * 1000:.0f}ms" for k, v in c['stage_times'].items())
+            failed = [ret for _, ret in c['moves'] if ret != 0]
+            print(f"#{c['seq']:6d} 检测{len(c['detections']):3d} 决策{c['decision'] or '-':10s} "
+                  f"目标{len(c['targets'])} MoveL{len(c['moves']):3d}（失败{len(failed)}） "
+                  f"结果{c['result']}{' 异常' if c['error'] else ''}  {times}")
+    elif args.command == 'export':
+        if not args.directory:
+            parser.error("export需要输出目录")
+        print(f"已导出{dump.export(args.directory)}帧到 {args.directory}")
+    else:
+        from config.settings import settings
+        from planning.targets import TargetLocalizer
+
+        localizer = TargetLocalizer(dump.meta.get('intrinsics') or settings.camera.color_intrinsics,
+                                    dump.meta.get('camera_to_arm') or settings.robot.camera_to_arm_transform)
+        detector = None
+        if args.model:
+            from runtime.startup import open_model
+            detector = open_model(settings)
+
+        def report(cycle, targets):
+            recorded = [t[0][:3] for t in cycle['targets']]
+            replayed = [list(t[0][:3]) for t in targets]
+            offset = ""
+            if recorded and replayed:
+                offset = f"  首个目标偏差{np.linalg.norm(np.subtract(recorded[0], replayed[0])):.1f}mm"
+            print(f"#{cycle['seq']:6d} 记录目标{len(recorded)} 回放目标{len(replayed)}{offset}")
+
+        replay(dump, localizer, detector=detector, on_result=report)
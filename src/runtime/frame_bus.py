@@ -0,0 +1,351 @@
+import json
+import logging
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MODE_LATEST = "latest"
+MODE_LOSSLESS = "lossless"
+
+_LAYOUT_BYTES = 256  # 共享内存开头的JSON布局描述，订阅方据此解析其余部分
+_ALIGN = 64
+# 全局头：[最新已发布序号]；槽位头：[写入开始序号, 写入完成序号, 彩色时间戳, 深度时间戳]，
+# 槽位头的同一块内存分别以int64（序号列）和float64（时间戳列）视图访问
+_SLOT_HEADER = 4
+
+
+def _aligned(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class FrameBus:
+    """基于multiprocessing.shared_memory的帧总线
+
+    相机进程把capture_frame的输出写入共享内存中的环形槽位，其他进程（模型客户端、显示、
+    录制、跟踪等）按名称连接后直接读取槽位中的数组，不再为每个消费者pickle整帧图像。
+
+    单写多读，写入不等待任何读者：每个槽位带有写入开始/完成两个序号（顺序锁），写入前先
+    更新开始序号，写完再更新完成序号和全局最新序号。读者据此判断数据是否完整、读取期间
+    是否已被覆盖。序号从1开始，0表示尚未发布任何帧。
+    """
+
+    def __init__(self, shm, layout, owner):
+        self._shm = shm
+        self.layout = layout
+        self.owner = owner
+        self.name = shm.name
+        self.slots = layout['slots']
+        self.color_shape = tuple(layout['color_shape'])
+        self.depth_shape = tuple(layout['depth_shape'])
+        self.color_dtype = np.dtype(layout['color_dtype'])
+        self.depth_dtype = np.dtype(layout['depth_dtype'])
+
+        buf = shm.buf
+        offset = _LAYOUT_BYTES
+        self._latest = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += _ALIGN
+        self._headers = np.ndarray((self.slots, _SLOT_HEADER), dtype=np.float64, buffer=buf, offset=offset)
+        self._seqs = np.ndarray((self.slots, _SLOT_HEADER), dtype=np.int64, buffer=buf, offset=offset)
+        offset += _aligned(self._headers.nbytes)
+        color_bytes = _aligned(int(np.prod(self.color_shape)) * self.color_dtype.itemsize)
+        depth_bytes = _aligned(int(np.prod(self.depth_shape)) * self.depth_dtype.itemsize)
+        self._color = []
+        self._depth = []
+        for _ in range(self.slots):
+            self._color.append(np.ndarray(self.color_shape, dtype=self.color_dtype, buffer=buf, offset=offset))
+            offset += color_bytes
+            self._depth.append(np.ndarray(self.depth_shape, dtype=self.depth_dtype, buffer=buf, offset=offset))
+            offset += depth_bytes
+
+        self.stats = {
+            'published': 0,
+            'shape_mismatch': 0,
+        }
+
+    @staticmethod
+    def _size(layout):
+        color_bytes = _aligned(int(np.prod(layout['color_shape'])) * np.dtype(layout['color_dtype']).itemsize)
+        depth_bytes = _aligned(int(np.prod(layout['depth_shape'])) * np.dtype(layout['depth_dtype']).itemsize)
+        headers = _aligned(layout['slots'] * _SLOT_HEADER * 8)
+        return _LAYOUT_BYTES + _ALIGN + headers + layout['slots'] * (color_bytes + depth_bytes)
+
+    @classmethod
+    def create(cls, color_shape=(480, 640, 3), depth_shape=(480, 640), slots=4, name=None,
+               color_dtype=np.uint8, depth_dtype=np.uint16):
+        """创建帧总线（发布方调用）
+
+        参数:
+            color_shape: 彩色图shape
+            depth_shape: 深度图shape
+            slots: 环形槽位数量，无损订阅者最多可以落后slots-1帧
+            name: 共享内存名称，None表示自动生成；订阅方通过bus.name连接
+            color_dtype: 彩色图数据类型
+            depth_dtype: 深度图数据类型
+        """
+        if slots < 2:
+            raise ValueError("帧总线至少需要2个槽位")
+        layout = {
+            'slots': int(slots),
+            'color_shape': [int(n) for n in color_shape],
+            'depth_shape': [int(n) for n in depth_shape],
+            'color_dtype': np.dtype(color_dtype).str,
+            'depth_dtype': np.dtype(depth_dtype).str,
+        }
+        encoded = json.dumps(layout).encode()
+        if len(encoded) >= _LAYOUT_BYTES:
+            raise ValueError("帧总线布局描述过长")
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls._size(layout))
+        shm.buf[:_LAYOUT_BYTES] = bytes(_LAYOUT_BYTES)
+        shm.buf[:len(encoded)] = encoded
+        bus = cls(shm, layout, owner=True)
+        bus._latest[0] = 0
+        bus._seqs[:] = 0
+        logger.info("创建帧总线%s: %d个槽位, 共%.1fMB", shm.name, slots, shm.size / 1e6)
+        return bus
+
+    @classmethod
+    def attach(cls, name):
+        """按名称连接已创建的帧总线（订阅方调用）
+
+        订阅方不把共享内存登记到本进程的resource_tracker：Python 3.12及以前连接已有的共享内存
+        也会登记，与发布方无关的订阅进程退出时其resource_tracker会把共享内存unlink，
+        总线随之消失。共享内存只由发布方删除。
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python 3.13以前没有track参数，连接后立即取消登记
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        raw = bytes(shm.buf[:_LAYOUT_BYTES]).rstrip(b"\0")
+        return cls(shm, json.loads(raw), owner=False)
+
+    @property
+    def latest_seq(self):
+        """最新已完整发布的帧序号，0表示尚未发布"""
+        return int(self._latest[0])
+
+    def publish(self, frame):
+        """把capture_frame的输出写入下一个槽位，从不等待读者
+
+        参数:
+            frame: {'color', 'depth', 'color_timestamp', 'depth_timestamp'}字典
+
+        返回:
+            帧序号；shape与总线不一致时返回None
+        """
+        color, depth = frame['color'], frame['depth']
+        if color.shape != self.color_shape or depth.shape != self.depth_shape:
+            self.stats['shape_mismatch'] += 1
+            logger.warning("帧尺寸%s/%s与帧总线%s/%s不一致，丢弃", color.shape, depth.shape,
+                           self.color_shape, self.depth_shape)
+            return None
+        seq = self.latest_seq + 1
+        index = seq % self.slots
+        # 先标记槽位正在写入，持有该槽旧帧视图的读者由此得知数据已失效
+        self._seqs[index, 0] = seq
+        np.copyto(self._color[index], color, casting='unsafe')
+        np.copyto(self._depth[index], depth, casting='unsafe')
+        self._headers[index, 2] = frame.get('color_timestamp', 0.0)
+        self._headers[index, 3] = frame.get('depth_timestamp', 0.0)
+        self._seqs[index, 1] = seq
+        self._latest[0] = seq
+        self.stats['published'] += 1
+        return seq
+
+    def close(self):
+        """断开共享内存；发布方同时删除共享内存"""
+        # 先释放指向共享内存的数组视图，否则SharedMemory.close会因缓冲区仍被引用而失败
+        self._color = self._depth = []
+        self._latest = self._headers = self._seqs = None
+        self._shm.close()
+        if self.owner:
+            # 与发布方共用resource_tracker的订阅者（spawn/fork子进程）取消登记时也移除了发布方的登记，
+            # 删除前重新登记（重复登记无副作用），避免unlink取消登记时resource_tracker报错
+            if getattr(self._shm, '_track', True):
+                resource_tracker.register(self._shm._name, "shared_memory")
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class FrameView:
+    """帧总线中的一帧
+
+    zero-copy读取时color、depth是共享内存中的数组视图，发布方绕环一圈后会覆盖它们；
+    使用完数据后调用valid()确认期间未被覆盖，需要长期保存时调用copy()。
+    """
+
+    __slots__ = ('seq', 'color', 'depth', 'color_timestamp', 'depth_timestamp', '_bus', '_index')
+
+    def __init__(self, bus, index, seq, color, depth, color_timestamp, depth_timestamp):
+        self._bus = bus
+        self._index = index
+        self.seq = seq
+        self.color = color
+        self.depth = depth
+        self.color_timestamp = color_timestamp
+        self.depth_timestamp = depth_timestamp
+
+    def valid(self):
+        """数据是否仍是本帧（发布方尚未开始覆盖该槽位）"""
+        if self._bus is None:
+            return True
+        return int(self._bus._seqs[self._index, 0]) == self.seq
+
+    def copy(self):
+        """复制为不再引用共享内存的FrameView"""
+        return FrameView(None, self._index, self.seq, self.color.copy(), self.depth.copy(),
+                         self.color_timestamp, self.depth_timestamp)
+
+    def as_dict(self):
+        """转换为capture_frame格式的字典，附带seq"""
+        return {
+            'color': self.color,
+            'depth': self.depth,
+            'color_timestamp': self.color_timestamp,
+            'depth_timestamp': self.depth_timestamp,
+            'seq': self.seq,
+        }
+
+
+class FrameSubscriber:
+    """帧总线订阅者
+
+    "latest"模式每次读取最新一帧，中间的帧直接跳过；"lossless"模式按序号逐帧读取，
+    落后超过环形缓冲容量时丢失的帧计入overruns并从仍可读的最旧一帧继续。两种模式都
+    不会阻塞发布方，lag为当前落后的帧数。
+    """
+
+    def __init__(self, bus, mode=MODE_LATEST, name="subscriber", poll_interval=0.001):
+        """
+        参数:
+            bus: FrameBus对象，或帧总线名称（自动连接）
+            mode: "latest"或"lossless"
+            name: 订阅者名称，用于日志和指标标签
+            poll_interval: 等待新帧时的轮询间隔，单位秒
+        """
+        if mode not in (MODE_LATEST, MODE_LOSSLESS):
+            raise ValueError(f"未知的订阅模式: {mode}")
+        self._owns_bus = isinstance(bus, str)
+        self.bus = FrameBus.attach(bus) if self._owns_bus else bus
+        self.mode = mode
+        self.name = name
+        self.poll_interval = poll_interval
+        # 无损订阅从连接时的最新帧之后开始，不回放连接前的帧
+        self.last_seq = self.bus.latest_seq
+
+        self.stats = {
+            'frames': 0,
+            'skipped': 0,
+            'overruns': 0,
+            'torn': 0,
+        }
+        metrics.add_collector(self._collect_metrics)
+
+    @property
+    def lag(self):
+        """已发布但尚未读取的帧数"""
+        return max(self.bus.latest_seq - self.last_seq, 0)
+
+    def _collect_metrics(self):
+        labels = {'subscriber': self.name, 'mode': self.mode}
+        return [
+            ("frame_bus_lag_frames", "gauge", self.lag, labels),
+            ("frame_bus_skipped_total", "counter", self.stats['skipped'], labels),
+            ("frame_bus_overruns_total", "counter", self.stats['overruns'], labels),
+        ]
+
+    def _next_seq(self, latest):
+        if self.mode == MODE_LATEST:
+            self.stats['skipped'] += latest - self.last_seq - 1
+            return latest
+        seq = self.last_seq + 1
+        # 发布方可能正在写入latest+1所在的槽位，即环中最旧的一个，因此最旧可读帧为latest-slots+2
+        oldest = latest - self.bus.slots + 2
+        if seq < oldest:
+            lost = oldest - seq
+            self.stats['overruns'] += lost
+            logger.warning("订阅者%s落后%d帧，丢失%d帧", self.name, latest - self.last_seq, lost)
+            seq = oldest
+        return seq
+
+    def read(self, timeout=None, copy=False):
+        """读取下一帧
+
+        参数:
+            timeout: 等待新帧的最长时间，单位秒，None表示一直等待，0表示不等待
+            copy: 是否复制数据；False时返回共享内存视图（zero-copy），用完后可用valid()确认
+
+        返回:
+            FrameView，超时返回None
+        """
+        bus = self.bus
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            latest = bus.latest_seq
+            if latest > self.last_seq:
+                seq = self._next_seq(latest)
+                index = seq % bus.slots
+                if int(bus._seqs[index, 1]) == seq:
+                    view = FrameView(bus, index, seq, bus._color[index], bus._depth[index],
+                                     float(bus._headers[index, 2]), float(bus._headers[index, 3]))
+                    if copy:
+                        view = view.copy()
+                    # 读取（或复制）完成后槽位仍是本帧，数据才是完整一致的
+                    if int(bus._seqs[index, 0]) == seq:
+                        self.last_seq = seq
+                        self.stats['frames'] += 1
+                        return view
+                # 槽位已被发布方覆盖，重新按最新序号定位
+                self.stats['torn'] += 1
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def capture_frame(self, timeout=1.0):
+        """与相机接口一致的读取方法，返回复制后的capture_frame格式字典，超时返回None
+
+        订阅者可以直接替代相机对象传给CrawlHarvester、StopAndGoHarvest等现有消费者。
+        """
+        view = self.read(timeout=timeout, copy=True)
+        return view.as_dict() if view is not None else None
+
+    def close(self):
+        metrics.remove_collector(self._collect_metrics)
+        if self._owns_bus:
+            self.bus.close()
+
+
+def publish_camera(camera, bus, stop_event=None, max_frames=None):
+    """相机进程的发布循环：不断调用capture_frame并写入帧总线
+
+    参数:
+        camera: 已初始化的相机对象
+        bus: FrameBus对象（发布方）
+        stop_event: 可选，threading.Event或multiprocessing.Event，置位后退出
+        max_frames: 可选，发布该数量的帧后退出
+
+    返回:
+        发布的帧数
+    """
+    published = 0
+    while (stop_event is None or not stop_event.is_set()) and (max_frames is None or published < max_frames):
+        frame = camera.capture_frame()
+        if frame and bus.publish(frame) is not None:
+            published += 1
+    return published
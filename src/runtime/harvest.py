@@ -0,0 +1,368 @@
+import logging
+import threading
+import time
+import cv2
+
+from analysis.model_interface import ModelInterface
+from runtime.pipeline import Pipeline, Stage, POLICY_BLOCK, POLICY_DROP_OLDEST
+from planning.coverage import apply_action
+from utils.helpers import arm_to_odom
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def preprocess_for_model(item, model_interface):
+    """预处理阶段（模型输入），模块级函数以便在进程中运行"""
+    item['model_input'] = model_interface.preprocess_frame(item['frame']['color'])
+    return item
+
+
+def preprocess_for_tracker(item):
+    """预处理阶段（跟踪模式）：转换光流使用的灰度图"""
+    item['gray'] = cv2.cvtColor(item['frame']['color'], cv2.COLOR_BGR2GRAY)
+    return item
+
+
+class StopAndGoHarvest:
+    """走走停停采摘的流水线实现
+
+    采集、预处理、推理、定位、决策、执行六个阶段并发运行，替代串行主循环。
+    执行阶段每次移动底盘或完成一次采摘都会使"场景版本"加一，之前采集的帧在定位
+    和执行阶段被丢弃，避免对已变化的场景重复决策；执行动作期间采集阶段暂停。
+    """
+
+    def __init__(self, camera, model_interface, localizer, arm_controller, base_controller, plan,
+                 place_pos, detector=None, fruit_map=None, arm_mount=(0.0, 0.0, 0.0),
+                 use_blending=True, max_picks_per_stop=20, fruit_archive_distance=2.0, recorder=None):
+        """
+        参数:
+            camera: 相机对象（Gemini335或MockCamera）
+            model_interface: ModelInterface对象
+            localizer: TargetLocalizer对象
+            arm_controller: ArmController或MultiArmOrchestrator对象，可为None；多臂时一次把当前帧中
+                            各臂可达的目标全部交给编排器并行采摘
+            base_controller: BaseController对象
+            plan: CoveragePlan对象
+            place_pos: 放置位姿
+            detector: 可选，TrackedDetector或GatedDetector对象；指定时推理阶段调用它的analyze_frame
+            fruit_map: 可选，FruitMap对象
+            arm_mount: 机械臂基座在车体坐标系中的位姿 (x mm, y mm, yaw °)
+            use_blending: 是否使用平滑连续轨迹采摘
+            max_picks_per_stop: 单个停车点最多采摘次数
+            fruit_archive_distance: 果实落后底盘超过该距离（单位米）后移出地图内存
+            recorder: 可选，FlightRecorder对象，记录每帧的检测、决策、MoveL指令和各阶段耗时
+        """
+        self.camera = camera
+        self.model_interface = model_interface
+        self.localizer = localizer
+        self.arm = arm_controller
+        self.base = base_controller
+        self.place_pos = place_pos
+        self.detector = detector
+        self.fruit_map = fruit_map
+        self.arm_mount = arm_mount
+        self.use_blending = use_blending
+        self.max_picks_per_stop = max_picks_per_stop
+        self.fruit_archive_distance = fruit_archive_distance
+        self.recorder = recorder
+
+        self._actions = iter(plan.actions)
+        self._plan_offset = 0.0
+        self._picks_at_stop = 0
+        self._epoch = 0
+        self._detector_epoch = None
+        self._acting = threading.Event()
+        self._seq = 0
+        self.pipeline = None
+
+        self.stats = {
+            'stale_frames': 0,
+            'picks': 0,
+            'failures': 0,
+            'stops': 0,
+        }
+
+    def build(self, capture_queue=1, infer_queue=1, queue_size=2, preprocess_executor="thread",
+              infer_workers=1):
+        """构建流水线
+
+        参数:
+            capture_queue: 预处理阶段输入队列容量（丢弃最旧帧）
+            infer_queue: 推理阶段输入队列容量（丢弃最旧帧）
+            queue_size: 其余阶段的输入队列容量（阻塞）
+            preprocess_executor: 预处理阶段运行在"thread"还是"process"
+            infer_workers: 推理并发数（跟踪模式下固定为1，保证帧顺序）
+
+        返回:
+            Pipeline对象
+        """
+        # 记录飞行数据时由流水线把各阶段耗时写入item['stage_times']
+        pipeline = Pipeline(timing_key='stage_times' if self.recorder is not None else None)
+        pipeline.add_stage(Stage("capture", self.capture))
+        if self.detector is not None:
+            pipeline.add_stage(Stage("preprocess", preprocess_for_tracker, executor=preprocess_executor,
+                                     queue_size=capture_queue, policy=POLICY_DROP_OLDEST))
+            pipeline.add_stage(Stage("infer", self.infer, queue_size=infer_queue, policy=POLICY_DROP_OLDEST))
+        else:
+            pipeline.add_stage(Stage("preprocess", preprocess_for_model, executor=preprocess_executor,
+                                     queue_size=capture_queue, policy=POLICY_DROP_OLDEST,
+                                     setup=ModelInterface))
+            pipeline.add_stage(Stage("infer", self.infer, workers=infer_workers, queue_size=infer_queue,
+                                     policy=POLICY_DROP_OLDEST))
+        pipeline.add_stage(Stage("localize", self.localize, queue_size=queue_size, policy=POLICY_BLOCK))
+        pipeline.add_stage(Stage("plan", self.plan, queue_size=queue_size, policy=POLICY_BLOCK))
+        pipeline.add_stage(Stage("act", self.act, queue_size=queue_size, policy=POLICY_BLOCK))
+        self.pipeline = pipeline
+        return pipeline
+
+    def apply_settings(self, new_settings):
+        """应用热更新的采摘参数（SettingsWatcher订阅回调），下一次采摘起生效"""
+        self.use_blending = new_settings.robot.arm_use_blending
+        self.max_picks_per_stop = new_settings.robot.coverage_max_picks_per_stop
+
+    def run(self, **kwargs):
+        """移动到第一个停车点后运行流水线，直到覆盖规划执行完毕"""
+        if not self._next_stop():
+            logger.warning("覆盖规划中没有停车点")
+            return
+        pipeline = self.build(**kwargs)
+        pipeline.run()
+        logger.info("覆盖规划执行完毕")
+
+    def _stale(self, item):
+        if item['epoch'] != self._epoch:
+            self.stats['stale_frames'] += 1
+            metrics.inc("frame_drops_total", labels={'reason': 'stale'})
+            return True
+        return False
+
+    # ---- 阶段函数 ----
+
+    def capture(self):
+        if self._acting.is_set():
+            time.sleep(0.01)
+            return None
+        epoch = self._epoch
+        frame = self.camera.capture_frame()
+        if not frame:
+            logger.warning("未获取到有效帧，跳过本次循环")
+            metrics.inc("frame_drops_total", labels={'reason': 'capture'})
+            time.sleep(0.1)
+            return None
+        if self._acting.is_set() or epoch != self._epoch:
+            return None
+        self._seq += 1
+        metrics.inc("frames_total")
+        item = {'seq': self._seq, 'epoch': epoch, 'frame': frame, 'capture_time': time.time()}
+        if self.recorder is not None:
+            item['rec'] = self.recorder.begin(self._seq, frame['color'], frame['depth'], item['capture_time'])
+        return item
+
+    def infer(self, item):
+        try:
+            if self.detector is not None:
+                if item['epoch'] != self._detector_epoch:
+                    # 场景版本变化（采摘或移动后）时重置跟踪，不再返回已采摘果实的轨迹
+                    self._detector_epoch = item['epoch']
+                    reset = getattr(self.detector, 'reset', None)
+                    if reset is not None:
+                        reset()
+                item['detections'] = self.detector.analyze_frame(item['frame']['color'], gray=item.get('gray'),
+                                                                 depth=item['frame']['depth'])
+            else:
+                item['detections'] = self.model_interface.detect(item.pop('model_input'),
+                                                                 item['frame']['color'].shape)
+        except Exception as e:
+            logger.error("模型分析失败: %s", e)
+            item['detections'] = []
+            if self.recorder is not None:
+                self.recorder.trigger("exception")
+        if self.recorder is not None:
+            self.recorder.record_detections(item['rec'], item['detections'])
+        return item
+
+    def localize(self, item):
+        if self._stale(item):
+            return None
+        candidates, arm_points = [], []
+        if item['detections']:
+            # 将检测框中心反投影并变换到机械臂基坐标系（单位mm）
+            candidates, arm_points = self.localizer.localize(item['frame']['depth'], item['detections'])
+        fruits = None
+        if self.fruit_map is not None and len(arm_points) > 0:
+            # 采集时底盘静止，当前里程计位姿即帧时刻位姿
+            base_pose = self.base.get_pose()
+            fruits = self.fruit_map.observe_batch(
+                arm_to_odom(arm_points, base_pose, self.arm_mount),
+                labels=[d.get('class') for d in candidates],
+                scores=[d.get('score', 0.0) for d in candidates],
+                timestamp=item['capture_time']
+            )
+            self.fruit_map.archive_behind(base_pose, self.fruit_archive_distance)
+            keep = [i for i, f in enumerate(fruits) if self.fruit_map.is_pickable(f)]
+            candidates = [candidates[i] for i in keep]
+            fruits = [fruits[i] for i in keep]
+            arm_points = arm_points[keep]
+        item['candidates'], item['arm_points'], item['fruits'] = candidates, arm_points, fruits
+        return item
+
+    def plan(self, item):
+        item['decision'] = ('next',)
+        arm_points = item['arm_points']
+        if len(arm_points) == 0:
+            return item
+        if hasattr(self.arm, 'pick_batch'):
+            order = self.arm.reachable_any(arm_points)
+            if len(order) > 0:
+                targets = []
+                for target in order[:self.max_picks_per_stop - self._picks_at_stop]:
+                    pick_pos, approach_dir = self.localizer.grasp(item['frame']['depth'], item['candidates'][target],
+                                                                  arm_points[target])
+                    targets.append({'pick_pos': pick_pos, 'approach_dir': approach_dir,
+                                    'fruit': item['fruits'][target] if item['fruits'] is not None else None})
+                item['decision'] = ('pick_batch', targets)
+                return item
+        else:
+            order = self.localizer.rank(arm_points)
+        if len(order) > 0:
+            target = order[0]
+            # 根据目标局部点云估计接近方向和6自由度抓取位姿
+            pick_pos, approach_dir = self.localizer.grasp(item['frame']['depth'], item['candidates'][target],
+                                                          arm_points[target])
+            fruit = item['fruits'][target] if item['fruits'] is not None else None
+            item['decision'] = ('pick', pick_pos, approach_dir, fruit)
+            return item
+        # 假设机械臂x轴与底盘前进方向一致
+        advice = self.localizer.suggest_base_shift(arm_points, axis=0)
+        if advice and advice['should_move']:
+            logger.info("目标均不可达，底盘移动%.0fmm后可达%s个目标", advice['shift'], advice['reachable_after'])
+            item['decision'] = ('shift', advice['shift'] / 1000.0)
+        else:
+            logger.info("检测到的目标均不在机械臂可达范围内")
+        return item
+
+    def act(self, item):
+        if self._stale(item):
+            return None
+        decision = item['decision']
+        rec = item.get('rec') if self.recorder is not None else None
+        if rec is not None:
+            if decision[0] == 'pick':
+                targets = [decision[1:3]]
+            elif decision[0] == 'pick_batch':
+                targets = [(t['pick_pos'], t['approach_dir']) for t in decision[1]]
+            else:
+                targets = []
+            self.recorder.record_stage_times(rec, item.get('stage_times', {}))
+            self.recorder.record_decision(rec, decision[0], targets)
+            self.recorder.activate(rec)
+        start = time.monotonic()
+        result = None
+        self._acting.set()
+        try:
+            if decision[0] == 'pick':
+                result = self._pick(*decision[1:])
+                self._picks_at_stop += 1
+                if self.arm is None or self._picks_at_stop >= self.max_picks_per_stop:
+                    self._advance()
+            elif decision[0] == 'pick_batch':
+                result = self._pick_batch(decision[1])
+                self._picks_at_stop += len(decision[1])
+                if self._picks_at_stop >= self.max_picks_per_stop:
+                    self._advance()
+            elif decision[0] == 'shift':
+                shift = decision[1]
+                moved = self.base.move_forward(shift) if shift > 0 else self.base.move_backward(-shift)
+                if moved is None:
+                    # 底盘移动超时，已停车；位置未知，不再继续执行规划
+                    logger.error("可达性调整移动未完成，停止作业")
+                    if self.pipeline is not None:
+                        self.pipeline.stop()
+                else:
+                    self._plan_offset += shift
+            else:
+                # 当前停车点没有可采目标，前往下一个停车点
+                self._advance()
+        finally:
+            # 场景已改变，丢弃此前采集的帧
+            self._epoch += 1
+            self._acting.clear()
+            if rec is not None:
+                picking = decision[0] in ('pick', 'pick_batch')
+                self.recorder.end(rec, result, error=picking and result is None,
+                                  act_time=time.monotonic() - start)
+        return None
+
+    # ---- 执行 ----
+
+    def _pick(self, pick_pos, approach_dir, fruit):
+        if self.arm is None:
+            logger.error("机械臂未初始化，无法执行采摘操作")
+            return None
+        ret = None
+        if fruit is not None:
+            self.fruit_map.mark_attempted(fruit.fruit_id)
+            if fruit.attempts > 1:
+                metrics.inc("pick_retries_total")
+        try:
+            # pick/pick_blended从接近点开始，不先直线移动到目标中心
+            pick_method = self.arm.pick_blended if self.use_blending else self.arm.pick
+            ret = pick_method(pick_pos=pick_pos, place_pos=self.place_pos, approach_dir=approach_dir)
+            # 重置机械臂到初始位置
+            self.arm.calibrate()
+        except Exception as e:
+            logger.error("机械臂操作失败: %s", e)
+            if self.recorder is not None:
+                self.recorder.trigger("exception")
+        if fruit is not None:
+            self.fruit_map.mark_result(fruit.fruit_id, ret == 0)
+        if ret == 0:
+            self.stats['picks'] += 1
+            metrics.inc("picks_total")
+        else:
+            self.stats['failures'] += 1
+            metrics.inc("pick_failures_total")
+        return ret
+
+    def _pick_batch(self, targets):
+        """多臂并行采摘一批目标，果实地图和统计按目标逐个更新；返回第一个非零返回码（未执行为None），全部成功返回0"""
+        for target in targets:
+            fruit = target['fruit']
+            if fruit is not None:
+                self.fruit_map.mark_attempted(fruit.fruit_id)
+                if fruit.attempts > 1:
+                    metrics.inc("pick_retries_total")
+        rets = []
+        for i, _, ret in self.arm.pick_batch(targets, use_blending=self.use_blending):
+            rets.append(ret)
+            fruit = targets[i]['fruit']
+            if fruit is not None:
+                self.fruit_map.mark_result(fruit.fruit_id, ret == 0)
+            if ret == 0:
+                self.stats['picks'] += 1
+                metrics.inc("picks_total")
+            else:
+                self.stats['failures'] += 1
+                metrics.inc("pick_failures_total")
+        return next((ret for ret in rets if ret != 0), 0)
+
+    def _advance(self):
+        self._picks_at_stop = 0
+        if not self._next_stop() and self.pipeline is not None:
+            self.pipeline.stop()
+
+    def _next_stop(self):
+        """执行规划动作直到下一个停车点，规划执行完毕时返回False"""
+        for action in self._actions:
+            if action['type'] == 'stop':
+                self.stats['stops'] += 1
+                return True
+            if action['type'] == 'move' and self._plan_offset:
+                # 扣除可达性调整已经走过的距离
+                action = dict(action, distance=action['distance'] - self._plan_offset)
+                self._plan_offset = 0.0
+            if not apply_action(self.base, action):
+                logger.error("底盘动作未完成，停止作业: %s", action)
+                return False
+        return False
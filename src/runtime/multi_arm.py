@@ -0,0 +1,364 @@
+import logging
+import threading
+
+import numpy as np
+
+from utils.clock import RealClock
+from utils.helpers import arm_to_body, body_to_arm
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _segment_distance(p1, q1, p2, q2):
+    """三维线段p1q1与p2q2之间的最短距离"""
+    d1, d2, r = q1 - p1, q2 - p2, p1 - p2
+    a, e, f = d1 @ d1, d2 @ d2, d2 @ r
+    if a <= 1e-9 and e <= 1e-9:
+        return float(np.linalg.norm(r))
+    if a <= 1e-9:
+        s, t = 0.0, np.clip(f / e, 0.0, 1.0)
+    else:
+        c = d1 @ r
+        if e <= 1e-9:
+            s, t = np.clip(-c / a, 0.0, 1.0), 0.0
+        else:
+            b = d1 @ d2
+            denom = a * e - b * b
+            s = np.clip((b * f - c * e) / denom, 0.0, 1.0) if denom > 1e-9 else 0.0
+            t = (b * s + f) / e
+            if t < 0.0:
+                s, t = np.clip(-c / a, 0.0, 1.0), 0.0
+            elif t > 1.0:
+                s, t = np.clip((b - c) / a, 0.0, 1.0), 1.0
+    return float(np.linalg.norm((p1 + d1 * s) - (p2 + d2 * t)))
+
+
+class ArmUnit:
+    """多臂平台上的一台机械臂：控制器、在车体上的安装位姿以及各自的可达工作空间"""
+
+    def __init__(self, name, controller, mount=(0.0, 0.0, 0.0), reachability_map=None, reach_radius=850.0,
+                 place_pos=None):
+        """
+        参数:
+            name: 机械臂名称，用于日志、统计和指标标签
+            controller: ArmController对象（实际或仿真后端）
+            mount: 机械臂基座在车体坐标系中的位姿 (x mm, y mm, yaw °)
+            reachability_map: 可选，ReachabilityMap对象（该臂自身基坐标系）
+            reach_radius: 没有可达性地图时以基座为球心的可达半径，单位mm
+            place_pos: 该臂的放置位姿（自身基坐标系），单位mm, °
+        """
+        self.name = name
+        self.controller = controller
+        self.mount = tuple(mount)
+        self.reachability_map = reachability_map
+        self.reach_radius = reach_radius
+        self.place_pos = place_pos
+        self.base_point = np.array([self.mount[0], self.mount[1], 0.0])
+        self.place_point = (arm_to_body([place_pos[:3]], self.mount)[0] if place_pos is not None
+                            else self.base_point)
+
+    def reachable(self, body_points):
+        """返回 (reachable布尔数组, 评分数组)，评分越高越容易到达"""
+        points = body_to_arm(body_points, self.mount)
+        if self.reachability_map is not None:
+            return self.reachability_map.query(points)
+        distance = np.linalg.norm(points, axis=1)
+        return distance <= self.reach_radius, np.clip(1.0 - distance / self.reach_radius, 0.0, 1.0)
+
+
+class MultiArmOrchestrator:
+    """多臂采摘调度
+
+    共享同一条感知流水线：检测结果（参考臂坐标系）统一变换到车体坐标系，按各臂的可达
+    工作空间和预计负载分配给各臂，各臂在独立线程中并行采摘。每次采摘前为"基座→目标→
+    放置点"的运动路径申请预留区，与其他臂正在执行的预留区距离小于clearance时换一个目标
+    或等待，避免两臂在重叠的工作空间内相撞。某臂的队列空了以后会接手其他臂队列中自己
+    也能到达的目标，使负载保持均衡。
+    """
+
+    def __init__(self, arms, reference_mount=(0.0, 0.0, 0.0), clearance=150.0, cycle_time=7.5, clock=None):
+        """
+        参数:
+            arms: ArmUnit列表
+            reference_mount: 检测结果所在的参考臂坐标系在车体上的位姿（即camera_to_arm_transform
+                             标定时的机械臂，settings.robot.arm_mount_pose）
+            clearance: 不同臂运动路径之间的最小距离，单位mm
+            cycle_time: 单次采摘耗时的初始估计，单位秒，之后按实际耗时更新
+            clock: 时钟对象，用于统计耗时，默认真实时钟
+        """
+        if not arms:
+            raise ValueError("至少需要一台机械臂")
+        self.arms = list(arms)
+        self.reference_mount = tuple(reference_mount)
+        self.clearance = clearance
+        self.clock = clock if clock is not None else RealClock()
+        self._cond = threading.Condition()
+        self._zones = {}
+        self._cycle = {unit.name: cycle_time for unit in self.arms}
+        self._started = None
+        self.stats = {unit.name: {'assigned': 0, 'stolen': 0, 'picks': 0, 'failures': 0,
+                                  'busy_time': 0.0, 'blocked_time': 0.0} for unit in self.arms}
+        self.stats['unreachable'] = 0
+        metrics.add_collector(self._collect_metrics)
+
+    # ---- 与ArmController相同的管理接口，便于main和StopAndGoHarvest统一处理 ----
+
+    def enable(self):
+        for unit in self.arms:
+            unit.controller.enable()
+
+    def disable(self):
+        for unit in self.arms:
+            unit.controller.disable()
+
+    def disconnect(self):
+        metrics.remove_collector(self._collect_metrics)
+        for unit in self.arms:
+            unit.controller.disconnect()
+
+    def apply_settings(self, new_settings):
+        for unit in self.arms:
+            unit.controller.apply_settings(new_settings)
+
+    # ---- 坐标变换 ----
+
+    def _to_body(self, target):
+        pick_pos = target['pick_pos']
+        return arm_to_body([pick_pos[:3]], self.reference_mount)[0]
+
+    def _for_arm(self, unit, target, body_point):
+        """把参考臂坐标系中的抓取位姿换算到unit自身的基坐标系"""
+        dyaw = self.reference_mount[2] - unit.mount[2]
+        position = body_to_arm([body_point], unit.mount)[0]
+        pick_pos = [float(c) for c in position] + list(target['pick_pos'][3:5]) + [target['pick_pos'][5] + dyaw]
+        approach_dir = target.get('approach_dir')
+        if approach_dir is not None:
+            c, s = np.cos(np.radians(dyaw)), np.sin(np.radians(dyaw))
+            approach_dir = [c * approach_dir[0] - s * approach_dir[1], s * approach_dir[0] + c * approach_dir[1],
+                            approach_dir[2]]
+        return pick_pos, approach_dir
+
+    def reachable_any(self, points):
+        """参考臂坐标系中的目标点至少能被一台臂到达的下标，按最高评分从高到低排序"""
+        if len(points) == 0:
+            return np.empty(0, dtype=np.int64)
+        body = arm_to_body(points, self.reference_mount)
+        best = np.full(len(body), -1.0)
+        for unit in self.arms:
+            reachable, score = unit.reachable(body)
+            best = np.where(reachable, np.maximum(best, score), best)
+        candidates = np.flatnonzero(best >= 0.0)
+        return candidates[np.argsort(-best[candidates], kind='stable')]
+
+    # ---- 分配 ----
+
+    def assign(self, targets):
+        """把目标分配给各臂
+
+        只有一台臂能到达的目标先分配，其余目标依次分给"已分配负载+本次耗时"最小的臂，
+        负载相同时选评分高（更容易到达）的臂。
+
+        参数:
+            targets: 目标列表，每项为 {'pick_pos': 参考臂坐标系抓取位姿, 'approach_dir', 'fruit'}
+
+        返回:
+            ({臂名称: [目标下标, ...]}, 无法到达的目标下标列表)
+        """
+        queues = {unit.name: [] for unit in self.arms}
+        if not targets:
+            return queues, []
+        body = np.array([self._to_body(t) for t in targets])
+        reach, score = self._reach(body)
+        return self._assign(reach, score, queues)
+
+    def _reach(self, body):
+        """各臂对车体坐标系目标点的 (可达矩阵, 评分矩阵)，形状均为 (臂数, 目标数)"""
+        results = [unit.reachable(body) for unit in self.arms]
+        return np.array([r[0] for r in results]), np.array([r[1] for r in results])
+
+    def _assign(self, reach, score, queues):
+        load = np.zeros(len(self.arms))
+        cycle = np.array([self._cycle[unit.name] for unit in self.arms])
+        count = reach.sum(axis=0)
+        unreachable = [int(i) for i in np.flatnonzero(count == 0)]
+        order = sorted(np.flatnonzero(count > 0), key=lambda i: count[i])
+        for i in order:
+            options = np.flatnonzero(reach[:, i])
+            k = min(options, key=lambda a: (load[a] + cycle[a], -score[a, i]))
+            load[k] += cycle[k]
+            queues[self.arms[k].name].append(int(i))
+        return queues, unreachable
+
+    # ---- 执行 ----
+
+    def _zone(self, unit, body_point):
+        """运动路径预留区：基座→目标、目标→放置点两段线段"""
+        return ((unit.base_point, body_point), (body_point, unit.place_point))
+
+    def _conflicts(self, unit, zone):
+        for name, other in self._zones.items():
+            if name == unit.name:
+                continue
+            for p1, q1 in zone:
+                for p2, q2 in other:
+                    if _segment_distance(p1, q1, p2, q2) < self.clearance:
+                        return True
+        return False
+
+    def _next_job(self, unit, queues, body, reach):
+        """取unit下一个不与其他臂冲突的目标；返回目标下标、"wait"（有目标但暂时冲突）或None（没有目标）"""
+        index = self.arms.index(unit)
+        waiting = False
+        own = queues[unit.name]
+        for pos, i in enumerate(own):
+            if self._conflicts(unit, self._zone(unit, body[i])):
+                waiting = True
+                continue
+            return own.pop(pos)
+        # 自己的队列已空或全部冲突：从其他臂队列末尾接手自己能到达的目标
+        for other in self.arms:
+            if other is unit:
+                continue
+            theirs = queues[other.name]
+            for pos in range(len(theirs) - 1, -1, -1):
+                i = theirs[pos]
+                if not reach[index, i]:
+                    continue
+                if self._conflicts(unit, self._zone(unit, body[i])):
+                    waiting = True
+                    continue
+                self.stats[unit.name]['stolen'] += 1
+                return theirs.pop(pos)
+        return "wait" if waiting else None
+
+    def _pick(self, unit, target, body_point, use_blending):
+        controller = unit.controller
+        pick_pos, approach_dir = self._for_arm(unit, target, body_point)
+        try:
+            pick_method = controller.pick_blended if use_blending else controller.pick
+            ret = pick_method(pick_pos=pick_pos, place_pos=unit.place_pos, approach_dir=approach_dir)
+            controller.calibrate()
+            return ret
+        except Exception as e:
+            logger.error("机械臂%s操作失败: %s", unit.name, e)
+            return None
+
+    def _worker(self, unit, targets, queues, body, reach, results, use_blending):
+        stats = self.stats[unit.name]
+        while True:
+            with self._cond:
+                blocked_since = None
+                while True:
+                    job = self._next_job(unit, queues, body, reach)
+                    if job != "wait":
+                        break
+                    if blocked_since is None:
+                        blocked_since = self.clock.now()
+                    self._cond.wait(0.05)
+                if blocked_since is not None:
+                    stats['blocked_time'] += self.clock.now() - blocked_since
+                if job is None:
+                    return
+                self._zones[unit.name] = self._zone(unit, body[job])
+
+            start = self.clock.now()
+            ret = self._pick(unit, targets[job], body[job], use_blending)
+            duration = self.clock.now() - start
+
+            with self._cond:
+                del self._zones[unit.name]
+                stats['busy_time'] += duration
+                stats['picks' if ret == 0 else 'failures'] += 1
+                # 单次采摘耗时的指数滑动平均，用于下一次分配
+                self._cycle[unit.name] = 0.8 * self._cycle[unit.name] + 0.2 * duration
+                results.append((job, unit.name, ret))
+                self._cond.notify_all()
+            metrics.inc("arm_picks_total" if ret == 0 else "arm_pick_failures_total", labels={'arm': unit.name})
+
+    def pick_batch(self, targets, use_blending=True):
+        """各臂并行采摘一批目标，全部完成后返回
+
+        参数:
+            targets: 目标列表，格式见assign
+            use_blending: 是否使用平滑连续轨迹采摘
+
+        返回:
+            [(目标下标, 臂名称或None, 返回码)]，按完成顺序排列；无法到达的目标臂名称为None、返回码为None
+        """
+        if self._started is None:
+            self._started = self.clock.now()
+        if not targets:
+            return []
+        body = np.array([self._to_body(t) for t in targets])
+        reach, score = self._reach(body)
+        queues, unreachable = self._assign(reach, score, {unit.name: [] for unit in self.arms})
+        self.stats['unreachable'] += len(unreachable)
+        results = [(i, None, None) for i in unreachable]
+        if len(unreachable) == len(targets):
+            return results
+        for name, queue in queues.items():
+            self.stats[name]['assigned'] += len(queue)
+
+        threads = []
+        for unit in self.arms:
+            thread = threading.Thread(target=self._worker, name=f"arm-{unit.name}",
+                                      args=(unit, targets, queues, body, reach, results, use_blending), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return results
+
+    # ---- 统计 ----
+
+    def report(self):
+        """各臂的利用率（采摘耗时占运行时间的比例）、每小时采摘数和预留区等待时间"""
+        elapsed = self.clock.now() - self._started if self._started is not None else 0.0
+        arms = {}
+        for unit in self.arms:
+            s = self.stats[unit.name]
+            arms[unit.name] = dict(s, utilization=s['busy_time'] / elapsed if elapsed > 0 else 0.0,
+                                   picks_per_hour=s['picks'] / elapsed * 3600.0 if elapsed > 0 else 0.0)
+        total = sum(a['picks'] for a in arms.values())
+        return {'elapsed': elapsed, 'arms': arms, 'unreachable': self.stats['unreachable'],
+                'picks_per_hour': total / elapsed * 3600.0 if elapsed > 0 else 0.0}
+
+    def _collect_metrics(self):
+        samples = []
+        elapsed = self.clock.now() - self._started if self._started is not None else 0.0
+        for unit in self.arms:
+            s = self.stats[unit.name]
+            labels = {'arm': unit.name}
+            samples.append(("arm_busy_seconds_total", "counter", s['busy_time'], labels))
+            samples.append(("arm_blocked_seconds_total", "counter", s['blocked_time'], labels))
+            samples.append(("arm_utilization", "gauge", s['busy_time'] / elapsed if elapsed > 0 else 0.0, labels))
+        return samples
+
+
+# 测试代码：两台仿真机械臂并排安装，随机目标
+if __name__ == "__main__":
+    from robot.arm_controller import ArmController
+    from robot.sim_robot import SimRobotRPC
+    from utils.clock import VirtualClock
+
+    logging.basicConfig(level=logging.WARNING)
+    clock = VirtualClock(speedup=50.0)
+    units = []
+    for name, mount in (("left", (0.0, 0.0, 0.0)), ("right", (1000.0, 0.0, 0.0))):
+        controller = ArmController(ip=name, rpc_factory=SimRobotRPC.factory(clock=clock), clock=clock)
+        controller.connect()
+        controller.enable()
+        units.append(ArmUnit(name, controller, mount=mount, place_pos=[0.0, -400.0, 300.0, 0.0, 0.0, 0.0]))
+    orchestrator = MultiArmOrchestrator(units, clearance=150.0, clock=clock)
+
+    rng = np.random.default_rng(0)
+    targets = [{'pick_pos': [float(rng.uniform(-300, 1300)), float(rng.uniform(300, 600)), 200.0, 0.0, 0.0, 0.0],
+                'approach_dir': None} for _ in range(16)]
+    results = orchestrator.pick_batch(targets)
+    print(f"完成{len(results)}个目标")
+    report = orchestrator.report()
+    for name, arm in report['arms'].items():
+        print(f"{name}: 采摘{arm['picks']}个（接手{arm['stolen']}个）, 利用率{arm['utilization'] * 100:.0f}%, "
+              f"{arm['picks_per_hour']:.0f}个/小时, 等待预留区{arm['blocked_time']:.1f}s")
+    orchestrator.disconnect()
@@ -0,0 +1,412 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+from utils.metrics import metrics
+from utils.profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+# 队列满时的处理策略
+POLICY_BLOCK = "block"  # 阻塞生产者，直到下游腾出空间（不丢帧）
+POLICY_DROP_OLDEST = "drop_oldest"  # 丢弃队列中最旧的数据，保证下游总是拿到最新数据
+POLICY_DROP_NEWEST = "drop_newest"  # 丢弃新数据
+
+QUEUE_POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_DROP_NEWEST)
+
+# 停止标记，沿流水线向下游传播；使用可pickle的常量以便跨进程传递
+STOP = "__pipeline_stop__"
+
+_POLL_INTERVAL = 0.05  # 阻塞操作检查停止标志的间隔，单位秒
+
+
+def _is_stop(item):
+    return isinstance(item, str) and item == STOP
+
+
+class Channel:
+    """连接两个阶段的有界队列
+
+    线程阶段之间使用queue.Queue；任一端为进程阶段时使用multiprocessing.Queue。
+    队列满时按policy处理，停止标记永远不会被丢弃。
+    """
+
+    def __init__(self, maxsize=2, policy=POLICY_BLOCK, ctx=None):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"不支持的队列策略: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self._queue = ctx.Queue(maxsize) if ctx is not None else queue.Queue(maxsize)
+        self._drops = ctx.Value('l', 0) if ctx is not None else multiprocessing.Value('l', 0)
+
+    @property
+    def drops(self):
+        return self._drops.value
+
+    def qsize(self):
+        try:
+            return self._queue.qsize()
+        except NotImplementedError:
+            return -1
+
+    def _count_drop(self):
+        with self._drops.get_lock():
+            self._drops.value += 1
+
+    def put(self, item, stop_event=None):
+        """按策略放入数据；阻塞策略下stop_event被设置时放弃并返回False"""
+        if _is_stop(item):
+            return self._put_stop(item)
+        if self.policy == POLICY_BLOCK:
+            while True:
+                try:
+                    self._queue.put(item, timeout=_POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    if stop_event is not None and stop_event.is_set():
+                        self._count_drop()
+                        return False
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        if self.policy == POLICY_DROP_NEWEST:
+            self._count_drop()
+            return False
+        # drop_oldest：取出最旧的一条再放入；与其他生产者竞争失败时丢弃新数据
+        try:
+            old = self._queue.get_nowait()
+            if _is_stop(old):
+                self._queue.put(old)
+                return False
+            self._count_drop()
+        except queue.Empty:
+            pass
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self._count_drop()
+            return False
+
+    def _put_stop(self, item):
+        while True:
+            try:
+                self._queue.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                # 为停止标记腾出空间
+                try:
+                    old = self._queue.get_nowait()
+                    if not _is_stop(old):
+                        self._count_drop()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """取出数据，超时抛出queue.Empty"""
+        return self._queue.get(timeout=timeout)
+
+    def close(self):
+        if hasattr(self._queue, 'close'):
+            self._queue.close()
+            self._queue.join_thread()
+
+
+class _StageCounters:
+    """阶段统计计数，使用共享内存以便进程工作者也能更新"""
+
+    def __init__(self, ctx):
+        self.processed = ctx.Value('l', 0)
+        self.filtered = ctx.Value('l', 0)
+        self.errors = ctx.Value('l', 0)
+        self.busy_time = ctx.Value('d', 0.0)
+        self.finished = ctx.Value('l', 0)  # 已收到停止标记的工作者数量
+
+    def add(self, counter, value=1):
+        with counter.get_lock():
+            counter.value += value
+
+
+def _run_worker(name, fn, inbox, outbox, counters, workers, stop_event, setup, teardown, histogram=None,
+                timing_key=None):
+    """阶段工作者主循环，线程和进程共用；histogram不为None时记录每条数据的处理耗时，
+    timing_key不为None时把耗时写入输出字典的result[timing_key][阶段名称]"""
+    context = setup() if setup is not None else None
+    try:
+        while True:
+            try:
+                item = inbox.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if _is_stop(item):
+                with counters.finished.get_lock():
+                    counters.finished.value += 1
+                    last = counters.finished.value >= workers
+                if last:
+                    if outbox is not None:
+                        outbox.put(STOP)
+                else:
+                    # 让同一阶段的其他工作者也收到停止标记
+                    inbox.put(STOP)
+                return
+            # 进程工作者中profiler.session始终为None，只分析线程阶段
+            session = profiler.session
+            if session is not None:
+                session.enter(name)
+            t_start = time.monotonic()
+            try:
+                result = fn(item, context) if setup is not None else fn(item)
+            except Exception as e:
+                counters.add(counters.errors)
+                logger.error("流水线阶段 %s 处理失败: %s", name, e)
+                continue
+            finally:
+                elapsed = time.monotonic() - t_start
+                if session is not None:
+                    session.exit(name)
+                counters.add(counters.busy_time, elapsed)
+                if histogram is not None:
+                    histogram.record(elapsed)
+            counters.add(counters.processed)
+            if timing_key is not None and isinstance(result, dict):
+                result.setdefault(timing_key, {})[name] = elapsed
+            if result is None:
+                counters.add(counters.filtered)
+            elif outbox is not None:
+                outbox.put(result, stop_event)
+    finally:
+        if teardown is not None:
+            teardown(context)
+
+
+def _run_source(name, fn, outbox, counters, stop_event, setup, teardown, histogram=None, timing_key=None):
+    """源阶段主循环：反复调用fn()产生数据，直到stop_event被设置"""
+    context = setup() if setup is not None else None
+    try:
+        while not stop_event.is_set():
+            session = profiler.session
+            if session is not None:
+                session.enter(name)
+            t_start = time.monotonic()
+            try:
+                result = fn(context) if setup is not None else fn()
+            except Exception as e:
+                counters.add(counters.errors)
+                logger.error("流水线阶段 %s 处理失败: %s", name, e)
+                continue
+            finally:
+                elapsed = time.monotonic() - t_start
+                if session is not None:
+                    session.exit(name)
+                counters.add(counters.busy_time, elapsed)
+                if histogram is not None:
+                    histogram.record(elapsed)
+            counters.add(counters.processed)
+            if timing_key is not None and isinstance(result, dict):
+                result.setdefault(timing_key, {})[name] = elapsed
+            if result is None:
+                counters.add(counters.filtered)
+            else:
+                outbox.put(result, stop_event)
+    finally:
+        outbox.put(STOP)
+        if teardown is not None:
+            teardown(context)
+
+
+class Stage:
+    """流水线阶段
+
+    fn对每条输入数据调用一次，返回值放入下游队列，返回None表示丢弃该数据。
+    源阶段（流水线第一个阶段）的fn不带参数，被反复调用以产生数据。
+    指定setup时，setup()在工作者线程/进程内调用一次，返回值作为fn的第二个参数
+    （源阶段为唯一参数），退出时传给teardown，用于在工作者内部创建和释放资源。
+    进程阶段的fn、setup、teardown必须可以pickle（模块级函数）。
+    """
+
+    def __init__(self, name, fn, workers=1, executor="thread", queue_size=2, policy=POLICY_BLOCK,
+                 setup=None, teardown=None):
+        """
+        参数:
+            name: 阶段名称
+            fn: 处理函数
+            workers: 工作者数量；多个工作者时输出顺序不保证与输入一致
+            executor: "thread"或"process"
+            queue_size: 本阶段输入队列容量
+            policy: 本阶段输入队列满时的策略，见QUEUE_POLICIES
+            setup: 可选，工作者启动时调用
+            teardown: 可选，工作者退出时调用
+        """
+        if executor not in ("thread", "process"):
+            raise ValueError(f"不支持的执行方式: {executor}")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.executor = executor
+        self.queue_size = queue_size
+        self.policy = policy
+        self.setup = setup
+        self.teardown = teardown
+        self.inbox = None
+        self.counters = None
+        self._handles = []
+
+    @property
+    def stats(self):
+        c = self.counters
+        stats = {
+            'processed': c.processed.value,
+            'filtered': c.filtered.value,
+            'errors': c.errors.value,
+            'busy_time': c.busy_time.value,
+        }
+        if self.inbox is not None:
+            stats['dropped'] = self.inbox.drops
+            stats['queued'] = self.inbox.qsize()
+        return stats
+
+
+class Pipeline:
+    """多阶段并发流水线
+
+    各阶段在独立的线程或进程中运行，相邻阶段之间用有界队列连接，总吞吐量由最慢的
+    阶段决定，而不是各阶段延迟之和。stop()后源阶段停止产生数据，停止标记沿流水线
+    向下游传播，每个阶段处理完已入队的数据（阻塞策略）后退出并调用teardown释放资源。
+    """
+
+    def __init__(self, start_method="spawn", timing_key=None):
+        """
+        参数:
+            start_method: 进程阶段使用的multiprocessing启动方式
+            timing_key: 可选，数据为字典时把各阶段处理耗时记入data[timing_key]，
+                        下游阶段可以据此得到单条数据在每个阶段的耗时（含进程阶段）
+        """
+        self.stages = []
+        self.timing_key = timing_key
+        self._ctx = multiprocessing.get_context(start_method)
+        self._thread_stop = threading.Event()
+        self._process_stop = None
+        self._started = False
+
+    def add_stage(self, stage):
+        if self._started:
+            raise RuntimeError("流水线已启动，不能再添加阶段")
+        self.stages.append(stage)
+        return stage
+
+    def add(self, name, fn, **kwargs):
+        """便捷方法：创建Stage并添加，参数同Stage"""
+        return self.add_stage(Stage(name, fn, **kwargs))
+
+    @property
+    def running(self):
+        return self._started and any(h.is_alive() for s in self.stages for h in s._handles)
+
+    def start(self):
+        if self._started:
+            return
+        if not self.stages:
+            raise RuntimeError("流水线没有任何阶段")
+        uses_process = any(s.executor == "process" for s in self.stages)
+        if uses_process:
+            self._process_stop = self._ctx.Event()
+
+        for i, stage in enumerate(self.stages):
+            stage.counters = _StageCounters(self._ctx if stage.executor == "process" else multiprocessing)
+            if i > 0:
+                prev = self.stages[i - 1]
+                cross = stage.executor == "process" or prev.executor == "process"
+                stage.inbox = Channel(stage.queue_size, stage.policy, self._ctx if cross else None)
+
+        for i, stage in enumerate(self.stages):
+            outbox = self.stages[i + 1].inbox if i + 1 < len(self.stages) else None
+            process = stage.executor == "process"
+            stop_event = self._process_stop if process else self._thread_stop
+            # 进程工作者无法写入主进程的指标注册表，其耗时只计入busy_time
+            histogram = None
+            if not process and metrics.enabled:
+                histogram = metrics.histogram("pipeline_stage_seconds", "流水线各阶段单条数据处理耗时",
+                                              labels={'stage': stage.name})
+            if i == 0:
+                target = _run_source
+                args = (stage.name, stage.fn, outbox, stage.counters, stop_event, stage.setup, stage.teardown,
+                        histogram, self.timing_key)
+                count = 1
+            else:
+                target = _run_worker
+                args = (stage.name, stage.fn, stage.inbox, outbox, stage.counters, stage.workers,
+                        stop_event, stage.setup, stage.teardown, histogram, self.timing_key)
+                count = stage.workers
+            for k in range(count):
+                worker_name = f"pipeline-{stage.name}-{k}"
+                if process:
+                    handle = self._ctx.Process(target=target, args=args, name=worker_name, daemon=True)
+                else:
+                    handle = threading.Thread(target=target, args=args, name=worker_name, daemon=True)
+                handle.start()
+                stage._handles.append(handle)
+        metrics.add_collector(self._collect_metrics)
+        self._started = True
+
+    def _collect_metrics(self):
+        samples = []
+        for stage in self.stages:
+            stats = stage.stats
+            labels = {'stage': stage.name}
+            samples.append(("pipeline_items_total", "counter", stats['processed'], labels))
+            samples.append(("pipeline_errors_total", "counter", stats['errors'], labels))
+            if 'dropped' in stats:
+                samples.append(("pipeline_dropped_total", "counter", stats['dropped'], labels))
+                samples.append(("pipeline_queue_depth", "gauge", stats['queued'], labels))
+        return samples
+
+    def stop(self):
+        """请求停止：源阶段停止产生数据，已在队列中的数据继续处理"""
+        self._thread_stop.set()
+        if self._process_stop is not None:
+            self._process_stop.set()
+
+    def join(self, timeout=None):
+        """等待所有阶段退出，超时返回False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for stage in self.stages:
+            for handle in stage._handles:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                handle.join(remaining)
+                if handle.is_alive():
+                    return False
+        return True
+
+    def shutdown(self, timeout=5.0):
+        """停止流水线并等待退出；超时仍未退出的进程会被强制终止"""
+        self.stop()
+        clean = self.join(timeout)
+        if not clean:
+            for stage in self.stages:
+                for handle in stage._handles:
+                    if isinstance(handle, multiprocessing.process.BaseProcess) and handle.is_alive():
+                        handle.terminate()
+            logger.warning("流水线未能在超时时间内正常退出")
+        for stage in self.stages:
+            if stage.inbox is not None and clean:
+                stage.inbox.close()
+        metrics.remove_collector(self._collect_metrics)
+        return clean
+
+    def run(self):
+        """启动并阻塞到流水线结束（源阶段停止或KeyboardInterrupt）"""
+        self.start()
+        try:
+            while not self.join(0.2):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def stats(self):
+        return {stage.name: stage.stats for stage in self.stages}
@@ -0,0 +1,340 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from runtime.backends import backends
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """启动耗时报告
+
+    记录每个启动阶段的起止时间和所在线程，并行初始化时可以看出关键路径
+    （最晚结束的阶段）以及并行带来的节省。
+    """
+
+    def __init__(self, origin=None):
+        """
+        参数:
+            origin: 计时起点（time.perf_counter()的值），默认为创建报告的时刻
+        """
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.phases = []
+        self._lock = threading.Lock()
+
+    def record(self, name, start, end, ok=True, detail=""):
+        with self._lock:
+            self.phases.append({'name': name, 'start': start - self.origin, 'end': end - self.origin,
+                                'duration': end - start, 'thread': threading.current_thread().name,
+                                'ok': ok, 'detail': detail})
+
+    def phase(self, name):
+        """计时上下文：with report.phase("camera"): ...，异常时记为失败并继续抛出"""
+        return _Phase(self, name)
+
+    @property
+    def total(self):
+        return max((p['end'] for p in self.phases), default=0.0)
+
+    @property
+    def serial_total(self):
+        """各阶段耗时之和，即串行执行时的预计启动时间"""
+        return sum(p['duration'] for p in self.phases)
+
+    def summary(self):
+        lines = [f"启动耗时 {self.total:.2f}s（各阶段串行合计 {self.serial_total:.2f}s）"]
+        for p in sorted(self.phases, key=lambda p: p['start']):
+            status = "" if p['ok'] else f"  失败: {p['detail']}"
+            lines.append(f"  {p['name']:14s} {p['start']:6.2f}s → {p['end']:6.2f}s  {p['duration']:6.2f}s  "
+                         f"[{p['thread']}]{status}")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {'total': self.total, 'serial_total': self.serial_total, 'phases': list(self.phases)}
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+class _Phase:
+    __slots__ = ('_report', '_name', '_start')
+
+    def __init__(self, report, name):
+        self._report = report
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._report.record(self._name, self._start, time.perf_counter(), ok=exc_type is None,
+                            detail=str(exc) if exc is not None else "")
+        return False
+
+
+# ---- 各后端的打开函数，返回初始化好的对象 ----
+
+def open_camera(settings):
+    """按settings.camera.backend创建并初始化相机，失败时退回fallback_backend"""
+    camera_kwargs = dict(
+        color_width=settings.camera.color_width,
+        color_height=settings.camera.color_height,
+        depth_width=settings.camera.depth_width,
+        depth_height=settings.camera.depth_height
+    )
+    try:
+        kwargs = dict(camera_kwargs)
+        if settings.camera.backend == "gemini335":
+            kwargs.update(color_fps=settings.camera.color_fps, depth_fps=settings.camera.depth_fps)
+        camera = backends.create("camera", settings.camera.backend, **kwargs)
+        camera.initialize_camera()
+        logger.info("使用%s相机", settings.camera.backend)
+        return camera
+    except Exception as e:
+        fallback = settings.camera.fallback_backend
+        if not fallback or fallback == settings.camera.backend:
+            raise
+        logger.warning("%s相机初始化失败: %s", settings.camera.backend, e)
+        logger.warning("切换到%s相机", fallback)
+        camera = backends.create("camera", fallback, **camera_kwargs)
+        camera.initialize_camera()
+        return camera
+
+
+def _connect_arm(settings, ip, **kwargs):
+    from robot.arm_controller import ArmController
+
+    arm_controller = ArmController(
+        ip=ip,
+        default_vel=settings.robot.arm_default_velocity,
+        default_acc=settings.robot.arm_default_acceleration,
+        gripper_open_time=settings.robot.arm_gripper_open_time,
+        gripper_close_time=settings.robot.arm_gripper_close_time,
+        approach_offset=settings.robot.arm_approach_offset,
+        blend_radius=settings.robot.arm_blend_radius
+    )
+    arm_controller.rpc_factory = backends.create("arm", settings.robot.arm_backend, **kwargs)
+    arm_controller.connect()
+    arm_controller.enable()
+    if settings.robot.arm_state_poll_rate > 0:
+        arm_controller.start_state_monitor(settings.robot.arm_state_poll_rate)
+    return arm_controller
+
+
+def open_arm(settings, reachability=None):
+    """按settings.robot.arm_backend连接机械臂，失败时返回None
+
+    settings.robot.arms非空时连接其中的每台机械臂，返回MultiArmOrchestrator；部分机械臂
+    连接失败时用其余机械臂继续作业。
+
+    参数:
+        reachability: 可选，无参数调用返回可达性地图（如warm_start中已加载的结果），只在多臂时
+                      调用；默认自行加载
+    """
+    kwargs = {}
+    if settings.robot.arm_backend == "sim":
+        kwargs = dict(rpc_latency=settings.robot.arm_sim_rpc_latency,
+                      failure_rate=settings.robot.arm_sim_failure_rate)
+    if not settings.robot.arms:
+        try:
+            arm_controller = _connect_arm(settings, settings.robot.arm_ip, **kwargs)
+            logger.info("机械臂初始化成功（%s后端）", settings.robot.arm_backend)
+            return arm_controller
+        except Exception as e:
+            logger.error("机械臂初始化失败: %s", e)
+            return None
+
+    from runtime.multi_arm import ArmUnit, MultiArmOrchestrator
+
+    # 各臂型号相同，可达性地图在各自的基坐标系中，共用一份
+    reachability_map = reachability() if reachability is not None else load_reachability_map(settings)
+    units = []
+    for arm in settings.robot.arms:
+        try:
+            arm_controller = _connect_arm(settings, arm.get('ip', settings.robot.arm_ip), **kwargs)
+        except Exception as e:
+            logger.error("机械臂%s初始化失败: %s", arm['name'], e)
+            continue
+        units.append(ArmUnit(
+            arm['name'], arm_controller,
+            mount=arm.get('mount', settings.robot.arm_mount_pose),
+            reachability_map=reachability_map,
+            reach_radius=settings.robot.multi_arm_reach_radius,
+            place_pos=arm.get('place_position', settings.robot.arm_place_position)
+        ))
+    if not units:
+        return None
+    logger.info("%d台机械臂初始化成功（%s后端）: %s", len(units), settings.robot.arm_backend,
+                ", ".join(unit.name for unit in units))
+    return MultiArmOrchestrator(
+        units,
+        reference_mount=settings.robot.arm_mount_pose,
+        clearance=settings.robot.multi_arm_clearance,
+        cycle_time=settings.robot.arm_pick_cycle_time
+    )
+
+
+def open_base(settings):
+    """按settings.robot.base_backend创建底盘驱动，返回 (BaseDriver, BaseController)"""
+    from robot.base_controller import BaseController
+    from robot.base_driver import BaseDriver
+
+    if settings.robot.base_backend == "serial":
+        base_backend = backends.create(
+            "base", "serial",
+            port=settings.robot.base_serial_port,
+            baudrate=settings.robot.base_serial_baudrate,
+            ticks_per_rev=settings.robot.base_encoder_ticks_per_rev
+        )
+    else:
+        base_backend = backends.create("base", settings.robot.base_backend)
+    base_driver = BaseDriver(
+        base_backend,
+        wheel_radius=settings.robot.base_wheel_radius,
+        wheel_separation=settings.robot.base_wheel_separation,
+        rate_hz=settings.robot.base_control_rate,
+        max_speed=settings.robot.base_speed,
+        max_acc=settings.robot.base_max_acceleration
+    )
+    base_controller = BaseController(
+        wheel_radius=settings.robot.base_wheel_radius,
+        wheel_separation=settings.robot.base_wheel_separation,
+        base_speed=settings.robot.base_speed,
+        driver=base_driver,
+        move_timeout_margin=settings.robot.base_move_timeout_margin
+    )
+    logger.info("基础车辆初始化成功")
+    return base_driver, base_controller
+
+
+def open_model(settings):
+    """创建模型接口并预热（导入HTTP依赖，可选发送一帧空白图像）"""
+    model_interface = backends.create("model", settings.model.backend, settings.model)
+    if not model_interface.warm_up(send_request=settings.model.warmup_request):
+        logger.warning("模型服务预热请求失败，首帧推理可能较慢")
+    return model_interface
+
+
+def load_reachability_map(settings):
+    from robot.reachability import ReachabilityMap
+
+    try:
+        reachability_map = ReachabilityMap.load(
+            settings.robot.arm_reachability_map,
+            min_score=settings.robot.arm_min_manipulability
+        )
+        logger.info("可达性地图加载成功")
+        return reachability_map
+    except FileNotFoundError:
+        logger.warning("未找到可达性地图，不进行可达性过滤（可运行 python -m robot.reachability 生成）")
+        return None
+
+
+def load_fruit_map(settings):
+    """每次运行创建新的果实地图，上次运行保存的地图移入归档文件
+
+    底盘里程计每次启动从原点开始，上次的坐标与本次不对应，直接加载会让旧果实覆盖在新果实上。
+    """
+    if not settings.robot.fruit_map_enabled:
+        return None
+    from planning.fruit_map import FruitMap, archive_saved_map
+
+    try:
+        archived = archive_saved_map(settings.robot.fruit_map_path, settings.robot.fruit_map_archive_path)
+        if archived:
+            logger.info("上次运行的果实地图（%s个果实）已移入归档", archived)
+    except (OSError, ValueError) as e:
+        logger.error("归档上次运行的果实地图失败: %s", e)
+    return FruitMap(
+        merge_radius=settings.robot.fruit_merge_radius,
+        max_attempts=settings.robot.fruit_max_attempts,
+        archive_path=settings.robot.fruit_map_archive_path
+    )
+
+
+STARTUP_TASKS = (
+    ('camera', open_camera),
+    ('reachability', load_reachability_map),
+    ('arm', open_arm),
+    ('base', open_base),
+    ('model', open_model),
+    ('fruit_map', load_fruit_map),
+)
+
+
+def release(results):
+    """关闭warm_start已创建的资源（结果字典中缺少的任务跳过），用于启动失败时的清理"""
+    camera = results.get('camera')
+    if camera is not None:
+        try:
+            camera.release_camera()
+        except Exception as e:
+            logger.error("释放相机失败: %s", e)
+    arm_controller = results.get('arm')
+    if arm_controller is not None:
+        try:
+            arm_controller.disable()
+            arm_controller.disconnect()
+        except Exception as e:
+            logger.error("释放机械臂资源失败: %s", e)
+    base = results.get('base')
+    if base is not None:
+        try:
+            base[1].shutdown()
+        except Exception as e:
+            logger.error("关闭底盘失败: %s", e)
+
+
+def warm_start(settings, report=None, parallel=True):
+    """初始化全部设备和模型
+
+    parallel为True时各任务在独立线程中同时进行（相机枚举、机械臂连接、模型预热和地图加载
+    大多在等待I/O或在C扩展中释放GIL），总启动时间接近最慢的一项而不是各项之和。
+
+    参数:
+        settings: Settings对象
+        report: 可选，StartupReport对象，用于记录各阶段耗时
+        parallel: 是否并行初始化
+
+    返回:
+        字典 {任务名: 结果}；任务抛出异常时先关闭其余任务已创建的资源（已连接的机械臂、
+        已启动的底盘等），再重新抛出第一个异常
+    """
+    report = report if report is not None else StartupReport()
+
+    def run(name, fn, *args):
+        with report.phase(name):
+            return fn(settings, *args)
+
+    results = {}
+    error = None
+    if parallel:
+        with ThreadPoolExecutor(max_workers=len(STARTUP_TASKS), thread_name_prefix="startup") as executor:
+            futures = {}
+            for name, fn in STARTUP_TASKS:
+                # 多臂时机械臂任务等待并复用可达性地图任务的结果，不重复加载
+                args = (futures['reachability'].result,) if name == 'arm' else ()
+                futures[name] = executor.submit(run, name, fn, *args)
+            # 等待全部任务结束，出错时其余任务创建的资源才能全部收回
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    error = error or e
+    else:
+        for name, fn in STARTUP_TASKS:
+            args = ((lambda: results['reachability']),) if name == 'arm' else ()
+            try:
+                results[name] = run(name, fn, *args)
+            except Exception as e:
+                error = e
+                break
+    if error is not None:
+        release(results)
+        raise error
+    return results
@@ -0,0 +1,64 @@
+import threading
+import time
+
+
+class RealClock:
+    """真实时钟，基于单调时钟实现"""
+
+    def now(self):
+        """返回当前时间，单位秒"""
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        """阻塞等待指定时长，单位秒"""
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class VirtualClock:
+    """虚拟时钟，用于在没有实际硬件的情况下以快于实时的速度运行仿真
+
+    两种工作模式：
+    - speedup为None：纯虚拟时间，sleep只推进内部时间而不真正等待，
+      适合单线程的确定性仿真和基准测试
+    - speedup为正数：按比例缩放的实时时钟，虚拟时间以speedup倍速流逝，
+      sleep按比例缩短真实等待时间，适合存在多个线程（状态轮询、底盘控制）的仿真
+    """
+
+    def __init__(self, start=0.0, speedup=None):
+        """初始化虚拟时钟
+
+        参数:
+            start: 起始虚拟时间，单位秒
+            speedup: 相对真实时间的加速倍数，None表示纯虚拟时间
+        """
+        if speedup is not None and speedup <= 0:
+            raise ValueError("speedup必须为正数")
+        self.speedup = speedup
+        self._start = start
+        self._virtual_time = start
+        self._real_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def now(self):
+        """返回当前虚拟时间，单位秒"""
+        if self.speedup is None:
+            with self._lock:
+                return self._virtual_time
+        return self._start + (time.monotonic() - self._real_start) * self.speedup
+
+    def sleep(self, seconds):
+        """等待指定的虚拟时长，单位秒"""
+        if seconds <= 0:
+            return
+        if self.speedup is None:
+            self.advance(seconds)
+        else:
+            time.sleep(seconds / self.speedup)
+
+    def advance(self, seconds):
+        """直接推进虚拟时间（仅纯虚拟模式有效）"""
+        if self.speedup is not None:
+            raise RuntimeError("缩放实时模式下无法手动推进时间")
+        with self._lock:
+            self._virtual_time += seconds
@@ -1,15 +1,81 @@
+import logging
+import numpy as np
+
 def transform_coordinates(x, y, z):
     # Example transformation function
     return (x * 1.0, y * 1.0, z * 1.0)
 
-def log_message(message):
-    # Simple logging function
-    with open("log.txt", "a") as log_file:
-        log_file.write(message + "\n")
+def log_message(message, level=logging.INFO):
+    # Log through the asynchronous logging subsystem (see utils.log.setup_logging)
+    logging.getLogger("agri").log(level, message)
 
 def calculate_distance(point1, point2):
     # Calculate Euclidean distance between two points
     import math
     return math.sqrt((point1[0] - point2[0]) ** 2 + 
                      (point1[1] - point2[1]) ** 2 + 
-                     (point1[2] - point2[2]) ** 2)
\ No newline at end of file
+                     (point1[2] - point2[2]) ** 2)
+
+def pixel_to_camera_point(u, v, depth, intrinsics):
+    # Deproject pixel (u, v) with depth into the camera frame (same unit as depth)
+    x = (u - intrinsics['cx']) * depth / intrinsics['fx']
+    y = (v - intrinsics['cy']) * depth / intrinsics['fy']
+    return (x, y, depth)
+
+def camera_to_arm(points, transform):
+    # Transform (N, 3) camera-frame points into the arm base frame with a 4x4 matrix
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    transform = np.asarray(transform, dtype=np.float64)
+    return points @ transform[:3, :3].T + transform[:3, 3]
+
+def arm_to_odom(points, base_pose, arm_mount=(0.0, 0.0, 0.0)):
+    # Transform (N, 3) arm-frame points (mm) into the odometry frame (m) for a planar base pose
+    # arm_mount: arm base pose on the vehicle (x mm, y mm, yaw deg)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    yaw = np.radians(arm_mount[2])
+    c, s = np.cos(yaw), np.sin(yaw)
+    bx = (c * points[:, 0] - s * points[:, 1] + arm_mount[0]) / 1000.0
+    by = (s * points[:, 0] + c * points[:, 1] + arm_mount[1]) / 1000.0
+    ct, st = np.cos(base_pose.theta), np.sin(base_pose.theta)
+    return np.stack([base_pose.x + ct * bx - st * by,
+                     base_pose.y + st * bx + ct * by,
+                     points[:, 2] / 1000.0], axis=1)
+
+def odom_to_arm(points, base_pose, arm_mount=(0.0, 0.0, 0.0)):
+    # Inverse of arm_to_odom: (N, 3) odometry-frame points (m) into the arm frame (mm)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    dx = points[:, 0] - base_pose.x
+    dy = points[:, 1] - base_pose.y
+    ct, st = np.cos(base_pose.theta), np.sin(base_pose.theta)
+    bx = (ct * dx + st * dy) * 1000.0 - arm_mount[0]
+    by = (-st * dx + ct * dy) * 1000.0 - arm_mount[1]
+    yaw = np.radians(arm_mount[2])
+    c, s = np.cos(yaw), np.sin(yaw)
+    return np.stack([c * bx + s * by, -s * bx + c * by, points[:, 2] * 1000.0], axis=1)
+
+def arm_to_body(points, arm_mount=(0.0, 0.0, 0.0)):
+    # Transform (N, 3) arm-frame points (mm) into the vehicle body frame (mm)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    yaw = np.radians(arm_mount[2])
+    c, s = np.cos(yaw), np.sin(yaw)
+    return np.stack([c * points[:, 0] - s * points[:, 1] + arm_mount[0],
+                     s * points[:, 0] + c * points[:, 1] + arm_mount[1],
+                     points[:, 2]], axis=1)
+
+def body_to_arm(points, arm_mount=(0.0, 0.0, 0.0)):
+    # Inverse of arm_to_body: (N, 3) body-frame points (mm) into the frame of an arm mounted at arm_mount
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    dx = points[:, 0] - arm_mount[0]
+    dy = points[:, 1] - arm_mount[1]
+    yaw = np.radians(arm_mount[2])
+    c, s = np.cos(yaw), np.sin(yaw)
+    return np.stack([c * dx + s * dy, -s * dx + c * dy, points[:, 2]], axis=1)
+
+def predict_base_pose(base_pose, t):
+    # Extrapolate a BasePose to time t with its current linear/angular velocity
+    dt = t - base_pose.timestamp
+    theta = base_pose.theta + base_pose.omega * dt
+    heading = base_pose.theta + base_pose.omega * dt / 2.0
+    return base_pose._replace(x=base_pose.x + base_pose.v * dt * np.cos(heading),
+                              y=base_pose.y + base_pose.v * dt * np.sin(heading),
+                              theta=theta, timestamp=t)
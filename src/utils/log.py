@@ -0,0 +1,160 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+_listener = None
+_queue_handler = None
+
+
+class RateLimitFilter(logging.Filter):
+    """限流过滤器
+
+    按 (logger名称, 级别, 消息模板) 分组，每组在interval秒内最多放行burst条记录，
+    超出的记录直接丢弃；下一次放行时在消息末尾注明期间被抑制的条数。只对level及以上
+    级别生效，例如相机"超时未获取到帧"这类持续重复的警告不会刷满磁盘。
+    """
+
+    MAX_KEYS = 1024
+
+    def __init__(self, interval=5.0, burst=3, level=logging.WARNING):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.level = level
+        self._windows = {}  # key -> [窗口起点, 窗口内已放行条数, 被抑制条数]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.level or self.interval <= 0:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                if len(self._windows) >= self.MAX_KEYS:
+                    self._windows.clear()
+                self._windows[key] = [now, 1, 0]
+                return True
+            if now - window[0] >= self.interval:
+                suppressed = window[2]
+                window[0], window[1], window[2] = now, 1, 0
+                if suppressed:
+                    record.msg = f"{record.msg}（已抑制{suppressed}条重复消息）"
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """紧凑JSON行格式，每条记录一行，便于机器解析"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+
+class _AsyncQueueHandler(logging.handlers.QueueHandler):
+    """只做消息合并和入队的处理器，格式化与写盘在后台线程完成；队列满时丢弃记录而不阻塞调用方"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 在调用方线程合并参数，避免参数对象在后台格式化前被修改
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(logging_settings):
+    """按LoggingSettings配置根logger
+
+    所有模块通过 logging.getLogger(__name__) 记录日志，记录在调用方线程入队，由后台
+    线程写入按大小轮转的日志文件和控制台。重复调用会先关闭上一次的配置。
+
+    参数:
+        logging_settings: LoggingSettings对象
+    """
+    global _listener, _queue_handler
+    shutdown_logging()
+
+    handlers = []
+    if logging_settings.log_file:
+        directory = os.path.dirname(logging_settings.log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            logging_settings.log_file,
+            maxBytes=logging_settings.max_log_size,
+            backupCount=logging_settings.backup_count,
+            encoding="utf-8"
+        )
+        if logging_settings.json_lines:
+            file_handler.setFormatter(JsonLinesFormatter())
+        else:
+            file_handler.setFormatter(logging.Formatter(logging_settings.log_format))
+        file_handler.setLevel(logging_settings.log_level)
+        handlers.append(file_handler)
+    if logging_settings.console_level:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter(logging_settings.console_format))
+        console_handler.setLevel(logging_settings.console_level)
+        handlers.append(console_handler)
+
+    log_queue = queue.Queue(maxsize=logging_settings.queue_size)
+    _queue_handler = _AsyncQueueHandler(log_queue)
+    _queue_handler.addFilter(RateLimitFilter(
+        interval=logging_settings.rate_limit_interval,
+        burst=logging_settings.rate_limit_burst
+    ))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    # 根logger取文件与控制台中较低的级别，低于该级别的记录在入队前即被丢弃
+    levels = [h.level for h in handlers] or [logging.WARNING]
+    root.setLevel(min(levels))
+
+
+def shutdown_logging():
+    """停止后台写入线程，写完队列中剩余的记录"""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        if _queue_handler.dropped:
+            sys.stderr.write(f"日志队列已满，丢弃了{_queue_handler.dropped}条记录\n")
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
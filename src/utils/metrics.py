@@ -0,0 +1,338 @@
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# 直方图分辨率：每个2的幂区间划分的子桶数，相对误差约为 1/SUB_BUCKETS
+SUB_BUCKETS = 64
+# 可记录的最大值（微秒）对应的2的幂次，2^32微秒约为71分钟
+MAX_EXPONENT = 32
+
+EXPORT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    """HDR风格的对数-线性直方图
+
+    以微秒为单位，把每个2的幂区间等分为SUB_BUCKETS个子桶，记录操作只需一次frexp
+    和一次列表自增，内存固定，分位数的相对误差约为1.5%，适合在热路径上记录延迟。
+    """
+
+    def __init__(self, name, help_text="", labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self._counts = [0] * ((MAX_EXPONENT + 1) * SUB_BUCKETS)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @staticmethod
+    def _index(value_us):
+        if value_us < 1.0:
+            return 0
+        m, e = math.frexp(value_us)  # value = m * 2^e, 0.5 <= m < 1
+        if e > MAX_EXPONENT:
+            return (MAX_EXPONENT + 1) * SUB_BUCKETS - 1
+        return (e - 1) * SUB_BUCKETS + int((m * 2.0 - 1.0) * SUB_BUCKETS)
+
+    @staticmethod
+    def _bucket_value(index):
+        """子桶中点对应的值（微秒）"""
+        e, sub = divmod(index, SUB_BUCKETS)
+        return (1.0 + (sub + 0.5) / SUB_BUCKETS) * 2.0 ** e
+
+    def record(self, seconds):
+        """记录一个以秒为单位的值"""
+        i = self._index(seconds * 1e6)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantiles(self, qs=EXPORT_QUANTILES):
+        """返回各分位数的值（秒），没有数据时返回0"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self.count
+            lo, hi = self.min, self.max
+        if total == 0:
+            return [0.0] * len(qs)
+        targets = sorted((q, k) for k, q in enumerate(qs))
+        values = [0.0] * len(qs)
+        cumulative = 0
+        t = 0
+        for i, c in enumerate(counts):
+            if not c:
+                continue
+            cumulative += c
+            while t < len(targets) and cumulative >= targets[t][0] * total:
+                values[targets[t][1]] = min(max(self._bucket_value(i) / 1e6, lo), hi)
+                t += 1
+            if t == len(targets):
+                break
+        return values
+
+    def percentile(self, q):
+        return self.quantiles((q,))[0]
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * len(self._counts)
+            self.count = 0
+            self.sum = 0.0
+            self.min = math.inf
+            self.max = 0.0
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name, help_text="", labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _Span:
+    """计时上下文，退出时把耗时记录到直方图"""
+
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.record(time.perf_counter() - self._start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    """指标注册表
+
+    提供计数器、直方图、计时span和装饰器，并以Prometheus文本格式导出（本地HTTP端点
+    或定期写文件）。enabled为False时span和装饰器直接调用原函数，不做任何记录。
+    """
+
+    def __init__(self, prefix="agri_", enabled=True):
+        self.prefix = prefix
+        self.enabled = enabled
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._exporter = None
+        self._exporter_stop = threading.Event()
+
+    def _get(self, cls, name, help_text, labels):
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, help_text, labels)
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name, help_text="", labels=None):
+        return self._get(Counter, name, help_text, labels)
+
+    def histogram(self, name, help_text="", labels=None):
+        return self._get(Histogram, name, help_text, labels)
+
+    def inc(self, name, amount=1, labels=None):
+        """计数器加amount；未启用时不做任何事"""
+        if self.enabled:
+            self.counter(name, labels=labels).inc(amount)
+
+    def span(self, name, labels=None):
+        """返回计时上下文：with metrics.span("xxx_seconds"): ..."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self.histogram(name, labels=labels))
+
+    def timed(self, name, help_text=""):
+        """函数装饰器，把每次调用的耗时记录到名为name的直方图"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                histogram = self.histogram(name, help_text)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    histogram.record(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def get(self, name, labels=None):
+        """返回已注册的指标，不存在时返回None"""
+        return self._metrics.get((name, tuple(sorted(labels.items())) if labels else ()))
+
+    def reset(self):
+        """清空全部计数器和直方图（采集函数保留），用于基准测试在场景之间归零"""
+        with self._lock:
+            self._metrics.clear()
+
+    def add_collector(self, fn):
+        """注册导出时调用的采集函数
+
+        fn()返回 [(name, type, value, labels), ...]，type为"counter"或"gauge"，
+        用于导出其他模块已有的统计（例如流水线各阶段的队列丢弃数）。
+        """
+        self._collectors.append(fn)
+
+    def remove_collector(self, fn):
+        if fn in self._collectors:
+            self._collectors.remove(fn)
+
+    def render(self):
+        """以Prometheus文本格式导出全部指标"""
+        lines = []
+        described = set()
+
+        def describe(name, kind, help_text):
+            if name in described:
+                return
+            described.add(name)
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for metric in list(self._metrics.values()):
+            name = self.prefix + metric.name
+            if isinstance(metric, Counter):
+                describe(name, "counter", metric.help)
+                lines.append(f"{name}{_format_labels(metric.labels)} {metric.value}")
+            else:
+                describe(name, "summary", metric.help)
+                for q, v in zip(EXPORT_QUANTILES, metric.quantiles()):
+                    lines.append(f"{name}{_format_labels(metric.labels, {'quantile': q})} {v:.6g}")
+                lines.append(f"{name}_sum{_format_labels(metric.labels)} {metric.sum:.6g}")
+                lines.append(f"{name}_count{_format_labels(metric.labels)} {metric.count}")
+
+        for collector in list(self._collectors):
+            try:
+                samples = collector()
+            except Exception as e:
+                logger.warning("指标采集失败: %s", e)
+                continue
+            for name, kind, value, labels in samples:
+                name = self.prefix + name
+                describe(name, kind, "")
+                lines.append(f"{name}{_format_labels(labels or {})} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """把指标写入文件（先写临时文件再替换，便于node_exporter的textfile采集）"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        """在后台线程中启动 /metrics HTTP端点"""
+        if self._server is not None:
+            return
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def start_file_exporter(self, path, interval=10.0):
+        """在后台线程中每隔interval秒把指标写入path"""
+        if self._exporter is not None:
+            return
+        self._exporter_stop.clear()
+
+        def run():
+            while not self._exporter_stop.wait(interval):
+                try:
+                    self.write(path)
+                except OSError as e:
+                    logger.warning("写入指标文件失败: %s", e)
+            try:
+                self.write(path)
+            except OSError:
+                pass
+
+        self._exporter = threading.Thread(target=run, name="metrics-file", daemon=True)
+        self._exporter.start()
+
+    def stop(self):
+        """停止HTTP端点和文件导出线程"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._exporter is not None:
+            self._exporter_stop.set()
+            self._exporter.join(timeout=2.0)
+            self._exporter = None
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
@@ -0,0 +1,408 @@
+import collections
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+_STAGE_THREAD = re.compile(r"^pipeline-(.+)-\d+$")
+
+
+def thread_label(name):
+    """线程名对应的标签：流水线工作者线程（pipeline-<阶段>-<序号>）取阶段名称，其余为线程名"""
+    match = _STAGE_THREAD.match(name)
+    return match.group(1) if match else name
+
+
+class _CProfileSession:
+    """cProfile会话：每个工作者线程一个cProfile.Profile，只在处理数据期间启用，按阶段汇总
+
+    Python 3.12起cProfile基于sys.monitoring，同一时刻只能启用一个Profile，其余线程启用
+    失败时跳过并计数（busy）。
+    """
+    kind = "cprofile"
+
+    def __init__(self):
+        self._local = threading.local()
+        self._profiles = collections.defaultdict(list)
+        self._enabled = set()
+        self._cond = threading.Condition()
+        self.closed = False
+        self.busy = 0
+
+    def enter(self, label):
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._cond:
+                self._profiles[label].append(profile)
+        if self.closed:
+            return
+        try:
+            profile.enable()
+        except ValueError:
+            self.busy += 1
+            return
+        with self._cond:
+            self._enabled.add(profile)
+
+    def exit(self, label):
+        profile = getattr(self._local, 'profile', None)
+        if profile is None or profile not in self._enabled:
+            return
+        profile.disable()
+        with self._cond:
+            self._enabled.discard(profile)
+            self._cond.notify_all()
+
+    def close(self, grace=10.0):
+        """停止启用新的Profile，等待处理中的数据结束（最多grace秒）"""
+        self.closed = True
+        deadline = time.monotonic() + grace
+        with self._cond:
+            while self._enabled and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+
+    def write(self, base, top_n):
+        paths = []
+        report = io.StringIO()
+        with self._cond:
+            profiles = {label: [p for p in items if p not in self._enabled] for label, items in self._profiles.items()}
+            unfinished = len(self._enabled)
+        for label, items in sorted(profiles.items()):
+            stats = None
+            for profile in items:
+                try:
+                    stats = pstats.Stats(profile) if stats is None else stats.add(profile)
+                except TypeError:
+                    continue  # 该线程在会话期间没有处理过数据
+            if stats is None:
+                continue
+            path = f"{base}-{label}.prof"
+            stats.dump_stats(path)
+            paths.append(path)
+            report.write(f"==== {label}（{len(items)}个线程） ====\n")
+            stats.stream = report
+            stats.sort_stats("cumulative").print_stats(top_n)
+        if unfinished:
+            report.write(f"{unfinished}个线程在结束时仍在处理数据，未计入\n")
+        if self.busy:
+            report.write(f"{self.busy}次因其他线程的Profile正在运行而跳过（Python 3.12+只能同时启用一个）\n")
+        path = f"{base}.txt"
+        with open(path, 'w') as f:
+            f.write(report.getvalue())
+        return [path] + paths
+
+
+class _SamplingSession:
+    """采样会话：后台线程定期读取所有线程的调用栈，按线程标签汇总，对被分析线程没有插桩开销"""
+    kind = "sample"
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.closed = False
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def enter(self, label):
+        pass
+
+    def exit(self, label):
+        pass
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < 128:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                label = thread_label(names.get(ident, str(ident)))
+                self.samples[(label,) + tuple(reversed(stack))] += 1
+
+    def close(self, grace=None):
+        self.closed = True
+        self._stop_event.set()
+        self._thread.join()
+
+    def write(self, base, top_n):
+        # 折叠栈格式（每行"标签;根帧;...;叶帧 次数"），可直接交给flamegraph.pl或speedscope
+        folded = f"{base}.folded"
+        with open(folded, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(";".join(stack) + f" {count}\n")
+
+        per_label = collections.defaultdict(collections.Counter)
+        totals = collections.Counter()
+        for stack, count in self.samples.items():
+            totals[stack[0]] += count
+            per_label[stack[0]][stack[-1]] += count
+        path = f"{base}.txt"
+        with open(path, 'w') as f:
+            f.write(f"采样间隔{self.interval * 1000:.1f}ms，共{sum(totals.values())}个样本\n")
+            for label, total in totals.most_common():
+                f.write(f"\n==== {label}（{total}个样本） ====\n")
+                for leaf, count in per_label[label].most_common(top_n):
+                    f.write(f"{count / total * 100:6.1f}%  {leaf}\n")
+        return [path, folded]
+
+
+class Profiler:
+    """运行时性能分析
+
+    通过本地控制套接字或信号在运行中开始/停止cProfile或采样分析、获取tracemalloc内存
+    分配快照、导出所有线程的调用栈，结果以时间戳命名写入目录，按流水线阶段（工作者
+    线程名）分别汇总。流水线工作者和爬行循环每处理一条数据读取一次session，没有会话时
+    不做任何其他事情；采样分析只增加一个后台线程。进程阶段不在分析范围内。
+    """
+
+    def __init__(self, directory="data/profiles", default_duration=30.0, max_duration=600.0,
+                 sample_interval=0.01, top_n=30):
+        self.directory = directory
+        self.default_duration = default_duration
+        self.max_duration = max_duration
+        self.sample_interval = sample_interval
+        self.top_n = top_n
+        # 当前会话，None表示未在分析；流水线阶段处理每条数据前读取
+        self.session = None
+        self._lock = threading.Lock()
+        self._timer = None
+        self._last_snapshot = None
+        self._server = None
+        self._socket_path = None
+
+    def apply_settings(self, new_settings):
+        """应用设置（启动时和SettingsWatcher订阅回调），下一次分析起生效"""
+        profiling = new_settings.profiling
+        self.directory = profiling.directory
+        self.default_duration = profiling.default_duration
+        self.max_duration = profiling.max_duration
+        self.sample_interval = profiling.sample_interval
+        self.top_n = profiling.top_n
+
+    def _base(self, kind):
+        os.makedirs(self.directory, exist_ok=True)
+        wall = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(wall))
+        return os.path.join(self.directory, f"{stamp}-{int(wall * 1000) % 1000:03d}-{kind}")
+
+    # ---- 分析会话 ----
+
+    def start(self, kind="sample", duration=None, interval=None):
+        """开始cProfile（kind="cprofile"）或采样（kind="sample"）分析，duration秒后自动停止并写出结果"""
+        duration = min(duration if duration is not None else self.default_duration, self.max_duration)
+        with self._lock:
+            if self.session is not None:
+                raise RuntimeError(f"已有{self.session.kind}分析在运行")
+            if kind == "cprofile":
+                session = _CProfileSession()
+            elif kind == "sample":
+                session = _SamplingSession(interval if interval is not None else self.sample_interval)
+            else:
+                raise ValueError(f"未知的分析方式: {kind}")
+            self.session = session
+            self._timer = threading.Timer(duration, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+        logger.info("开始%s分析，%.0f秒后停止", kind, duration)
+        return {'kind': kind, 'duration': duration}
+
+    def stop(self):
+        """停止当前分析并写出结果，返回文件路径列表；没有分析在运行时返回空列表"""
+        with self._lock:
+            session, self.session = self.session, None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if session is None:
+            return []
+        session.close()
+        paths = session.write(self._base(session.kind), self.top_n)
+        logger.info("%s分析结果: %s", session.kind, ", ".join(paths))
+        return paths
+
+    # ---- 快照 ----
+
+    def tracemalloc(self, action="snapshot", frames=1):
+        """tracemalloc控制：start开始跟踪（有额外开销）、snapshot写出分配最多的代码行及与上次快照的差异、stop停止"""
+        if action == "start":
+            tracemalloc.start(frames)
+            self._last_snapshot = None
+            return []
+        if action == "stop":
+            tracemalloc.stop()
+            self._last_snapshot = None
+            return []
+        if action != "snapshot":
+            raise ValueError(f"未知的tracemalloc操作: {action}")
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc未开启，先执行 tracemalloc start")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        path = self._base("tracemalloc") + ".txt"
+        with open(path, 'w') as f:
+            f.write(f"当前{current / 1e6:.1f}MB，峰值{peak / 1e6:.1f}MB\n\n==== 分配最多的代码行 ====\n")
+            for stat in snapshot.statistics('lineno')[:self.top_n]:
+                f.write(f"{stat}\n")
+            if self._last_snapshot is not None:
+                f.write("\n==== 与上次快照相比增长最多 ====\n")
+                for stat in snapshot.compare_to(self._last_snapshot, 'lineno')[:self.top_n]:
+                    f.write(f"{stat}\n")
+        self._last_snapshot = snapshot
+        return [path]
+
+    def dump_stacks(self):
+        """写出所有线程当前的调用栈"""
+        threads = {t.ident: t for t in threading.enumerate()}
+        path = self._base("stacks") + ".txt"
+        with open(path, 'w') as f:
+            for ident, frame in sys._current_frames().items():
+                thread = threads.get(ident)
+                name = thread.name if thread is not None else str(ident)
+                f.write(f"==== {name} [{thread_label(name)}]{' daemon' if thread is not None and thread.daemon else ''}"
+                        f" ====\n")
+                f.write("".join(traceback.format_stack(frame)))
+                f.write("\n")
+        return [path]
+
+    # ---- 控制命令 ----
+
+    def command(self, text):
+        """执行一条文本命令，返回结果字典
+
+        命令:
+            status
+            cprofile [秒数]
+            sample [秒数] [采样间隔毫秒]
+            stop
+            tracemalloc start [帧数] | snapshot | stop
+            stacks
+        """
+        args = text.split()
+        if not args:
+            return {'ok': False, 'error': "空命令"}
+        name, rest = args[0], args[1:]
+        try:
+            if name == "status":
+                session = self.session
+                return {'ok': True, 'profiling': session.kind if session is not None else None,
+                        'tracemalloc': tracemalloc.is_tracing(), 'directory': os.path.abspath(self.directory)}
+            if name in ("cprofile", "sample"):
+                duration = float(rest[0]) if rest else None
+                interval = float(rest[1]) / 1000.0 if len(rest) > 1 else None
+                return dict(self.start(name, duration, interval), ok=True)
+            if name == "stop":
+                return {'ok': True, 'files': self.stop()}
+            if name == "tracemalloc":
+                action = rest[0] if rest else "snapshot"
+                frames = int(rest[1]) if len(rest) > 1 else 1
+                return {'ok': True, 'files': self.tracemalloc(action, frames)}
+            if name == "stacks":
+                return {'ok': True, 'files': self.dump_stacks()}
+        except (RuntimeError, ValueError, OSError) as e:
+            return {'ok': False, 'error': str(e)}
+        return {'ok': False, 'error': f"未知命令: {name}"}
+
+    def serve(self, socket_path):
+        """在本地Unix域套接字上接收控制命令（每个连接一行命令，返回一行JSON）"""
+        if self._server is not None or not hasattr(socket, 'AF_UNIX'):
+            return
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        profiler = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline().decode("utf-8").strip()
+                result = profiler.command(line)
+                self.wfile.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+
+        self._server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+        self._server.daemon_threads = True
+        os.chmod(socket_path, 0o600)
+        self._socket_path = socket_path
+        threading.Thread(target=self._server.serve_forever, name="profiler-control", daemon=True).start()
+        logger.info("性能分析控制套接字: %s", socket_path)
+
+    def install_signal(self, command="stacks", signum=None):
+        """收到信号（默认SIGUSR2）时执行command；在新线程中执行，避免在信号处理函数中写文件"""
+        signum = signum if signum is not None else getattr(signal, 'SIGUSR2', None)
+        if signum is None:
+            return
+        signal.signal(signum, lambda s, f: threading.Thread(
+            target=self.command, args=(command,), name="profiler-signal", daemon=True).start())
+
+    def close(self):
+        """停止控制套接字，正在运行的分析写出结果"""
+        self.stop()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            try:
+                os.remove(self._socket_path)
+            except OSError:
+                pass
+
+
+# 全局性能分析器
+profiler = Profiler()
+
+
+def send_command(socket_path, text, timeout=30.0):
+    """向运行中程序的控制套接字发送命令，返回结果字典"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall((text + "\n").encode("utf-8"))
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data.decode("utf-8"))
+
+
+# 控制运行中的程序，例如（在src目录下）:
+#     python -m utils.profiling sample 30
+#     python -m utils.profiling cprofile 60
+#     python -m utils.profiling stop
+#     python -m utils.profiling tracemalloc start
+#     python -m utils.profiling tracemalloc snapshot
+#     python -m utils.profiling stacks
+if __name__ == "__main__":
+    from config.settings import settings
+
+    if len(sys.argv) < 2:
+        print(Profiler.command.__doc__)
+        sys.exit(2)
+    try:
+        result = send_command(settings.profiling.socket_path, " ".join(sys.argv[1:]))
+    except OSError as e:
+        print(f"无法连接控制套接字 {settings.profiling.socket_path}: {e}")
+        sys.exit(1)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    sys.exit(0 if result.get('ok') else 1)
@@ -64,7 +64,7 @@ except Exception as e:
 # Test Model Interface
 try:
     from analysis.model_interface import ModelInterface
-    model_interface = ModelInterface(model_api_endpoint=settings.model.api_endpoint)
+    model_interface = ModelInterface()
     print('✓ Model Interface initialized successfully')
 except Exception as e:
     print(f'✗ Failed to initialize Model Interface: {e}')
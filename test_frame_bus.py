@@ -0,0 +1,51 @@
+import sys
+import os
+import subprocess
+import numpy as np
+
+# Add the src directory to the Python path
+src = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+sys.path.append(src)
+
+print('Starting frame bus test...')
+
+from runtime.frame_bus import FrameBus, FrameSubscriber
+
+bus = FrameBus.create(color_shape=(48, 64, 3), depth_shape=(48, 64), slots=2)
+color = np.full((48, 64, 3), 7, dtype=np.uint8)
+depth = np.full((48, 64), 700, dtype=np.uint16)
+bus.publish({'color': color, 'depth': depth, 'color_timestamp': 1.0, 'depth_timestamp': 1.0})
+
+# 与发布方无关的独立进程（不是multiprocessing子进程）连接、读取后退出
+reader = (
+    "import sys; sys.path.insert(0, sys.argv[1])\n"
+    "from runtime.frame_bus import FrameSubscriber\n"
+    "sub = FrameSubscriber(sys.argv[2])\n"
+    "assert sub.bus.latest_seq == 1 and int(sub.bus._depth[1][0, 0]) == 700\n"
+    "sub.close()\n"
+)
+try:
+    for i in range(2):
+        result = subprocess.run([sys.executable, '-c', reader, src, bus.name], capture_output=True, text=True,
+                                timeout=30)
+        if result.returncode != 0:
+            print(f'✗ Subscriber process {i} failed: {result.stderr.strip()}')
+            sys.exit(1)
+    print('✓ Separate subscriber processes attached and exited')
+
+    # 订阅进程退出后总线必须仍然存在
+    sub = FrameSubscriber(bus.name)
+    bus.publish({'color': color, 'depth': depth, 'color_timestamp': 2.0, 'depth_timestamp': 2.0})
+    frame = sub.capture_frame(timeout=1.0)
+    sub.close()
+    if frame is None or int(frame['color'][0, 0, 0]) != 7:
+        print('✗ Frame bus unreadable after subscriber exit')
+        sys.exit(1)
+    print('✓ Frame bus still attachable after subscriber exit')
+except FileNotFoundError as e:
+    print(f'✗ Frame bus destroyed by subscriber exit: {e}')
+    sys.exit(1)
+finally:
+    bus.close()
+
+print('\nTest completed.')
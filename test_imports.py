@@ -26,6 +26,13 @@ except Exception as e:
     print(f'✗ Failed to import BaseController: {e}')
 
 
+try:
+    from robot.sim_robot import SimRobotRPC
+    print('✓ Imported SimRobotRPC')
+except Exception as e:
+    print(f'✗ Failed to import SimRobotRPC: {e}')
+
+
 try:
     from analysis.model_interface import ModelInterface
     print('✓ Imported ModelInterface')
@@ -33,6 +40,13 @@ except Exception as e:
     print(f'✗ Failed to import ModelInterface: {e}')
 
 
+try:
+    from runtime.startup import warm_start
+    print('✓ Imported warm_start')
+except Exception as e:
+    print(f'✗ Failed to import warm_start: {e}')
+
+
 try:
     from config.settings import Settings
     print('✓ Imported Settings')